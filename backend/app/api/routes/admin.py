@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import status as status_codes
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
@@ -25,16 +26,20 @@ from ...schemas.admin import (
 )
 from ...schemas.auth import AuthResponse, MessageResponse
 from ...core.auth_service import auth_service
+from ...core.rate_limiter import rate_limit, json_field
 from ...db.database import get_db
-from ...db.crud.user import UserCRUD
 from ...db.crud.admin import AdminCRUD
-from ...db.crud.login_history import LoginHistoryCRUD
+from ...core.login_event_writer import login_event_writer
 # 管理员操作记录功能已禁用
-from ...db.crud.package import PackageCRUD
 from ...db.crud.api_key import APIKeyCRUD
 # UserPlanCRUD已删除，使用APIKeyCRUD替代
-from ...db.models import UserRole, Admin, APIKey, User
-from .user import get_current_user
+from ...db.models import UserRole, Admin
+from ...services.credits_reconcile_service import CreditsReconcileService
+from ...services.admin_statistics_service import admin_statistics_service
+from ...services.search_service import SearchService
+from ...core.config import settings
+from ...utils.pagination import encode_keyset_cursor, decode_keyset_cursor
+from .user import get_current_identity
 from datetime import datetime
 import logging
 
@@ -43,7 +48,7 @@ router = APIRouter(prefix="/api/v1/admin", tags=["Admin Management"])
 security = HTTPBearer()
 
 
-async def get_admin_user(current_user = Depends(get_current_user)):
+async def get_admin_user(current_user = Depends(get_current_identity)):
     """获取管理员用户（权限检查）"""
     # 兼容字符串和枚举两种格式
     role_value = current_user.role.value if hasattr(current_user.role, 'value') else current_user.role
@@ -55,7 +60,7 @@ async def get_admin_user(current_user = Depends(get_current_user)):
     return current_user
 
 
-async def get_super_admin_user(current_user = Depends(get_current_user)):
+async def get_super_admin_user(current_user = Depends(get_current_identity)):
     """获取超级管理员用户（权限检查）"""
     # 兼容字符串和枚举两种格式
     role_value = current_user.role.value if hasattr(current_user.role, 'value') else current_user.role
@@ -69,7 +74,14 @@ async def get_super_admin_user(current_user = Depends(get_current_user)):
 
 
 
-@router.post("/login", response_model=AdminLoginResponse)
+@router.post(
+    "/login",
+    response_model=AdminLoginResponse,
+    dependencies=[
+        Depends(rate_limit("login_ip")),
+        Depends(rate_limit("login_account", json_field("username", lambda username: f"admin:{username}")))
+    ]
+)
 async def admin_login(
     login_data: AdminLoginRequest,
     request: Request,
@@ -89,8 +101,11 @@ async def admin_login(
                 detail="用户名或密码错误"
             )
 
-        # 验证密码
-        if not admin_crud.verify_password(admin, login_data.password):
+        # 验证密码（哈希cost与当前配置不同时顺便更新）
+        password_valid, new_password_hash = await auth_service.verify_password_and_rehash_async(
+            login_data.password, admin.password_hash
+        )
+        if not password_valid:
             # 记录登录失败 (暂时注释)
             # admin_crud.create_operation_record(
             #     admin_id=admin.id,
@@ -104,6 +119,9 @@ async def admin_login(
                 detail="用户名或密码错误"
             )
 
+        if new_password_hash:
+            admin_crud.update_password_hash(admin.id, new_password_hash)
+
         # 检查账户状态
         if not admin.is_active:
             # admin_crud.create_operation_record(
@@ -119,12 +137,7 @@ async def admin_login(
             )
 
         # 生成token (使用admin.username作为subject)
-        access_token = auth_service.create_access_token(data={
-            "sub": f"admin_{admin.username}",
-            "admin_id": admin.id,
-            "username": admin.username,
-            "role": admin.role.value
-        })
+        access_token = auth_service.create_access_token(data=auth_service.build_admin_claims(admin))
         refresh_token = auth_service.create_refresh_token(data={
             "sub": f"admin_{admin.username}",
             "admin_id": admin.id,
@@ -132,8 +145,8 @@ async def admin_login(
             "role": admin.role.value
         })
 
-        # 更新最后登录时间
-        admin_crud.update_last_login(admin.id)
+        # 更新最后登录时间（后台批量写入，不阻塞响应）
+        login_event_writer.record_admin_login(admin.id, admin.username)
 
         # 记录登录成功 (暂时注释，因为admin_operations表结构需要更新)
         # admin_crud.create_operation_record(
@@ -278,21 +291,14 @@ async def get_all_users(
 ):
     """获取所有用户列表（管理员）"""
     try:
-        user_crud = UserCRUD(db)
-
-        # 使用新的搜索方法支持分页和搜索
-        users = user_crud.search_users(
-            search=search,
+        # 有搜索词时走索引搜索并按匹配程度排序
+        users, total_count = SearchService(db).search_users(
+            term=search,
             is_active=is_active,
             page=page,
             page_size=page_size
         )
 
-        total_count = user_crud.count_search_users(
-            search=search,
-            is_active=is_active
-        )
-
         # 添加额外信息
         user_management_list = []
         for user in users:
@@ -340,35 +346,9 @@ async def get_admin_statistics(
     current_admin = Depends(get_admin_user),
     db: Session = Depends(get_db)
 ):
-    """获取管理员统计数据"""
+    """获取管理员统计数据（条件聚合计算，快照按间隔刷新）"""
     try:
-        user_crud = UserCRUD(db)
-        package_crud = PackageCRUD(db)
-        api_key_crud = APIKeyCRUD(db)
-        login_history_crud = LoginHistoryCRUD(db)
-        # 管理员操作记录功能已禁用
-
-        # 用户统计
-        all_users = user_crud.get_all_users()
-        total_users = len(all_users)
-        active_users = len([u for u in all_users if u.is_active])
-        banned_users = len([u for u in all_users if u.is_banned])
-
-        # 管理员统计（从独立的admins表获取）
-        admin_crud = AdminCRUD(db)
-        admin_stats = admin_crud.get_admin_statistics()
-        admin_users = admin_stats["total_admins"]
-
-        # 套餐统计
-        package_stats = package_crud.get_package_statistics()
-
-        # API密钥统计
-        # 需要实现API密钥统计方法
-        total_api_keys = 0
-        active_api_keys = 0
-
-        # 登录统计
-        login_stats = login_history_crud.get_login_statistics()
+        snapshot = admin_statistics_service.get_snapshot(db)
 
         # 操作统计（已禁用）
         operation_stats = {
@@ -380,15 +360,15 @@ async def get_admin_statistics(
         }
 
         return AdminStatisticsResponse(
-            total_users=total_users,
-            active_users=active_users,
-            banned_users=banned_users,
-            admin_users=admin_users,
-            total_api_keys=total_api_keys,
-            active_api_keys=active_api_keys,
-            total_packages=package_stats["total_packages"],
-            active_packages=package_stats["active_packages"],
-            login_statistics=login_stats,
+            total_users=snapshot["total_users"],
+            active_users=snapshot["active_users"],
+            banned_users=snapshot["banned_users"],
+            admin_users=snapshot["admin_users"],
+            total_api_keys=snapshot["total_api_keys"],
+            active_api_keys=snapshot["active_api_keys"],
+            total_packages=snapshot["total_packages"],
+            active_packages=snapshot["active_packages"],
+            login_statistics=snapshot["login_statistics"],
             operation_statistics=operation_stats
         )
 
@@ -405,63 +385,85 @@ async def get_admin_user_keys(
     api_key: Optional[str] = None,
     user_id: Optional[str] = None,
     status: Optional[str] = None,
-    page: int = 1,
+    cursor: Optional[str] = None,
     page_size: int = 50,
     current_admin = Depends(get_admin_user),
     db: Session = Depends(get_db)
 ):
-    """获取用户密钥列表（管理员）"""
+    """
+    获取用户密钥列表（管理员）
+
+    - **cursor**: 翻页游标，取上一页返回的 next_cursor，不传时返回第一页
+    - **page_size**: 每页条数（1-200）
+    """
     try:
+        page_size = max(1, min(page_size, 200))
+        try:
+            after = decode_keyset_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status_codes.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+
         api_key_crud = APIKeyCRUD(db)
 
-        # 构建查询条件
-        query = db.query(APIKey)
-
-        if api_key:
-            query = query.filter(APIKey.api_key == api_key)
-
-        if user_id:
-            query = query.filter(APIKey.user_id == user_id)
-
-        if status:
-            query = query.filter(APIKey.status == status)
-
-        # 分页
-        offset = (page - 1) * page_size
-        query = query.order_by(APIKey.created_at.desc()).offset(offset).limit(page_size)
-
-        results = query.all()
-        total_count = query.count()
-
-        user_keys = []
-        for api_key_record in results:
-            # 获取用户邮箱
-            user_email = "未激活"
-            if api_key_record.user_id:
-                user = db.query(User).filter(User.user_id == api_key_record.user_id).first()
-                if user:
-                    user_email = user.email
-
-            user_keys.append({
-                "id": api_key_record.id,
-                "user_id": api_key_record.user_id,
-                "api_key": api_key_record.api_key,
-                "real_api_key": api_key_record.real_api_key,
-                "key_name": api_key_record.key_name,
-                "description": api_key_record.description,
-                "user_email": user_email,
-                "status": api_key_record.status,
-                "activation_date": api_key_record.activation_date,
-                "expire_date": api_key_record.expire_date,
-                "remaining_days": api_key_record.remaining_days,
-                "remaining_credits": api_key_record.remaining_credits,
-                "total_credits": api_key_record.total_credits,
-                "last_used_at": api_key_record.last_used_at,
-                "created_at": api_key_record.created_at,
-                "notes": api_key_record.notes
-            })
+        # 多取一条用于判断是否还有下一页
+        user_keys = api_key_crud.list_user_keys_for_admin(
+            api_key=api_key, user_id=user_id, status=status, after=after, limit=page_size + 1
+        )
+        has_more = len(user_keys) > page_size
+        user_keys = user_keys[:page_size]
+        next_cursor = None
+        if has_more:
+            last = user_keys[-1]
+            next_cursor = encode_keyset_cursor(last["created_at"], last["id"])
+
+        total_count = api_key_crud.count_user_keys_for_admin(
+            api_key=api_key, user_id=user_id, status=status,
+            ttl_seconds=settings.ADMIN_USER_KEYS_COUNT_TTL_SECONDS
+        )
 
         logger.info(f"管理员 {current_admin.user_id} 查看用户密钥列表")
+        return {
+            "user_keys": user_keys,
+            "total": total_count,
+            "page_size": page_size,
+            "next_cursor": next_cursor,
+            "has_more": has_more
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"获取用户密钥列表失败: {str(e)}")
+        raise HTTPException(
+            status_code=status_codes.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="获取用户密钥列表失败"
+        )
+
+@router.get("/user-keys/search", response_model=dict)
+async def search_admin_user_keys(
+    q: str,
+    status: Optional[str] = None,
+    page: int = 1,
+    page_size: int = 20,
+    current_admin = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """
+    搜索用户密钥（管理员）
+
+    - **q**: 密钥前缀或密钥名称关键字
+    - **status**: 按状态过滤
+    """
+    try:
+        page = max(page, 1)
+        page_size = max(1, min(page_size, 100))
+        user_keys, total_count = SearchService(db).search_user_keys(
+            term=q, status=status, page=page, page_size=page_size
+        )
+
         return {
             "user_keys": user_keys,
             "total": total_count,
@@ -470,8 +472,43 @@ async def get_admin_user_keys(
         }
 
     except Exception as e:
-        logger.error(f"获取用户密钥列表失败: {str(e)}")
+        logger.error(f"搜索用户密钥失败: {str(e)}")
+        raise HTTPException(
+            status_code=status_codes.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="搜索用户密钥失败"
+        )
+
+
+@router.post("/credits-reconcile", response_model=dict)
+async def reconcile_credits(
+    repair: bool = False,
+    bucket_count: Optional[int] = None,
+    current_admin = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """
+    数据库与外部积分服务（Redis）对账（管理员）
+
+    - **repair**: 是否以数据库为准修复不一致的密钥，默认只对账不修复
+    - **bucket_count**: 分桶数，默认使用配置
+    """
+    try:
+        if bucket_count is not None and bucket_count <= 0:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="分桶数必须大于0"
+            )
+
+        result = CreditsReconcileService(db).reconcile(bucket_count=bucket_count, repair=repair)
+
+        logger.info(f"管理员 {current_admin.user_id} 执行积分对账: repair={repair}")
+        return result
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"积分对账失败: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="获取用户密钥列表失败"
-        )
\ No newline at end of file
+            detail="积分对账失败"
+        )
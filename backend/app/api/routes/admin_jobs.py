@@ -0,0 +1,97 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from ...schemas.admin import AdminJobSubmitRequest
+from ...db.database import get_db
+from ...services.admin_job_service import AdminJobService, list_job_handlers
+from ...services import admin_job_handlers  # noqa: F401  注册任务类型
+from .admin import get_admin_user
+import logging
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/api/v1/admin/jobs", tags=["Admin Jobs"])
+
+
+def _operator(current_admin) -> str:
+    return current_admin.username if getattr(current_admin, 'username', None) else current_admin.user_id
+
+
+@router.get("/types", response_model=dict)
+async def get_job_types(current_admin = Depends(get_admin_user)):
+    """获取支持的任务类型（管理员）"""
+    return {"job_types": list_job_handlers()}
+
+
+@router.post("", response_model=dict, status_code=status.HTTP_202_ACCEPTED)
+async def submit_job(
+    job_data: AdminJobSubmitRequest,
+    current_admin = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """
+    提交异步任务（管理员）
+
+    任务由后台工作线程分块执行，提交后立即返回任务ID，通过 GET /api/v1/admin/jobs/{job_id} 查询进度。
+    """
+    try:
+        job = AdminJobService(db).submit(job_data.job_type, job_data.params, created_by=_operator(current_admin))
+        return {"success": True, "job": AdminJobService.to_progress(job)}
+
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        db.rollback()
+        logger.error(f"提交管理后台任务失败: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="提交任务失败"
+        )
+
+
+@router.get("", response_model=dict)
+async def list_jobs(
+    job_status: Optional[str] = None,
+    limit: int = 50,
+    current_admin = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """获取最近的任务列表（管理员）"""
+    jobs = AdminJobService(db).list_jobs(status=job_status, limit=max(1, min(limit, 200)))
+    return {"jobs": [AdminJobService.to_progress(job) for job in jobs]}
+
+
+@router.get("/{job_id}", response_model=dict)
+async def get_job_progress(
+    job_id: int,
+    current_admin = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """查询任务进度（管理员）：已处理数、成功/失败数、吞吐量、预计剩余时间"""
+    job = AdminJobService(db).get_job(job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="任务不存在"
+        )
+    return AdminJobService.to_progress(job)
+
+
+@router.post("/{job_id}/cancel", response_model=dict)
+async def cancel_job(
+    job_id: int,
+    current_admin = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """取消任务（管理员）：未开始的任务立即取消，执行中的任务在当前块完成后停止"""
+    result = AdminJobService(db).request_cancel(job_id)
+    if not result["success"]:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=result["message"]
+        )
+    logger.info(f"管理员 {_operator(current_admin)} 取消任务: #{job_id}")
+    return result
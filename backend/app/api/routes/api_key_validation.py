@@ -11,10 +11,11 @@ from ...schemas.api_key import (
     APIKeyValidationErrorData
 )
 from ...schemas.common import ErrorCodes
-from ...schemas.enums import PackageType
 from ...db.database import get_db
 from ...db.crud.api_key import APIKeyCRUD
-from ...db.models import Package
+from ...services.credits_reset_service import CreditsResetService, get_reset_epoch, is_lazy_reset_mode
+from ...services.validation_rules import validation_rules
+from ...services.credits_reset_client import credits_reset_client
 import logging
 
 logger = logging.getLogger(__name__)
@@ -27,20 +28,22 @@ class APIKeyValidationService:
     def __init__(self, db: Session):
         self.db = db
         self.api_key_crud = APIKeyCRUD(db)
+        # 按需重置后需要同步到Redis的积分，由路由以后台任务方式推送
+        self.lazy_reset_credits = None
 
     def validate_api_key(self, api_key: str):
         """验证API密钥"""
         try:
-            # 1. 一次性获取API密钥所有信息（包含package_type）
-            result = self.api_key_crud.get_api_key_with_package_type(api_key)
-            if not result:
+            # 1. 只按密钥查询一行，订阅对应的校验规则来自预编译的规则表
+            db_api_key = self.api_key_crud.get_api_key_by_key(api_key)
+            if not db_api_key:
                 return self._create_error_response(
                     ErrorCodes.INVALID_API_KEY,
                     "Invalid API key",
                     "INVALID_KEY"
                 )
 
-            db_api_key, package_type = result
+            rule = validation_rules.get_rule(db_api_key.package_id)
 
             # 2. 基础验证
             if not db_api_key.is_active:
@@ -50,69 +53,21 @@ class APIKeyValidationService:
                     "INACTIVE_KEY"
                 )
 
-            # 4. 根据package_type进行分类校验
-            if package_type:
-                # 4.1 加油包类型("91")：一律返回无效
-                if package_type == PackageType.FUEL_PACK:
-                    return self._create_error_response(
-                        ErrorCodes.INVALID_API_KEY,
-                        "Invalid API key (fuel pack)",
-                        "INVALID_KEY"
-                    )
-
-                # 4.2 标准订阅类型("01", "02")：需要校验有效期和剩余积分
-                elif package_type in [PackageType.STANDARD, PackageType.MAX_SERIES]:
-                    # 有效期验证
-                    if db_api_key.expire_date and db_api_key.expire_date < datetime.now():
-                        return self._create_error_response(
-                            ErrorCodes.PLAN_EXPIRED,
-                            "API key has expired",
-                            "EXPIRED_KEY"
-                        )
-
-                    # 积分验证
-                    if db_api_key.remaining_credits is not None and db_api_key.remaining_credits <= 0:
-                        return self._create_error_response(
-                            ErrorCodes.CREDITS_EXHAUSTED,
-                            "Insufficient credits",
-                            "INSUFFICIENT_CREDITS"
-                        )
-
-                # 4.3 体验积分包和临时积分包类型("20", "21")：只需要校验剩余积分，不需要校验有效期
-                elif package_type in [PackageType.EXPERIENCE_PACKAGE, PackageType.TEMPORARY_PACKAGE]:
-                    # 积分验证（必须大于0）
-                    if db_api_key.remaining_credits is None or db_api_key.remaining_credits <= 0:
-                        return self._create_error_response(
-                            ErrorCodes.CREDITS_EXHAUSTED,
-                            "Insufficient credits",
-                            "INSUFFICIENT_CREDITS"
-                        )
-                    # 注意：这里不检查有效期，因为体验积分包和临时积分包没有有效期限制
-
-                # 4.4 未知package_type：返回无效
-                else:
-                    return self._create_error_response(
-                        ErrorCodes.INVALID_API_KEY,
-                        "Invalid API key (unknown package type)",
-                        "INVALID_KEY"
-                    )
-            else:
-                # 没有关联套餐，使用默认验证逻辑
-                # 有效期验证
-                if db_api_key.expire_date and db_api_key.expire_date < datetime.now():
-                    return self._create_error_response(
-                        ErrorCodes.PLAN_EXPIRED,
-                        "API key has expired",
-                        "EXPIRED_KEY"
-                    )
-
-                # 积分验证
-                if db_api_key.remaining_credits is not None and db_api_key.remaining_credits <= 0:
-                    return self._create_error_response(
-                        ErrorCodes.CREDITS_EXHAUSTED,
-                        "Insufficient credits",
-                        "INSUFFICIENT_CREDITS"
-                    )
+            # 3. 按需每日积分重置（当天首次使用时重置，已停用的密钥在上一步已被拒绝，不会触发写入）
+            if (
+                rule.daily_reset
+                and is_lazy_reset_mode()
+                and (db_api_key.reset_epoch is None or db_api_key.reset_epoch < get_reset_epoch())
+            ):
+                new_credits = CreditsResetService(self.db).apply_lazy_reset(db_api_key.id)
+                if new_credits is not None:
+                    self.db.refresh(db_api_key)
+                    self.lazy_reset_credits = new_credits
+
+            # 4. 按订阅类型规则校验（有效期、剩余积分、不可用类型）
+            failure = rule.check(db_api_key, datetime.now())
+            if failure is not None:
+                return self._create_error_response(*failure)
 
             # 5. 返回成功响应（包含package_type）
             return APIKeyValidationSuccessResponse(
@@ -124,7 +79,7 @@ class APIKeyValidationService:
                     activation_date=db_api_key.activation_date,
                     expire_date=db_api_key.expire_date,
                     remaining_credits=db_api_key.remaining_credits,
-                    package_type=package_type  # 添加订阅种类字段
+                    package_type=rule.package_type  # 添加订阅种类字段
                 )
             )
 
@@ -190,6 +145,13 @@ async def validate_api_key_endpoint(
             logger.info(f"API密钥验证成功: {request.api_key[:10]}...")
             # 异步更新最后使用时间，不阻塞主流程
             background_tasks.add_task(update_last_used_async, request.api_key, db)
+            # 按需重置了积分时，异步同步到Redis
+            if validation_service.lazy_reset_credits is not None:
+                background_tasks.add_task(
+                    credits_reset_client.reset_credits,
+                    api_key=request.api_key,
+                    remaining_credits=validation_service.lazy_reset_credits
+                )
             return result
         else:
             # 错误响应
@@ -1,5 +1,6 @@
+import secrets
 from datetime import timedelta
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 
@@ -21,16 +22,22 @@ from ...schemas.auth import (
 )
 from ...core.auth_service import auth_service
 from ...core.email_service import email_service
+from ...core.rate_limiter import rate_limit, json_field
+from ...core.login_event_writer import login_event_writer
 from ...db.database import get_db
 from ...db.crud.user import UserCRUD
+from ...db.crud.admin import AdminCRUD
 from ...core.config import settings
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/v1/auth", tags=["Authentication"])
 
+# 按请求体中的邮箱限流（与业务逻辑一致，忽略大小写和前后空格）
+request_email = json_field("email", lambda email: email.lower().strip())
 
-@router.post("/register", response_model=RegisterResponse)
+
+@router.post("/register", response_model=RegisterResponse, dependencies=[Depends(rate_limit("register_ip"))])
 async def register(request: UserRegisterRequest, db: Session = Depends(get_db)):
     """用户注册"""
     user_crud = UserCRUD(db)
@@ -48,7 +55,7 @@ async def register(request: UserRegisterRequest, db: Session = Depends(get_db)):
     try:
         # 创建用户
         user_id = auth_service.generate_user_id()
-        password_hash = auth_service.get_password_hash(request.password)
+        password_hash = await auth_service.get_password_hash_async(request.password)
 
         user_data = {
             "user_id": user_id,
@@ -77,6 +84,8 @@ async def register(request: UserRegisterRequest, db: Session = Depends(get_db)):
             email=email_lower
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"用户注册失败: {str(e)}")
         # 检查是否是唯一性约束错误
@@ -123,7 +132,7 @@ async def verify_email(request: EmailVerificationRequest, db: Session = Depends(
 
         # 生成令牌
         access_token = auth_service.create_access_token(
-            data={"sub": user.user_id, "email": user.email}
+            data=auth_service.build_user_claims(user)
         )
         refresh_token = auth_service.create_refresh_token(
             data={"sub": user.user_id, "email": user.email}
@@ -153,32 +162,44 @@ async def verify_email(request: EmailVerificationRequest, db: Session = Depends(
         )
 
 
-@router.post("/login", response_model=AuthResponse)
-async def login(request: UserLoginRequest, db: Session = Depends(get_db)):
+@router.post(
+    "/login",
+    response_model=AuthResponse,
+    dependencies=[
+        Depends(rate_limit("login_ip")),
+        Depends(rate_limit("login_account", request_email))
+    ]
+)
+async def login(request: UserLoginRequest, http_request: Request, db: Session = Depends(get_db)):
     """用户登录"""
     try:
         # 规范化邮箱（忽略大小写和前后空格）
         email_lower = request.email.lower().strip()
 
         # 用户认证
-        user = auth_service.authenticate_user(db, email_lower, request.password)
+        user = await auth_service.authenticate_user_async(db, email_lower, request.password)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="邮箱或密码错误"
             )
 
-        # 生成令牌
+        # 生成令牌（会话ID随令牌下发，刷新时沿用，退出登录时据此回填登录历史）
+        session_id = secrets.token_hex(16)
         access_token = auth_service.create_access_token(
-            data={"sub": user.user_id, "email": user.email}
+            data={**auth_service.build_user_claims(user), "sid": session_id}
         )
         refresh_token = auth_service.create_refresh_token(
-            data={"sub": user.user_id, "email": user.email}
+            data={"sub": user.user_id, "email": user.email, "sid": session_id}
         )
 
-        # 更新最后登录时间
-        user_crud = UserCRUD(db)
-        user_crud.update_last_login(user.user_id)
+        # 记录登录历史并更新最后登录时间（后台批量写入，不阻塞响应）
+        login_event_writer.record_login(
+            user.user_id,
+            ip_address=http_request.client.host if http_request.client else None,
+            user_agent=http_request.headers.get("user-agent"),
+            session_id=session_id
+        )
 
         logger.info(f"用户登录成功: {email_lower}")
         return AuthResponse(
@@ -226,7 +247,7 @@ async def verify_email_token(token: str, db: Session = Depends(get_db)):
 
         # 生成令牌
         access_token = auth_service.create_access_token(
-            data={"sub": user.user_id, "email": user.email}
+            data=auth_service.build_user_claims(user)
         )
         refresh_token = auth_service.create_refresh_token(
             data={"sub": user.user_id, "email": user.email}
@@ -299,7 +320,7 @@ async def resend_verification(request: ResendVerificationRequest, db: Session =
         )
 
 
-@router.post("/password-reset", response_model=MessageResponse)
+@router.post("/password-reset", response_model=MessageResponse, dependencies=[Depends(rate_limit("password_reset", request_email))])
 async def password_reset(request: PasswordResetRequest, db: Session = Depends(get_db)):
     """发送密码重置邮件"""
     # 规范化邮箱
@@ -334,7 +355,7 @@ async def password_reset(request: PasswordResetRequest, db: Session = Depends(ge
         )
 
 
-@router.post("/password-reset-confirm", response_model=MessageResponse)
+@router.post("/password-reset-confirm", response_model=MessageResponse, dependencies=[Depends(rate_limit("password_reset", request_email))])
 async def password_reset_confirm(request: PasswordResetConfirmRequest, db: Session = Depends(get_db)):
     """确认密码重置"""
     try:
@@ -358,7 +379,7 @@ async def password_reset_confirm(request: PasswordResetConfirmRequest, db: Sessi
             )
 
         # 更新密码
-        password_hash = auth_service.get_password_hash(request.new_password)
+        password_hash = await auth_service.get_password_hash_async(request.new_password)
         user_crud.update_user_info(user.user_id, {"password_hash": password_hash})
 
         logger.info(f"密码重置成功: {email_lower}")
@@ -374,8 +395,37 @@ async def password_reset_confirm(request: PasswordResetConfirmRequest, db: Sessi
         )
 
 
+def _load_fresh_claims(db: Session, subject: str, payload: dict) -> dict:
+    """刷新令牌时重新加载用户/管理员状态，已禁用或封禁的账户不再签发新令牌"""
+    if subject and subject.startswith("admin_"):
+        admin = AdminCRUD(db).get_admin_by_username(payload.get("username") or subject[len("admin_"):])
+        if not admin or not admin.is_active:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="账户不可用，请重新登录"
+            )
+        return auth_service.build_admin_claims(admin)
+
+    user = UserCRUD(db).get_user_by_id(subject)
+    if not user or not user.is_active or user.is_banned:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="账户不可用，请重新登录"
+        )
+    return auth_service.build_user_claims(user)
+
+
+@router.post("/logout", response_model=MessageResponse)
+async def logout(request: RefreshTokenRequest):
+    """退出登录（回填本次登录会话的退出时间）"""
+    payload = auth_service.verify_token(request.refresh_token)
+    if payload and payload.get("type") == "refresh" and payload.get("sid"):
+        login_event_writer.record_logout(payload["sid"])
+    return MessageResponse(message="已退出登录")
+
+
 @router.post("/refresh", response_model=TokenResponse)
-async def refresh_token(request: RefreshTokenRequest):
+async def refresh_token(request: RefreshTokenRequest, db: Session = Depends(get_db)):
     """刷新访问令牌"""
     try:
         # 验证刷新令牌
@@ -389,14 +439,17 @@ async def refresh_token(request: RefreshTokenRequest):
         user_id = payload.get("sub")
         email = payload.get("email")
 
-        # 生成新的访问令牌
-        access_token = auth_service.create_access_token(
-            data={"sub": user_id, "email": email}
-        )
+        # 生成新的访问令牌（携带状态声明时需从数据库重新加载最新状态）
+        if settings.JWT_EMBED_CLAIMS:
+            access_claims = _load_fresh_claims(db, user_id, payload)
+        else:
+            access_claims = {"sub": user_id, "email": email}
+        session_claims = {"sid": payload["sid"]} if payload.get("sid") else {}
+        access_token = auth_service.create_access_token(data={**access_claims, **session_claims})
 
         # 生成新的刷新令牌
         refresh_token = auth_service.create_refresh_token(
-            data={"sub": user_id, "email": email}
+            data={"sub": user_id, "email": email, **session_claims}
         )
 
         return TokenResponse(
@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
@@ -18,37 +19,56 @@ from ...schemas.user_key_management import (
     BulkUserKeyOperation
 )
 from ...schemas.auth import MessageResponse
-from ...db.database import get_db
+from ...core.config import settings
+from ...core.package_catalog import CachedBody, package_catalog
+from ...db.database import get_db, SessionLocal
 from ...db.models import APIKey
 from ...db.crud.package import PackageCRUD
 # UserPlanCRUD已删除，使用APIKeyCRUD替代
 from ...db.crud.api_key import APIKeyCRUD
-from .user import get_current_user
+from ...services.admin_job_service import AdminJobService
+from ...services import admin_job_handlers  # noqa: F401  注册任务类型
+from .user import get_current_identity
 from .admin import get_admin_user
 from datetime import datetime, timedelta
+import csv
+import io
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/v1/packages", tags=["Subscription Management"])
 
 
+def _catalog_response(cached: CachedBody, snapshot, request: Request, max_age: int = 0) -> Response:
+    """
+    返回缓存的响应体；If-None-Match 命中时返回304
+
+    max_age 为0时客户端每次都带 ETag 重新验证（未变更时只返回304），
+    管理员修改订阅后立即重新加载能看到最新数据。
+    """
+    headers = {
+        "ETag": cached.etag,
+        "Last-Modified": snapshot.last_modified,
+        "Cache-Control": f"public, max-age={max_age}" if max_age > 0 else "no-cache"
+    }
+    if cached.matches(request.headers.get("if-none-match")):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
+
 @router.get("/", response_model=PackageListResponse)
 async def get_packages(
-    include_inactive: bool = False,
-    db: Session = Depends(get_db)
+    request: Request,
+    include_inactive: bool = False
 ):
-    """获取订阅列表"""
+    """获取订阅列表（来自订阅目录快照，支持 ETag 条件请求）"""
     try:
-        package_crud = PackageCRUD(db)
-
+        snapshot = package_catalog.get_snapshot()
         if include_inactive:
-            packages = package_crud.get_all_packages(include_inactive=True)
-        else:
-            packages = package_crud.get_active_packages()
-
-        return PackageListResponse(
-            packages=packages,
-            total=len(packages)
+            # 完整列表供管理后台使用，不允许客户端直接使用本地缓存
+            return _catalog_response(snapshot.full_list, snapshot, request)
+        return _catalog_response(
+            snapshot.active_list, snapshot, request, max_age=settings.PACKAGE_CATALOG_MAX_AGE_SECONDS
         )
 
     except Exception as e:
@@ -62,20 +82,20 @@ async def get_packages(
 @router.get("/{package_id}", response_model=PackageResponse)
 async def get_package_detail(
     package_id: int,
-    db: Session = Depends(get_db)
+    request: Request
 ):
-    """获取订阅详情"""
+    """获取订阅详情（来自订阅目录快照，支持 ETag 条件请求）"""
     try:
-        package_crud = PackageCRUD(db)
-        package = package_crud.get_package_by_id(package_id)
+        snapshot = package_catalog.get_snapshot()
+        cached = snapshot.details.get(package_id)
 
-        if not package:
+        if cached is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="订阅不存在"
             )
 
-        return package
+        return _catalog_response(cached, snapshot, request)
 
     except HTTPException:
         raise
@@ -249,7 +269,7 @@ async def delete_package(
 @router.post("/purchase", response_model=PackagePurchaseResponse)
 async def purchase_package(
     purchase_data: PackagePurchaseRequest,
-    current_user = Depends(get_current_user),
+    current_user = Depends(get_current_identity),
     db: Session = Depends(get_db)
 ):
     """购买订阅"""
@@ -416,51 +436,89 @@ async def get_subscription_userkeys(
         )
 
 
-@router.post("/{package_id}/userkeys/batch-generate", response_model=MessageResponse)
+def _stream_generated_userkeys(package_id: int, count: int, real_api_key: str, notes: Optional[str], operator: str):
+    """
+    边生成边输出CSV（使用独立会话，请求的数据库会话在开始输出前已关闭）
+
+    响应头在第一块输出前已经发出，中途失败无法再改状态码，因此最后固定输出一行状态：
+    成功为 "#status,ok,已生成数,请求数"，失败为 "#status,error,已生成数,请求数,错误信息"。
+    没有状态行或状态不是 ok 的文件都是不完整的，已生成的密钥均已提交，可以按文件内容使用。
+    """
+    db = SessionLocal()
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    generated = 0
+    try:
+        writer.writerow(["api_key", "package_name", "credits", "duration_days"])
+
+        package = PackageCRUD(db).get_package_by_id(package_id)
+        if not package:
+            raise ValueError("订阅不存在")
+
+        chunks = APIKeyCRUD(db).generate_user_key_chunks(
+            package, count, real_api_key, notes, chunk_size=settings.USER_KEY_BATCH_CHUNK_SIZE
+        )
+        for chunk in chunks:
+            for item in chunk:
+                writer.writerow([item["api_key"], item["package_name"], item["credits"], item["duration_days"]])
+            generated += len(chunk)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+
+        if generated != count:
+            raise RuntimeError(f"生成数量不足: {generated}/{count}")
+
+        writer.writerow(["#status", "ok", generated, count])
+        yield buffer.getvalue()
+        logger.info(f"管理员 {operator} 批量生成用户密钥: {package.package_code}, 数量: {generated}")
+
+    except Exception as e:
+        logger.error(f"批量生成用户密钥失败（已生成 {generated} 个）: {str(e)}")
+        writer.writerow(["#status", "error", generated, count, str(e)])
+        yield buffer.getvalue()
+    finally:
+        db.close()
+
+
+@router.post("/{package_id}/userkeys/batch-generate")
 async def batch_generate_userkeys(
     package_id: int,
     generate_data: dict,
     current_admin = Depends(get_admin_user),
     db: Session = Depends(get_db)
 ):
-    """批量生成用户密钥（管理员）"""
-    try:
-        package_crud = PackageCRUD(db)
-        api_key_crud = APIKeyCRUD(db)
+    """
+    批量生成用户密钥（管理员）
 
-        # 检查订阅是否存在
-        package = package_crud.get_package_by_id(package_id)
-        if not package:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="订阅不存在"
-            )
-
-        count = generate_data.get('count', 10)
-        real_api_key = generate_data.get('real_api_key', 'default-real-key')
-        notes = generate_data.get('notes')
+    生成结果以CSV流式返回，每写入并提交一块就输出一块，最后一行为生成状态（见 _stream_generated_userkeys）。
+    """
+    package_crud = PackageCRUD(db)
 
-        # 批量生成用户密钥
-        generated_keys = api_key_crud.bulk_generate_standalone_user_keys(
-            package_id=package_id,
-            count=count,
-            real_api_key=real_api_key,
-            notes=notes
+    # 检查订阅是否存在
+    package = package_crud.get_package_by_id(package_id)
+    if not package:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="订阅不存在"
         )
 
-        success_count = len(generated_keys)
-        message = f"成功生成 {success_count} 个用户密钥"
-        logger.info(f"管理员 {current_admin.username if hasattr(current_admin, 'username') else 'admin'} 批量生成用户密钥: {package.package_code}, 数量: {success_count}")
-        return MessageResponse(message=message)
-
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"批量生成用户密钥失败: {str(e)}")
+    count = generate_data.get('count', 10)
+    if not isinstance(count, int) or count <= 0 or count > settings.USER_KEY_BATCH_MAX_COUNT:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="批量生成失败"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"生成数量必须在 1 到 {settings.USER_KEY_BATCH_MAX_COUNT} 之间"
         )
+    real_api_key = generate_data.get('real_api_key', 'default-real-key')
+    notes = generate_data.get('notes')
+    operator = current_admin.username if hasattr(current_admin, 'username') else 'admin'
+
+    filename = f"userkeys-{package.package_code}-{datetime.now().strftime('%Y%m%d%H%M%S')}.csv"
+    return StreamingResponse(
+        _stream_generated_userkeys(package_id, count, real_api_key, notes, operator),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
 
 @router.post("/{package_id}/userkeys/batch", response_model=MessageResponse)
@@ -484,7 +542,16 @@ async def batch_userkey_operations(
             )
 
         # 执行批量操作
-        if operation_data.operation == "generate":
+        if operation_data.operation == "generate" and len(operation_data.user_ids) > settings.ADMIN_JOB_INLINE_LIMIT:
+            # 数量较多时转为后台任务分块执行，请求立即返回
+            job = AdminJobService(db).submit(
+                "userkeys.generate",
+                {"package_id": package_id, "count": len(operation_data.user_ids), "notes": operation_data.notes},
+                created_by=current_admin.username if hasattr(current_admin, 'username') else 'admin'
+            )
+            message = f"已提交后台任务 #{job.id}，共 {len(operation_data.user_ids)} 个用户密钥"
+
+        elif operation_data.operation == "generate":
             # 批量生成用户密钥
             generated_keys = api_key_crud.bulk_generate_standalone_user_keys(
                 package_id=package_id,
@@ -495,29 +562,34 @@ async def batch_userkey_operations(
             success_count = len(generated_keys)
             message = f"成功生成 {success_count} 个用户密钥"
 
-        elif operation_data.operation == "deactivate":
-            # 批量禁用用户密钥
-            if hasattr(operation_data, 'api_key_ids'):
-                result = api_key_crud.disable_user_keys_by_ids(operation_data.api_key_ids)
-                success_count = result.get('disabled_count', 0) if result.get('success') else 0
-                message = f"成功禁用 {success_count} 个用户密钥"
-            else:
+        elif operation_data.operation in ("deactivate", "delete"):
+            if not operation_data.api_key_ids:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="缺少api_key_ids参数"
                 )
 
-        elif operation_data.operation == "delete":
-            # 批量删除用户密钥
-            if hasattr(operation_data, 'api_key_ids'):
+            if len(operation_data.api_key_ids) > settings.ADMIN_JOB_INLINE_LIMIT:
+                # 数量较多时转为后台任务分块执行，请求立即返回
+                job_type = "userkeys.disable" if operation_data.operation == "deactivate" else "userkeys.delete"
+                job = AdminJobService(db).submit(
+                    job_type,
+                    {"api_key_ids": operation_data.api_key_ids},
+                    created_by=current_admin.username if hasattr(current_admin, 'username') else 'admin'
+                )
+                message = f"已提交后台任务 #{job.id}，共 {len(operation_data.api_key_ids)} 个用户密钥"
+
+            elif operation_data.operation == "deactivate":
+                # 批量禁用用户密钥
+                result = api_key_crud.disable_user_keys_by_ids(operation_data.api_key_ids)
+                success_count = result.get('disabled_count', 0) if result.get('success') else 0
+                message = f"成功禁用 {success_count} 个用户密钥"
+
+            else:
+                # 批量删除用户密钥
                 result = api_key_crud.delete_user_keys_by_ids(operation_data.api_key_ids)
                 success_count = result.get('deleted_count', 0) if result.get('success') else 0
                 message = f"成功删除 {success_count} 个用户密钥"
-            else:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="缺少api_key_ids参数"
-                )
 
         else:
             raise HTTPException(
@@ -591,11 +663,12 @@ async def fix_data_integrity(
     current_admin = Depends(get_admin_user),
     db: Session = Depends(get_db)
 ):
-    """修复数据完整性问题（管理员）"""
-    try:
-        from ...db.models import APIKey, Package
-        from datetime import datetime
+    """
+    修复数据完整性问题（管理员）
 
+    为未关联订阅的密钥补齐默认订阅，作为后台任务分块执行，通过 /api/v1/admin/jobs/{job_id} 查询进度。
+    """
+    try:
         default_package_id = fix_data.get("default_package_id")
         if not default_package_id:
             raise HTTPException(
@@ -603,46 +676,23 @@ async def fix_data_integrity(
                 detail="请指定默认订阅ID"
             )
 
-        # 验证默认套餐是否存在
-        default_package = db.query(Package).filter(Package.id == default_package_id).first()
-        if not default_package:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="指定的订阅不存在"
-            )
-
-        # 查找需要修复的API密钥
-        api_keys_to_fix = db.query(APIKey).filter(
-            ~APIKey.id.in_(db.query(UserKey.api_key_id))
-        ).all()
-
-        fixed_count = 0
-        for api_key in api_keys_to_fix:
-            # 创建UserKey记录
-            user_key = UserKey(
-                user_id=api_key.user_id,
-                api_key_id=api_key.id,
-                package_id=default_package_id,
-                activation_date=api_key.created_at if api_key.user_id else None,
-                expire_date=None,
-                remaining_days=default_package.duration_days,
-                remaining_credits=default_package.credits,
-                total_credits=default_package.credits,
-                status="active" if api_key.user_id and api_key.is_active else "inactive",
-                notes=f"Auto-fixed by admin {current_admin.user_id} on {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')}"
-            )
-            db.add(user_key)
-            fixed_count += 1
-
-        db.commit()
+        job = AdminJobService(db).submit(
+            "data_integrity.fix",
+            {"default_package_id": default_package_id},
+            created_by=current_admin.user_id
+        )
 
-        logger.info(f"管理员 {current_admin.user_id} 修复数据完整性，修复了 {fixed_count} 条记录")
-        return MessageResponse(message=f"成功修复 {fixed_count} 条数据记录")
+        logger.info(f"管理员 {current_admin.user_id} 提交数据完整性修复任务: #{job.id}, 待修复 {job.total} 条")
+        return MessageResponse(message=f"已提交数据修复任务 #{job.id}，待修复 {job.total} 条记录")
 
     except HTTPException:
         raise
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="指定的订阅不存在"
+        )
     except Exception as e:
-        db.rollback()
         logger.error(f"修复数据完整性失败: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
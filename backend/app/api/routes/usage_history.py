@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, BackgroundTasks
 from sqlalchemy.orm import Session
 from typing import Optional
 from datetime import datetime, timedelta
@@ -17,18 +17,22 @@ from ...schemas.usage_history import (
     ErrorResponse
 )
 from ...schemas.auth import MessageResponse
+from ...core.rate_limiter import rate_limit, json_field
 from ...db.database import get_db
 from ...db.crud.usage_record import UsageRecordCRUD
 from ...db.crud.api_key import APIKeyCRUD
+from ...services.credits_reset_service import CreditsResetService, is_lazy_reset_mode
+from ...services.credits_reset_client import credits_reset_client
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/v1/usage", tags=["Usage History"])
 
 
-@router.post("/record", response_model=UsageRecordSuccess)
+@router.post("/record", response_model=UsageRecordSuccess, dependencies=[Depends(rate_limit("usage_record", json_field("api_key")))])
 async def record_usage(
     request: TokenUsageRequest,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ):
     """记录API使用履历"""
@@ -40,6 +44,13 @@ async def record_usage(
         if total_tokens is None:
             total_tokens = request.input_tokens + request.output_tokens
 
+        # 按需每日积分重置：当天首次记录使用时先重置，再由记录使用履历扣减
+        lazy_reset_credits = None
+        if is_lazy_reset_mode():
+            api_key_id = usage_crud.get_api_key_id_by_key(request.api_key)
+            if api_key_id is not None:
+                lazy_reset_credits = CreditsResetService(db).apply_lazy_reset(api_key_id)
+
         # 记录使用履历
         usage_record = usage_crud.record_api_usage(
             api_key=request.api_key,
@@ -58,6 +69,14 @@ async def record_usage(
                 detail="无效的API密钥或记录使用履历失败"
             )
 
+        # 按需重置了积分时，异步同步到Redis
+        if lazy_reset_credits is not None:
+            background_tasks.add_task(
+                credits_reset_client.reset_credits,
+                api_key=request.api_key,
+                remaining_credits=lazy_reset_credits
+            )
+
         logger.info(f"记录使用履历成功: API密钥={request.api_key}, 服务={request.service}, tokens={total_tokens}")
         return UsageRecordSuccess(
             record_id=usage_record.id,
@@ -5,6 +5,9 @@ from sqlalchemy.orm import Session
 from ...schemas.auth import UserResponse
 from ...schemas.user import UserUpdateRequest, UserProfileResponse
 from ...core.auth_service import auth_service
+from ...core.config import settings
+from ...core.principal_cache import Principal, principal_cache
+from ...core.token_revocation import token_revocation_list
 from ...db.database import get_db
 from ...db.crud.user import UserCRUD
 from ...db.crud.admin import AdminCRUD
@@ -37,6 +40,11 @@ async def get_current_user(
             detail="令牌格式错误"
         )
 
+    # 优先使用缓存的登录主体，避免每个请求都查询数据库
+    principal = principal_cache.get(user_id)
+    if principal:
+        return principal
+
     # 检查是否是管理员token
     if user_id.startswith("admin_"):
         # 管理员认证
@@ -61,37 +69,7 @@ async def get_current_user(
                 detail="管理员账户已被禁用"
             )
 
-        # 创建管理员适配器（与普通用户完全分离）
-        class AdminUserAdapter:
-            def __init__(self, admin):
-                # 管理员基本信息
-                self.id = admin.id
-                self.user_id = f"admin_{admin.username}"
-                self.username = admin.username
-                self.email = admin.username  # 管理员使用用户名作为标识
-                self.phone = None  # 管理员不使用phone字段
-
-                # 管理员角色和权限
-                self.role = admin.role.value if hasattr(admin.role, 'value') else admin.role
-                self.admin_role = admin.role  # 保留原始管理员角色对象
-
-                # 管理员状态（与普通用户分离）
-                self.is_active = admin.is_active
-                self.is_email_verified = True  # 管理员不需要邮箱验证
-                self.is_banned = False  # 管理员使用is_deleted而非is_banned
-                self.is_deleted = admin.is_deleted
-
-                # 时间戳
-                self.last_login_at = admin.last_login_at
-                self.created_at = admin.created_at
-                self.updated_at = admin.updated_at
-
-                # 标识这是管理员账户
-                self.is_admin = True
-                self.user_type = "admin"
-                self._sa_instance_state = type('MockState', (), {'session': db})()
-
-        return AdminUserAdapter(admin)
+        principal = Principal.from_admin(admin)
     else:
         # 普通用户认证
         user_crud = UserCRUD(db)
@@ -109,12 +87,51 @@ async def get_current_user(
                 detail="账户已被禁用"
             )
 
-        # 为普通用户添加标识（与管理员区分）
-        user.is_admin = False
-        user.user_type = "user"
-        user.role = "user"  # 普通用户统一角色
+        principal = Principal.from_user(user)
+
+    principal_cache.set(user_id, principal)
+    return principal
+
+
+async def get_current_identity(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db)
+):
+    """
+    获取当前登录主体的身份（只需身份和角色的接口使用）
+
+    启用JWT_EMBED_CLAIMS时直接使用令牌中的状态声明，不查询数据库；
+    账户被禁用/封禁或角色变更后由吊销列表拒绝旧令牌。
+    未携带声明的令牌（旧令牌或未启用该模式）回退到 get_current_user。
+    """
+    if not settings.JWT_EMBED_CLAIMS:
+        return await get_current_user(credentials, db)
+
+    payload = auth_service.verify_token(credentials.credentials)
+    if not payload or not payload.get("cv"):
+        return await get_current_user(credentials, db)
+
+    subject = payload.get("sub")
+    if not subject:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="令牌格式错误"
+        )
+
+    if token_revocation_list.is_revoked(subject, payload.get("iat")):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="访问令牌已失效，请重新登录"
+        )
+
+    principal = Principal.from_claims(payload)
+    if not principal.is_active or principal.is_banned:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="账户已被禁用"
+        )
 
-        return user
+    return principal
 
 
 @router.get("/profile", response_model=UserProfileResponse)
@@ -21,7 +21,7 @@ from ...db.crud.user import UserCRUD
 from ...db.crud.api_key import APIKeyCRUD
 # UserPlanCRUD已删除，使用APIKeyCRUD替代
 # UserKeyCRUD已合并到APIKeyCRUD
-from .user import get_current_user
+from .user import get_current_identity
 from ...services.credits_reset_client import credits_reset_client
 import logging
 
@@ -33,7 +33,7 @@ security = HTTPBearer()
 @router.post("/activate-user-key", response_model=UserKeyActivationResponse)
 async def activate_user_key(
     request: dict,
-    current_user = Depends(get_current_user),
+    current_user = Depends(get_current_identity),
     db: Session = Depends(get_db)
 ):
     """激活用户Key"""
@@ -93,7 +93,7 @@ async def activate_user_key(
 @router.post("/activate", response_model=KeyActivationResponse)
 async def activate_custom_key(
     request: KeyActivationRequest,
-    current_user = Depends(get_current_user),
+    current_user = Depends(get_current_identity),
     db: Session = Depends(get_db)
 ):
     """激活自定义API密钥"""
@@ -150,7 +150,7 @@ async def activate_custom_key(
 
 @router.get("/", response_model=UserKeysListResponse)
 async def get_user_keys(
-    current_user = Depends(get_current_user),
+    current_user = Depends(get_current_identity),
     db: Session = Depends(get_db)
 ):
     """获取用户的API密钥列表"""
@@ -193,7 +193,7 @@ async def get_user_keys(
 
 @router.get("/plan-status", response_model=UserPlanStatusResponse)
 async def get_user_plan_status(
-    current_user = Depends(get_current_user),
+    current_user = Depends(get_current_identity),
     db: Session = Depends(get_db)
 ):
     """获取用户套餐状态"""
@@ -224,7 +224,7 @@ async def get_user_plan_status(
 @router.put("/{key_id}/toggle", response_model=MessageResponse)
 async def toggle_key_status(
     key_id: int,
-    current_user = Depends(get_current_user),
+    current_user = Depends(get_current_identity),
     db: Session = Depends(get_db)
 ):
     """切换API密钥激活状态"""
@@ -266,7 +266,7 @@ async def toggle_key_status(
 @router.delete("/{key_id}", response_model=MessageResponse)
 async def delete_user_key(
     key_id: int,
-    current_user = Depends(get_current_user),
+    current_user = Depends(get_current_identity),
     db: Session = Depends(get_db)
 ):
     """删除API密钥"""
@@ -306,7 +306,7 @@ async def delete_user_key(
 @router.put("/{key_id}/reset-credits", response_model=MessageResponse)
 async def reset_api_key_credits(
     key_id: int,
-    current_user = Depends(get_current_user),
+    current_user = Depends(get_current_identity),
     db: Session = Depends(get_db)
 ):
     """重置API密钥的积分"""
@@ -368,7 +368,7 @@ async def reset_api_key_credits(
 @router.get("/{key_id}/download-config")
 async def download_api_key_config(
     key_id: int,
-    current_user = Depends(get_current_user),
+    current_user = Depends(get_current_identity),
     db: Session = Depends(get_db)
 ):
     """下载API密钥的配置文件"""
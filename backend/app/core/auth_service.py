@@ -1,13 +1,16 @@
 import secrets
 import random
+import time
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from sqlalchemy.orm import Session
 from ..core.config import settings
-from ..db.models import User, EmailVerification
+from ..db.models import User
+from ..db.crud.email_verification import EmailVerificationCRUD
 from ..db.crud.user import UserCRUD
+from .password_hasher import password_hasher, hash_password_sync, verify_password_sync, verify_and_update_sync
+from .principal_cache import principal_cache
 import logging
 
 logger = logging.getLogger(__name__)
@@ -15,16 +18,26 @@ logger = logging.getLogger(__name__)
 class AuthService:
     """认证服务类"""
 
-    def __init__(self):
-        self.pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
     def verify_password(self, plain_password: str, hashed_password: str) -> bool:
         """验证密码"""
-        return self.pwd_context.verify(plain_password, hashed_password)
+        return verify_password_sync(plain_password, hashed_password)
 
     def get_password_hash(self, password: str) -> str:
-        """获取密码哈希值"""
-        return self.pwd_context.hash(password)
+        """获取密码哈希值（使用当前配置的bcrypt cost）"""
+        return hash_password_sync(password, password_hasher.rounds)
+
+    async def verify_password_async(self, plain_password: str, hashed_password: str) -> bool:
+        """验证密码（在密码哈希工作池中执行，不阻塞事件循环）"""
+        return await password_hasher.verify(plain_password, hashed_password)
+
+    async def verify_password_and_rehash_async(self, plain_password: str,
+                                               hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """验证密码，哈希cost与当前配置不同时同时返回新哈希（在密码哈希工作池中执行）"""
+        return await password_hasher.verify_and_update(plain_password, hashed_password)
+
+    async def get_password_hash_async(self, password: str) -> str:
+        """获取密码哈希值（在密码哈希工作池中执行，不阻塞事件循环）"""
+        return await password_hasher.hash(password)
 
     def generate_verification_code(self) -> str:
         """生成6位数字验证码"""
@@ -46,16 +59,43 @@ class AuthService:
         """生成用户唯一标识"""
         return f"user_{secrets.token_hex(8)}"
 
+    def build_user_claims(self, user: User) -> Dict[str, Any]:
+        """普通用户访问令牌的声明（启用JWT_EMBED_CLAIMS时附带状态声明）"""
+        claims = {"sub": user.user_id, "email": user.email}
+        if settings.JWT_EMBED_CLAIMS:
+            claims.update({
+                "cv": 1,  # 声明版本，没有该字段的旧令牌仍走数据库校验
+                "role": "user",
+                "active": bool(user.is_active),
+                "banned": bool(user.is_banned),
+                "verified": bool(user.is_email_verified)
+            })
+        return claims
+
+    def build_admin_claims(self, admin) -> Dict[str, Any]:
+        """管理员访问令牌的声明（启用JWT_EMBED_CLAIMS时附带状态声明）"""
+        claims = {
+            "sub": f"admin_{admin.username}",
+            "admin_id": admin.id,
+            "username": admin.username,
+            "role": admin.role.value if hasattr(admin.role, 'value') else admin.role
+        }
+        if settings.JWT_EMBED_CLAIMS:
+            claims.update({"cv": 1, "active": bool(admin.is_active)})
+        return claims
+
     def create_access_token(self, data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
         """创建访问令牌"""
         to_encode = data.copy()
+        now = datetime.utcnow()
 
         if expires_delta:
-            expire = datetime.utcnow() + expires_delta
+            expire = now + expires_delta
         else:
-            expire = datetime.utcnow() + timedelta(minutes=settings.JWT_ACCESS_TOKEN_EXPIRE_MINUTES)
+            expire = now + timedelta(minutes=settings.JWT_ACCESS_TOKEN_EXPIRE_MINUTES)
 
-        to_encode.update({"exp": expire})
+        # iat保留小数部分：吊销时间精确到亚秒，整秒iat会把吊销后同一秒内签发的新令牌误判为已吊销
+        to_encode.update({"exp": expire, "iat": time.time()})
         encoded_jwt = jwt.encode(to_encode, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
         return encoded_jwt
 
@@ -79,15 +119,38 @@ class AuthService:
     def authenticate_user(self, db: Session, email: str, password: str) -> Optional[User]:
         """用户认证"""
         user_crud = UserCRUD(db)
-        user = user_crud.get_user_by_email(email)
+        user = self._get_login_user(user_crud, email)
+        if not user:
+            return None
 
+        valid, new_hash = verify_and_update_sync(password, user.password_hash, password_hasher.rounds)
+        return self._finish_authentication(user_crud, user, email, valid, new_hash)
+
+    async def authenticate_user_async(self, db: Session, email: str, password: str) -> Optional[User]:
+        """用户认证（密码校验在工作池中执行，其余步骤与 authenticate_user 相同）"""
+        user_crud = UserCRUD(db)
+        user = self._get_login_user(user_crud, email)
         if not user:
-            logger.warning(f"用户不存在: {email}")
             return None
 
-        if not self.verify_password(password, user.password_hash):
+        valid, new_hash = await self.verify_password_and_rehash_async(password, user.password_hash)
+        return self._finish_authentication(user_crud, user, email, valid, new_hash)
+
+    def _get_login_user(self, user_crud: UserCRUD, email: str) -> Optional[User]:
+        """按邮箱查找登录用户"""
+        user = user_crud.get_user_by_email(email)
+        if not user:
+            logger.warning(f"用户不存在: {email}")
+        return user
+
+    def _finish_authentication(self, user_crud: UserCRUD, user: User, email: str,
+                               valid: bool, new_hash: Optional[str]) -> Optional[User]:
+        """根据密码校验结果完成认证：保存重新计算的哈希，检查邮箱验证和账户状态"""
+        if not valid:
             logger.warning(f"密码错误: {email}")
             return None
+        if new_hash:
+            self._save_rehashed_password(user_crud, user, new_hash)
 
         if not user.is_email_verified:
             logger.warning(f"邮箱未验证: {email}")
@@ -99,6 +162,14 @@ class AuthService:
 
         return user
 
+    def _save_rehashed_password(self, user_crud: UserCRUD, user: User, new_hash: str) -> None:
+        """保存按当前cost重新计算的密码哈希（失败不影响本次登录）"""
+        try:
+            user_crud.update_user_info(user.user_id, {"password_hash": new_hash})
+            logger.info(f"密码哈希已按新cost更新: {user.user_id}")
+        except Exception as e:
+            logger.error(f"更新密码哈希失败: {user.user_id}, 错误: {str(e)}")
+
     def create_email_verification(self, db: Session, user_id: str, email: str,
                                 verification_type: str = "register") -> str:
         """创建邮箱验证记录"""
@@ -114,15 +185,8 @@ class AuthService:
 
         expire_at = datetime.now() + timedelta(minutes=15)  # 15分钟有效期，使用本地时间
 
-        # 删除该用户之前未使用的验证记录
-        db.query(EmailVerification).filter(
-            EmailVerification.user_id == user_id,
-            EmailVerification.verification_type == verification_type,
-            EmailVerification.is_used == False
-        ).delete()
-
-        # 存储验证码
-        email_verification = EmailVerification(
+        # 存储验证码（同时删除该用户之前未使用的验证记录）
+        EmailVerificationCRUD(db).replace_verification(
             user_id=user_id,
             email=email,
             verification_code=verification_code,
@@ -130,21 +194,12 @@ class AuthService:
             expire_at=expire_at
         )
 
-        db.add(email_verification)
-        db.commit()
-        db.refresh(email_verification)
-
         logger.info(f"创建邮箱验证记录: {email}, 验证码类型: {verification_type}, 过期时间: {expire_at}")
         return verification_code
 
     def verify_email_code(self, db: Session, email: str, verification_code: str) -> bool:
         """验证邮箱验证码（兼容旧版本）"""
-        verification = db.query(EmailVerification).filter(
-            EmailVerification.email == email,
-            EmailVerification.verification_code == verification_code,
-            EmailVerification.is_used == False,
-            EmailVerification.expire_at > datetime.now()
-        ).first()
+        verification = EmailVerificationCRUD(db).get_active_verification(email, verification_code)
 
         if not verification:
             logger.warning(f"验证码无效或已过期: {email}, {verification_code}")
@@ -162,6 +217,7 @@ class AuthService:
                 user.is_email_verified = True
                 user.is_active = True
                 db.commit()
+                principal_cache.invalidate_user(user.user_id)
                 logger.info(f"用户邮箱验证完成，账户已激活: {email}")
 
         return True
@@ -179,12 +235,7 @@ class AuthService:
                 return None
 
             # 查找对应的验证记录
-            verification = db.query(EmailVerification).filter(
-                EmailVerification.email == email,
-                EmailVerification.verification_code == token,
-                EmailVerification.is_used == False,
-                EmailVerification.expire_at > datetime.now()
-            ).first()
+            verification = EmailVerificationCRUD(db).get_active_verification(email, token)
 
             if not verification:
                 logger.warning(f"验证记录不存在或已过期: {email}")
@@ -202,6 +253,7 @@ class AuthService:
                     user.is_email_verified = True
                     user.is_active = True
                     db.commit()
+                    principal_cache.invalidate_user(user.user_id)
                     logger.info(f"用户邮箱验证完成，账户已激活: {email}")
 
             return email
@@ -89,11 +89,94 @@ class Settings:
     MAIL_STARTTLS: bool = os.getenv("MAIL_STARTTLS", "True").lower() == "true"
     MAIL_SSL_TLS: bool = os.getenv("MAIL_SSL_TLS", "False").lower() == "true"
 
+    # 邮件投递队列：邮件先写入email_outbox表，由后台协程通过SMTP连接池批量发送
+    EMAIL_OUTBOX_ENABLED: bool = os.getenv("EMAIL_OUTBOX_ENABLED", "True").lower() == "true"
+    EMAIL_SMTP_POOL_SIZE: int = int(os.getenv("EMAIL_SMTP_POOL_SIZE", "3"))
+    EMAIL_OUTBOX_BATCH_SIZE: int = int(os.getenv("EMAIL_OUTBOX_BATCH_SIZE", "20"))
+    EMAIL_OUTBOX_POLL_SECONDS: float = float(os.getenv("EMAIL_OUTBOX_POLL_SECONDS", "5"))
+    EMAIL_OUTBOX_MAX_ATTEMPTS: int = int(os.getenv("EMAIL_OUTBOX_MAX_ATTEMPTS", "5"))
+    EMAIL_OUTBOX_RETRY_BASE_SECONDS: int = int(os.getenv("EMAIL_OUTBOX_RETRY_BASE_SECONDS", "30"))
+    # 已发送/发送失败的邮件记录保留时长（小时）、清理时每批删除行数
+    EMAIL_OUTBOX_RETENTION_HOURS: int = int(os.getenv("EMAIL_OUTBOX_RETENTION_HOURS", "72"))
+    EMAIL_OUTBOX_PURGE_BATCH_SIZE: int = int(os.getenv("EMAIL_OUTBOX_PURGE_BATCH_SIZE", "1000"))
+    # 邮件模板字节码缓存目录（为空时使用系统临时目录）
+    EMAIL_TEMPLATE_CACHE_DIR: str = os.getenv("EMAIL_TEMPLATE_CACHE_DIR", "")
+
     # JWT配置
     JWT_SECRET_KEY: str = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-in-production")
     JWT_ALGORITHM: str = os.getenv("JWT_ALGORITHM", "HS256")
     JWT_ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("JWT_ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
     JWT_REFRESH_TOKEN_EXPIRE_DAYS: int = int(os.getenv("JWT_REFRESH_TOKEN_EXPIRE_DAYS", "7"))
+    # 访问令牌携带状态和角色声明，只需身份的接口不再查询数据库（配合吊销列表）
+    JWT_EMBED_CLAIMS: bool = os.getenv("JWT_EMBED_CLAIMS", "False").lower() == "true"
+    # 吊销记录写入数据库，各进程按此间隔（秒）同步其他进程的吊销；封禁在其他进程生效的最长延迟即为该间隔
+    TOKEN_REVOCATION_SYNC_SECONDS: int = int(os.getenv("TOKEN_REVOCATION_SYNC_SECONDS", "5"))
+
+    # 密码哈希工作池：process-进程池（绕开GIL），thread-线程池
+    PASSWORD_HASH_EXECUTOR: str = os.getenv("PASSWORD_HASH_EXECUTOR", "process")
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+    PASSWORD_HASH_MAX_PENDING: int = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))  # 超过后返回503
+    # bcrypt cost：所有进程和副本使用同一固定值，cost不同的旧哈希在登录时自动更新（为0时使用passlib默认值且不重新哈希）
+    # 可用 scripts/calibrate_bcrypt_rounds.py 在目标机型上按目标耗时测算后写入配置，下面三项只作为该脚本的默认参数
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", "12"))
+    BCRYPT_TARGET_MS: int = int(os.getenv("BCRYPT_TARGET_MS", "250"))
+    BCRYPT_MIN_ROUNDS: int = int(os.getenv("BCRYPT_MIN_ROUNDS", "10"))
+    BCRYPT_MAX_ROUNDS: int = int(os.getenv("BCRYPT_MAX_ROUNDS", "14"))
+
+    # 接口限流（"次数/秒数"），计数定期批量写入rate_limits表
+    RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "True").lower() == "true"
+    RATE_LIMIT_LOGIN_IP: str = os.getenv("RATE_LIMIT_LOGIN_IP", "30/60")
+    RATE_LIMIT_LOGIN_ACCOUNT: str = os.getenv("RATE_LIMIT_LOGIN_ACCOUNT", "10/300")
+    RATE_LIMIT_REGISTER_IP: str = os.getenv("RATE_LIMIT_REGISTER_IP", "10/3600")
+    RATE_LIMIT_PASSWORD_RESET: str = os.getenv("RATE_LIMIT_PASSWORD_RESET", "5/600")
+    RATE_LIMIT_USAGE_RECORD: str = os.getenv("RATE_LIMIT_USAGE_RECORD", "600/60")
+    RATE_LIMIT_FLUSH_SECONDS: int = int(os.getenv("RATE_LIMIT_FLUSH_SECONDS", "15"))
+    # 可信反向代理（逗号分隔的IP或网段），只有来自这些地址的请求才按 X-Forwarded-For 识别客户端IP，为空时只使用连接地址
+    RATE_LIMIT_TRUSTED_PROXIES: str = os.getenv("RATE_LIMIT_TRUSTED_PROXIES", "")
+
+    # 登录事件缓冲写入：写入间隔（毫秒）、每批条数、队列上限（满时丢弃）
+    LOGIN_EVENT_FLUSH_MS: int = int(os.getenv("LOGIN_EVENT_FLUSH_MS", "300"))
+    LOGIN_EVENT_BATCH_SIZE: int = int(os.getenv("LOGIN_EVENT_BATCH_SIZE", "500"))
+    LOGIN_EVENT_QUEUE_SIZE: int = int(os.getenv("LOGIN_EVENT_QUEUE_SIZE", "10000"))
+
+    # 管理后台统计快照刷新间隔（秒）
+    ADMIN_STATISTICS_REFRESH_SECONDS: int = int(os.getenv("ADMIN_STATISTICS_REFRESH_SECONDS", "60"))
+    # 订阅密钥计数（按订阅、状态分组）的定期重新聚合间隔（秒），本进程内的密钥变更会立即生效
+    PACKAGE_KEY_STATS_REFRESH_SECONDS: int = int(os.getenv("PACKAGE_KEY_STATS_REFRESH_SECONDS", "60"))
+    # 批量生成用户密钥：单次上限、每次INSERT/提交的条数
+    USER_KEY_BATCH_MAX_COUNT: int = int(os.getenv("USER_KEY_BATCH_MAX_COUNT", "100000"))
+    USER_KEY_BATCH_CHUNK_SIZE: int = int(os.getenv("USER_KEY_BATCH_CHUNK_SIZE", "1000"))
+    # 批量删除/禁用用户密钥时每条语句（每次提交）处理的ID数
+    USER_KEY_BULK_CHUNK_SIZE: int = int(os.getenv("USER_KEY_BULK_CHUNK_SIZE", "500"))
+
+    # 管理后台异步任务：工作线程数、每块处理条数、轮询间隔、心跳超时（超时的任务由其他节点从断点接管）、
+    # 批量密钥操作超过该数量时转为后台任务
+    ADMIN_JOB_WORKERS: int = int(os.getenv("ADMIN_JOB_WORKERS", "2"))
+    ADMIN_JOB_CHUNK_SIZE: int = int(os.getenv("ADMIN_JOB_CHUNK_SIZE", "1000"))
+    ADMIN_JOB_POLL_SECONDS: float = float(os.getenv("ADMIN_JOB_POLL_SECONDS", "2"))
+    ADMIN_JOB_STALE_SECONDS: int = int(os.getenv("ADMIN_JOB_STALE_SECONDS", "300"))
+    ADMIN_JOB_INLINE_LIMIT: int = int(os.getenv("ADMIN_JOB_INLINE_LIMIT", "1000"))
+
+    # 订阅目录缓存：其他进程的变更最迟多久被发现（秒）、公开的启用订阅列表响应 Cache-Control 的 max-age（秒，0表示每次重新验证）
+    # 完整列表和订阅详情总是返回 no-cache，由 ETag 重新验证
+    PACKAGE_CATALOG_REVALIDATE_SECONDS: int = int(os.getenv("PACKAGE_CATALOG_REVALIDATE_SECONDS", "60"))
+    PACKAGE_CATALOG_MAX_AGE_SECONDS: int = int(os.getenv("PACKAGE_CATALOG_MAX_AGE_SECONDS", "60"))
+
+    # 订阅校验规则表定期重新编译的间隔（秒），本进程内的订阅变更会立即生效
+    VALIDATION_RULES_RELOAD_SECONDS: int = int(os.getenv("VALIDATION_RULES_RELOAD_SECONDS", "60"))
+
+    # 管理后台搜索：需与MySQL的 ngram_token_size 一致，短于该长度的搜索词只做前缀匹配
+    SEARCH_NGRAM_TOKEN_SIZE: int = int(os.getenv("SEARCH_NGRAM_TOKEN_SIZE", "2"))
+    # 管理后台用户密钥列表总数缓存时间（秒）
+    ADMIN_USER_KEYS_COUNT_TTL_SECONDS: int = int(os.getenv("ADMIN_USER_KEYS_COUNT_TTL_SECONDS", "30"))
+
+    # 登录主体缓存（get_current_user），TTL为0时禁用
+    PRINCIPAL_CACHE_TTL_SECONDS: int = int(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "30"))
+    PRINCIPAL_CACHE_MAX_SIZE: int = int(os.getenv("PRINCIPAL_CACHE_MAX_SIZE", "10000"))
+
+    # 过期邮箱验证记录清理：每批删除行数，过期后保留时长（小时）
+    EMAIL_VERIFICATION_PURGE_BATCH_SIZE: int = int(os.getenv("EMAIL_VERIFICATION_PURGE_BATCH_SIZE", "1000"))
+    EMAIL_VERIFICATION_RETENTION_HOURS: int = int(os.getenv("EMAIL_VERIFICATION_RETENTION_HOURS", "24"))
 
     # 前端配置
     FRONTEND_URL: str = os.getenv("FRONTEND_URL", "http://localhost:5173")
@@ -103,6 +186,19 @@ class Settings:
 
     # 积分重置API配置
     CREDITS_RESET_API_BASE_URL: str = os.getenv("CREDITS_RESET_API_BASE_URL", "http://localhost:8000")
+    # 每日积分重置模式：batch-每天0点批量重置，lazy-密钥当天首次被使用时按需重置
+    CREDITS_RESET_MODE: str = os.getenv("CREDITS_RESET_MODE", "batch")
+    # 批量重置分片：密钥按哈希分为N片，各分片在0点后的窗口内错峰执行（1表示不分片）
+    CREDITS_RESET_SHARDS: int = int(os.getenv("CREDITS_RESET_SHARDS", "1"))
+    CREDITS_RESET_WINDOW_MINUTES: int = int(os.getenv("CREDITS_RESET_WINDOW_MINUTES", "60"))
+    # 数据库与外部积分服务对账：分桶数和每日执行时间（北京时间，小时）
+    CREDITS_RECONCILE_ENABLED: bool = os.getenv("CREDITS_RECONCILE_ENABLED", "False").lower() == "true"
+    CREDITS_RECONCILE_BUCKETS: int = int(os.getenv("CREDITS_RECONCILE_BUCKETS", "256"))
+    CREDITS_RECONCILE_HOUR: int = int(os.getenv("CREDITS_RECONCILE_HOUR", "3"))
+
+    # 定时任务配置
+    SCHEDULER_NODE_ID: str = os.getenv("SCHEDULER_NODE_ID", "")  # 为空时使用 主机名:进程号
+    SCHEDULER_LEASE_SECONDS: int = int(os.getenv("SCHEDULER_LEASE_SECONDS", "1800"))  # 任务租约时长（秒）
 
 # 创建设置实例
 settings = Settings()
\ No newline at end of file
@@ -0,0 +1,517 @@
+import asyncio
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import aiosmtplib
+from sqlalchemy import and_, func
+from sqlalchemy.orm import Session
+
+from .config import settings
+from ..db.database import SessionLocal
+from ..db.models import EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+# 单次发送的最长锁定时间，超过后视为发送节点已崩溃，邮件重新进入队列
+_SEND_LOCK_SECONDS = 300
+# 连接空闲超过该时长后，复用前先发送NOOP确认连接仍然可用
+_IDLE_CHECK_SECONDS = 30
+# 重试间隔上限（秒）
+_MAX_RETRY_DELAY_SECONDS = 3600
+# 保留的每分钟吞吐统计条数
+_METRICS_MINUTES = 60
+
+
+def build_email_message(recipients: List[str], subject: str,
+                        html_content: str, text_content: Optional[str] = None) -> MIMEMultipart:
+    """构造邮件（纯文本 + HTML 两个版本）"""
+    msg = MIMEMultipart("alternative")
+    msg["Subject"] = subject
+    msg["From"] = f"{settings.MAIL_FROM_NAME} <{settings.MAIL_FROM}>"
+    msg["To"] = ", ".join(recipients)
+
+    if text_content:
+        msg.attach(MIMEText(text_content, "plain", "utf-8"))
+    msg.attach(MIMEText(html_content, "html", "utf-8"))
+    return msg
+
+
+class SMTPConnectionPool:
+    """
+    SMTP连接池
+
+    保持少量已完成握手（STARTTLS）和登录的连接，多封邮件复用同一连接，
+    避免每封邮件都重新建立连接、握手和认证。出错的连接直接丢弃，下次按需重建。
+    """
+
+    def __init__(self, hostname: str, port: int, username: str = "", password: str = "",
+                 use_tls: bool = False, start_tls: bool = True, size: int = 3, timeout: float = 30):
+        self.hostname = hostname
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.start_tls = start_tls and not use_tls
+        self.size = max(size, 1)
+        self.timeout = timeout
+
+        self._idle: List[Tuple[aiosmtplib.SMTP, float]] = []
+        self._open = 0
+        self._condition: Optional[asyncio.Condition] = None
+        self._connects = 0
+
+    def _get_condition(self) -> asyncio.Condition:
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        client = aiosmtplib.SMTP(
+            hostname=self.hostname,
+            port=self.port,
+            use_tls=self.use_tls,
+            start_tls=self.start_tls,
+            timeout=self.timeout
+        )
+        await client.connect()
+        if self.username:
+            await client.login(self.username, self.password)
+        self._connects += 1
+        logger.info(f"SMTP连接已建立: {self.hostname}:{self.port}")
+        return client
+
+    async def acquire(self) -> aiosmtplib.SMTP:
+        """获取一个可用连接（连接数达到上限时等待其他发送完成）"""
+        condition = self._get_condition()
+        async with condition:
+            while True:
+                if self._idle:
+                    client, idle_since = self._idle.pop()
+                    break
+                if self._open < self.size:
+                    self._open += 1
+                    client = None
+                    break
+                await condition.wait()
+
+        if client is not None:
+            # 空闲过久的连接可能已被服务器关闭，先探活
+            if client.is_connected and time.monotonic() - idle_since < _IDLE_CHECK_SECONDS:
+                return client
+            try:
+                if client.is_connected:
+                    await client.noop()
+                    return client
+            except aiosmtplib.SMTPException:
+                pass
+            self._close_quietly(client)
+
+        try:
+            return await self._connect()
+        except Exception:
+            await self._discard_slot()
+            raise
+
+    async def release(self, client: aiosmtplib.SMTP, broken: bool = False) -> None:
+        """归还连接；broken为True时关闭连接并释放名额"""
+        if broken or not client.is_connected:
+            self._close_quietly(client)
+            await self._discard_slot()
+            return
+
+        condition = self._get_condition()
+        async with condition:
+            self._idle.append((client, time.monotonic()))
+            condition.notify()
+
+    async def _discard_slot(self) -> None:
+        condition = self._get_condition()
+        async with condition:
+            self._open -= 1
+            condition.notify()
+
+    @staticmethod
+    def _close_quietly(client: aiosmtplib.SMTP) -> None:
+        try:
+            client.close()
+        except Exception:
+            pass
+
+    async def close(self) -> None:
+        """关闭所有空闲连接"""
+        condition = self._get_condition()
+        async with condition:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for client, _ in idle:
+            try:
+                await client.quit()
+            except Exception:
+                self._close_quietly(client)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "size": self.size,
+            "open": self._open,
+            "idle": len(self._idle),
+            "connects": self._connects
+        }
+
+
+class EmailDeliveryWorker:
+    """
+    邮件投递工作协程
+
+    邮件先写入 email_outbox 表再由本协程按批取出，通过SMTP连接池并发发送：
+    - 取件时把邮件标记为sending并加锁（MySQL 8 下使用 SKIP LOCKED，多进程可同时投递）
+    - 临时性失败按指数退避重试，超过最大次数或收件人被拒绝时标记为failed
+    - 发送节点崩溃时，锁过期后邮件自动重新进入队列
+    """
+
+    def __init__(self, pool: SMTPConnectionPool, batch_size: int = 20, poll_seconds: float = 5,
+                 max_attempts: int = 5, retry_base_seconds: int = 30,
+                 session_factory: Callable[[], Session] = SessionLocal):
+        self.pool = pool
+        self.batch_size = max(batch_size, 1)
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max(max_attempts, 1)
+        self.retry_base_seconds = retry_base_seconds
+        self.session_factory = session_factory
+        self.node_id = f"{socket.gethostname()}:{os.getpid()}"
+
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        # 数据库操作使用独立线程，不占用默认线程池
+        self._db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="email-outbox")
+
+        # 指标
+        self._lock = threading.Lock()
+        self._totals = {"enqueued": 0, "sent": 0, "retried": 0, "failed": 0}
+        self._per_minute: "deque[List[Any]]" = deque(maxlen=_METRICS_MINUTES)
+
+    def enqueue(self, recipients: List[str], subject: str,
+                html_content: str, text_content: Optional[str] = None) -> bool:
+        """写入待发送队列并唤醒投递协程"""
+        db = self.session_factory()
+        try:
+            db.add(EmailOutbox(
+                recipients=",".join(recipients),
+                subject=subject,
+                html_content=html_content,
+                text_content=text_content,
+                status="pending",
+                attempts=0,
+                next_attempt_at=datetime.now()
+            ))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"邮件入队失败: {recipients}, 错误: {str(e)}")
+            return False
+        finally:
+            db.close()
+
+        self._record("enqueued")
+        self.notify()
+        return True
+
+    def notify(self) -> None:
+        """唤醒投递协程（可在任意线程调用）"""
+        if self._loop is None or self._wakeup is None:
+            return
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self._loop:
+            self._wakeup.set()
+        else:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def start(self) -> None:
+        """在当前事件循环中启动投递协程"""
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task = self._loop.create_task(self._run())
+        logger.info(f"邮件投递协程已启动: 连接池={self.pool.size}, 批量={self.batch_size}")
+
+    async def stop(self, timeout: float = 10) -> None:
+        """停止投递协程并关闭SMTP连接（正在发送的一批会先完成）"""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(self._task, timeout=timeout)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+            logger.warning("邮件投递协程停止超时，已取消")
+        except Exception as e:
+            logger.error(f"邮件投递协程退出异常: {str(e)}")
+        self._task = None
+        await self.pool.close()
+        logger.info("邮件投递协程已停止")
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while not self._stopping:
+            claimed = 0
+            try:
+                batch = await loop.run_in_executor(self._db_executor, self._claim_batch)
+                claimed = len(batch)
+                if batch:
+                    results = await asyncio.gather(*(self._deliver(item) for item in batch))
+                    await loop.run_in_executor(self._db_executor, self._complete, results)
+            except Exception as e:
+                logger.error(f"邮件投递批次失败: {str(e)}", exc_info=True)
+
+            # 整批取满说明还有积压，立即继续；否则等待新邮件或轮询间隔
+            if claimed >= self.batch_size:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def _claim_batch(self) -> List[Dict[str, Any]]:
+        """取出一批到期的邮件并加发送锁"""
+        db = self.session_factory()
+        try:
+            now = datetime.now()
+            rows = (
+                db.query(EmailOutbox)
+                .filter(and_(EmailOutbox.status == "pending", EmailOutbox.next_attempt_at <= now))
+                .order_by(EmailOutbox.next_attempt_at)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+                .all()
+            )
+            if len(rows) < self.batch_size:
+                # 发送锁已过期的邮件（发送节点崩溃）重新投递
+                rows += (
+                    db.query(EmailOutbox)
+                    .filter(and_(EmailOutbox.status == "sending", EmailOutbox.locked_until < now))
+                    .limit(self.batch_size - len(rows))
+                    .with_for_update(skip_locked=True)
+                    .all()
+                )
+
+            batch = []
+            locked_until = now + timedelta(seconds=_SEND_LOCK_SECONDS)
+            for row in rows:
+                row.status = "sending"
+                row.locked_by = self.node_id
+                row.locked_until = locked_until
+                row.attempts = (row.attempts or 0) + 1
+                batch.append({
+                    "id": row.id,
+                    "recipients": [address for address in row.recipients.split(",") if address],
+                    "subject": row.subject,
+                    "html_content": row.html_content,
+                    "text_content": row.text_content,
+                    "attempts": row.attempts
+                })
+            db.commit()
+            return batch
+
+        except Exception as e:
+            db.rollback()
+            logger.error(f"取出待发送邮件失败: {str(e)}")
+            return []
+        finally:
+            db.close()
+
+    def _complete(self, results: List[Tuple[Dict[str, Any], bool, Optional[str], bool]]) -> None:
+        """回写发送结果：成功的批量标记为sent，失败的按退避时间重新排队或标记为failed"""
+        db = self.session_factory()
+        try:
+            now = datetime.now()
+            sent_ids = [item["id"] for item, success, _, _ in results if success]
+            if sent_ids:
+                db.query(EmailOutbox).filter(EmailOutbox.id.in_(sent_ids)).update(
+                    {
+                        EmailOutbox.status: "sent",
+                        EmailOutbox.sent_at: now,
+                        # 正文包含验证码等敏感信息，发送成功后不再保留
+                        EmailOutbox.html_content: "",
+                        EmailOutbox.text_content: None,
+                        EmailOutbox.locked_by: None,
+                        EmailOutbox.locked_until: None,
+                        EmailOutbox.last_error: None
+                    },
+                    synchronize_session=False
+                )
+                self._record("sent", len(sent_ids))
+
+            for item, success, error, permanent in results:
+                if success:
+                    continue
+                values = {
+                    EmailOutbox.locked_by: None,
+                    EmailOutbox.locked_until: None,
+                    EmailOutbox.last_error: (error or "")[:500]
+                }
+                if permanent or item["attempts"] >= self.max_attempts:
+                    values[EmailOutbox.status] = "failed"
+                    self._record("failed")
+                    logger.error(f"邮件发送失败，不再重试: {item['recipients']}, 尝试次数: {item['attempts']}, 错误: {error}")
+                else:
+                    values[EmailOutbox.status] = "pending"
+                    values[EmailOutbox.next_attempt_at] = now + timedelta(seconds=self._retry_delay(item["attempts"]))
+                    self._record("retried")
+                    logger.warning(f"邮件发送失败，稍后重试: {item['recipients']}, 尝试次数: {item['attempts']}, 错误: {error}")
+                db.query(EmailOutbox).filter(EmailOutbox.id == item["id"]).update(values, synchronize_session=False)
+
+            db.commit()
+
+        except Exception as e:
+            db.rollback()
+            logger.error(f"回写邮件发送结果失败: {str(e)}")
+        finally:
+            db.close()
+
+    def _retry_delay(self, attempts: int) -> float:
+        """指数退避（带20%随机抖动，避免大量邮件同时重试）"""
+        delay = min(self.retry_base_seconds * (2 ** max(attempts - 1, 0)), _MAX_RETRY_DELAY_SECONDS)
+        return delay * (1 + random.random() * 0.2)
+
+    async def _deliver(self, item: Dict[str, Any]) -> Tuple[Dict[str, Any], bool, Optional[str], bool]:
+        """
+        通过连接池发送一封邮件
+
+        Returns:
+            (邮件, 是否成功, 错误信息, 是否为永久性失败)
+        """
+        try:
+            client = await self.pool.acquire()
+        except Exception as e:
+            return item, False, f"SMTP连接失败: {str(e)}", False
+
+        broken = False
+        try:
+            msg = build_email_message(item["recipients"], item["subject"], item["html_content"], item["text_content"])
+            await client.send_message(msg)
+            logger.info(f"邮件发送成功: {item['recipients']}, 主题: {item['subject']}")
+            return item, True, None, False
+
+        except aiosmtplib.SMTPRecipientsRefused as e:
+            return item, False, f"收件人被拒绝: {str(e)}", True
+
+        except aiosmtplib.SMTPResponseException as e:
+            # 5xx为永久性错误（除认证失败外），4xx为临时性错误；421表示服务器即将关闭连接
+            broken = e.code == 421 or isinstance(e, aiosmtplib.SMTPAuthenticationError)
+            permanent = 500 <= e.code < 600 and not isinstance(e, aiosmtplib.SMTPAuthenticationError)
+            return item, False, f"SMTP错误 {e.code}: {e.message}", permanent
+
+        except Exception as e:
+            broken = True
+            return item, False, f"{type(e).__name__}: {str(e)}", False
+
+        finally:
+            await self.pool.release(client, broken=broken)
+
+    def _record(self, name: str, count: int = 1) -> None:
+        minute = int(time.time() // 60)
+        with self._lock:
+            self._totals[name] += count
+            if not self._per_minute or self._per_minute[-1][0] != minute:
+                self._per_minute.append([minute, {"enqueued": 0, "sent": 0, "retried": 0, "failed": 0}])
+            self._per_minute[-1][1][name] += count
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取投递指标（累计值和最近每分钟吞吐）"""
+        current_minute = int(time.time() // 60)
+        with self._lock:
+            per_minute = [
+                {"minute": datetime.fromtimestamp(minute * 60).strftime("%Y-%m-%d %H:%M"), **counts}
+                for minute, counts in self._per_minute
+                if current_minute - minute < 15
+            ]
+            last_minute = next(
+                (counts for minute, counts in reversed(self._per_minute) if minute == current_minute - 1),
+                {"enqueued": 0, "sent": 0, "retried": 0, "failed": 0}
+            )
+            return {
+                "running": self._task is not None and not self._task.done(),
+                "pool": self.pool.get_metrics(),
+                "totals": dict(self._totals),
+                "last_minute": dict(last_minute),
+                "per_minute": per_minute
+            }
+
+    def purge_finished(self, db: Session, retention: timedelta, batch_size: int = 1000) -> int:
+        """
+        分批删除已结束（sent/failed）且超过保留时长的邮件记录
+
+        按最后一次发送时间（next_attempt_at，由 idx_email_outbox_dispatch 索引覆盖）判断，
+        每批先取出一批ID再按主键删除并提交。
+
+        Returns:
+            删除的记录数
+        """
+        cutoff = datetime.now() - retention
+        total_deleted = 0
+
+        while True:
+            try:
+                ids = [
+                    row.id for row in db.query(EmailOutbox.id)
+                    .filter(and_(EmailOutbox.status.in_(["sent", "failed"]), EmailOutbox.next_attempt_at < cutoff))
+                    .limit(batch_size)
+                    .all()
+                ]
+                if not ids:
+                    break
+
+                deleted = db.query(EmailOutbox).filter(EmailOutbox.id.in_(ids)).delete(synchronize_session=False)
+                db.commit()
+                total_deleted += deleted
+
+                if len(ids) < batch_size:
+                    break
+
+            except Exception as e:
+                db.rollback()
+                logger.error(f"清理已结束的邮件记录失败: {str(e)}")
+                break
+
+        return total_deleted
+
+    def get_queue_depth(self, db: Session) -> Dict[str, int]:
+        """按状态统计队列中的邮件数"""
+        rows = db.query(EmailOutbox.status, func.count(EmailOutbox.id)).group_by(EmailOutbox.status).all()
+        return {status: count for status, count in rows}
+
+
+# 创建全局投递实例
+email_delivery = EmailDeliveryWorker(
+    pool=SMTPConnectionPool(
+        hostname=settings.MAIL_SERVER,
+        port=settings.MAIL_PORT,
+        username=settings.MAIL_USERNAME,
+        password=settings.MAIL_PASSWORD,
+        use_tls=settings.MAIL_SSL_TLS,
+        start_tls=settings.MAIL_STARTTLS,
+        size=settings.EMAIL_SMTP_POOL_SIZE
+    ),
+    batch_size=settings.EMAIL_OUTBOX_BATCH_SIZE,
+    poll_seconds=settings.EMAIL_OUTBOX_POLL_SECONDS,
+    max_attempts=settings.EMAIL_OUTBOX_MAX_ATTEMPTS,
+    retry_base_seconds=settings.EMAIL_OUTBOX_RETRY_BASE_SECONDS
+)
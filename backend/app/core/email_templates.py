@@ -0,0 +1,110 @@
+import html
+import logging
+import re
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, Template, select_autoescape
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+_TEMPLATE_DIR = Path(__file__).parent.parent / "templates" / "email"
+
+# HTML转纯文本时使用的正则（仅在编译阶段执行一次）
+_STRIP_BLOCKS = re.compile(r"<(head|style|script)\b.*?</\1>", re.S | re.I)
+_LINK = re.compile(r"<a\b[^>]*href=\"([^\"]+)\"[^>]*>(.*?)</a>", re.S | re.I)
+_LINE_BREAK = re.compile(r"<(br|/p|/div|/h\d|/li|/tr)\b[^>]*>", re.I)
+_LIST_ITEM = re.compile(r"<li\b[^>]*>", re.I)
+_TAG = re.compile(r"<[^>]+>")
+_BLANK_LINES = re.compile(r"\n\s*\n+")
+
+
+def html_to_text_source(source: str) -> str:
+    """
+    把HTML模板源码转换为纯文本模板源码
+
+    Jinja表达式原样保留，生成的纯文本模板与HTML模板一起编译，渲染时不再做任何文本处理。
+    """
+    text = _STRIP_BLOCKS.sub("", source)
+    text = _LINK.sub(lambda match: f"{_TAG.sub('', match.group(2)).strip()}: {match.group(1)}", text)
+    text = _LIST_ITEM.sub("- ", text)
+    text = _LINE_BREAK.sub("\n", text)
+    text = _TAG.sub("", text)
+    lines = [" ".join(line.split()) for line in html.unescape(text).splitlines()]
+    return _BLANK_LINES.sub("\n\n", "\n".join(lines)).strip() + "\n"
+
+
+class EmailTemplateRegistry:
+    """
+    邮件模板注册表
+
+    启动时一次性编译 templates/email 下的全部模板并常驻内存，编译结果同时写入字节码缓存，
+    进程重启后无需重新解析模板源码。每个HTML模板都有对应的纯文本模板：
+    存在同名 .txt 文件时使用该文件，否则在编译阶段由HTML自动生成。
+    """
+
+    def __init__(self, template_dir: Path = _TEMPLATE_DIR, bytecode_cache_dir: Optional[str] = None):
+        self.template_dir = template_dir
+        if bytecode_cache_dir:
+            Path(bytecode_cache_dir).mkdir(parents=True, exist_ok=True)
+        self.environment = Environment(
+            loader=FileSystemLoader(str(template_dir)),
+            # 未指定目录时使用系统临时目录下的用户专属目录
+            bytecode_cache=FileSystemBytecodeCache(bytecode_cache_dir),
+            autoescape=select_autoescape(["html"]),
+            auto_reload=False,
+            cache_size=-1
+        )
+        self._text_environment = Environment(autoescape=False, auto_reload=False)
+        self._templates: Dict[str, Tuple[Template, Template]] = {}
+        self._lock = threading.Lock()
+
+    def compile_all(self) -> int:
+        """编译全部HTML模板（应用启动时调用），返回模板数量"""
+        for path in sorted(self.template_dir.glob("*.html")):
+            self._compile(path.stem)
+        logger.info(f"邮件模板编译完成: {len(self._templates)} 个")
+        return len(self._templates)
+
+    def _compile(self, name: str) -> Tuple[Template, Template]:
+        with self._lock:
+            compiled = self._templates.get(name)
+            if compiled is not None:
+                return compiled
+
+            html_template = self.environment.get_template(f"{name}.html")
+            text_path = self.template_dir / f"{name}.txt"
+            if text_path.exists():
+                text_template = self.environment.get_template(f"{name}.txt")
+            else:
+                source = (self.template_dir / f"{name}.html").read_text(encoding="utf-8")
+                text_template = self._text_environment.from_string(html_to_text_source(source))
+
+            compiled = (html_template, text_template)
+            self._templates[name] = compiled
+            return compiled
+
+    def render(self, name: str, context: Dict[str, Any]) -> Tuple[str, str]:
+        """
+        渲染模板
+
+        Args:
+            name: 模板名称（不含扩展名）
+            context: 模板变量
+
+        Returns:
+            (HTML正文, 纯文本正文)
+        """
+        html_template, text_template = self._templates.get(name) or self._compile(name)
+        return html_template.render(context), text_template.render(context)
+
+    def render_file(self, template_name: str, context: Dict[str, Any]) -> str:
+        """按文件名渲染单个模板（兼容旧的 render_template 接口）"""
+        return self.environment.get_template(template_name).render(context)
+
+
+# 创建全局模板注册表实例
+email_templates = EmailTemplateRegistry(bytecode_cache_dir=settings.EMAIL_TEMPLATE_CACHE_DIR or None)
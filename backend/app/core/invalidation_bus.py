@@ -0,0 +1,45 @@
+import logging
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, List, Sequence
+
+logger = logging.getLogger(__name__)
+
+# 用户密钥被禁用/删除/修改，载荷为受影响的 api_key 列表
+TOPIC_API_KEYS = "api_keys"
+# 订阅（套餐）被创建/修改/启停/删除，载荷为受影响的订阅ID列表
+TOPIC_PACKAGES = "packages"
+
+
+class InvalidationBus:
+    """
+    进程内缓存失效通知
+
+    写路径在提交后按主题发布受影响的键，持有相关缓存的模块订阅主题后自行失效。
+    回调在发布者线程中同步执行，应保持轻量；单个回调出错不影响其他订阅者和写路径。
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[str, List[Callable[[Sequence[str]], None]]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def subscribe(self, topic: str, callback: Callable[[Sequence[str]], None]) -> None:
+        """订阅主题"""
+        with self._lock:
+            self._subscribers[topic].append(callback)
+
+    def publish(self, topic: str, keys: Sequence[str]) -> None:
+        """发布失效通知"""
+        if not keys:
+            return
+        with self._lock:
+            callbacks = list(self._subscribers.get(topic, ()))
+        for callback in callbacks:
+            try:
+                callback(keys)
+            except Exception as e:
+                logger.error(f"缓存失效回调执行失败: {topic}, 错误: {str(e)}")
+
+
+# 创建全局失效通知实例
+invalidation_bus = InvalidationBus()
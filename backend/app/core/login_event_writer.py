@@ -0,0 +1,239 @@
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import and_, case, insert, update
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .principal_cache import principal_cache
+from ..db.database import SessionLocal
+from ..db.models import Admin, LoginHistory, User
+
+logger = logging.getLogger(__name__)
+
+# 单条事件最多重试写入的次数
+_MAX_WRITE_ATTEMPTS = 3
+
+
+class LoginEvent:
+    """一条待写入的登录/退出事件"""
+
+    __slots__ = (
+        "kind", "user_id", "admin_id", "admin_username", "occurred_at",
+        "ip_address", "user_agent", "login_status", "session_id", "attempts"
+    )
+
+    def __init__(self, kind: str, occurred_at: datetime, user_id: Optional[str] = None,
+                 admin_id: Optional[int] = None, admin_username: Optional[str] = None,
+                 ip_address: Optional[str] = None, user_agent: Optional[str] = None,
+                 login_status: str = "success", session_id: Optional[str] = None):
+        self.kind = kind
+        self.occurred_at = occurred_at
+        self.user_id = user_id
+        self.admin_id = admin_id
+        self.admin_username = admin_username
+        self.ip_address = ip_address
+        self.user_agent = user_agent
+        self.login_status = login_status
+        self.session_id = session_id
+        self.attempts = 0
+
+
+class LoginEventWriter:
+    """
+    登录事件缓冲写入器
+
+    登录/退出事件先放入内存队列，由后台线程每隔几百毫秒批量写入：
+    登录历史用一条多行INSERT写入，last_login_at 按用户合并后用一条 UPDATE ... CASE 更新，
+    整批只提交一次。登录接口不再等待审计写入；应用关闭时先写完队列中剩余的事件。
+    """
+
+    def __init__(self, flush_interval_ms: int = 300, batch_size: int = 500, max_queue_size: int = 10000,
+                 session_factory: Callable[[], Session] = SessionLocal):
+        self.flush_interval = max(flush_interval_ms, 10) / 1000
+        self.batch_size = max(batch_size, 1)
+        self.session_factory = session_factory
+
+        self._queue: "queue.Queue[LoginEvent]" = queue.Queue(maxsize=max(max_queue_size, 1))
+        self._retry: List[LoginEvent] = []
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._flush_lock = threading.Lock()
+
+        # 指标
+        self._written = 0
+        self._dropped = 0
+        self._failed_batches = 0
+        self._batches = 0
+        self._last_flush_ms = 0.0
+
+    def record_login(self, user_id: str, ip_address: Optional[str] = None, user_agent: Optional[str] = None,
+                     login_status: str = "success", session_id: Optional[str] = None) -> None:
+        """记录普通用户登录（成功登录同时更新 last_login_at）"""
+        self._enqueue(LoginEvent(
+            "login", datetime.now(), user_id=user_id, ip_address=ip_address,
+            user_agent=user_agent, login_status=login_status, session_id=session_id
+        ))
+
+    def record_admin_login(self, admin_id: int, username: str) -> None:
+        """记录管理员登录（更新管理员 last_login_at）"""
+        self._enqueue(LoginEvent("admin_login", datetime.now(), admin_id=admin_id, admin_username=username))
+
+    def record_logout(self, session_id: str) -> None:
+        """记录退出登录（回填登录历史的退出时间）"""
+        self._enqueue(LoginEvent("logout", datetime.now(), session_id=session_id))
+
+    def _enqueue(self, event: LoginEvent) -> None:
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            # 队列已满时丢弃事件，不阻塞登录请求
+            self._dropped += 1
+            logger.warning(f"登录事件队列已满，丢弃事件: {event.kind}")
+
+    def start(self) -> None:
+        """启动后台写入线程"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="login-event-writer", daemon=True)
+        self._thread.start()
+        logger.info(f"登录事件写入线程已启动: 间隔={int(self.flush_interval * 1000)}ms, 批量={self.batch_size}")
+
+    def stop(self, timeout: float = 10) -> None:
+        """停止后台线程并写完队列中剩余的事件"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+        remaining = self.flush()
+        logger.info(f"登录事件写入线程已停止，关闭前写入 {remaining} 条")
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"登录事件写入失败: {str(e)}", exc_info=True)
+
+    def flush(self) -> int:
+        """写入队列中当前所有事件，返回写入条数"""
+        written = 0
+        with self._flush_lock:
+            while True:
+                batch, self._retry = self._retry[:self.batch_size], self._retry[self.batch_size:]
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if not batch:
+                    break
+
+                if not self._write_batch(batch):
+                    # 写入失败的事件下次重试，超过次数后丢弃；本轮不再继续
+                    self._retry = [event for event in batch if event.attempts < _MAX_WRITE_ATTEMPTS] + self._retry
+                    self._dropped += sum(1 for event in batch if event.attempts >= _MAX_WRITE_ATTEMPTS)
+                    break
+                written += len(batch)
+                if len(batch) < self.batch_size:
+                    break
+        return written
+
+    def _write_batch(self, events: List[LoginEvent]) -> bool:
+        start = time.perf_counter()
+        login_rows: List[Dict[str, Any]] = []
+        user_logins: Dict[str, datetime] = {}
+        admin_logins: Dict[int, datetime] = {}
+        admin_usernames = set()
+        logouts: Dict[str, datetime] = {}
+
+        for event in events:
+            event.attempts += 1
+            if event.kind == "login":
+                login_rows.append({
+                    "user_id": event.user_id,
+                    "login_time": event.occurred_at,
+                    "ip_address": event.ip_address,
+                    "user_agent": event.user_agent,
+                    "login_status": event.login_status,
+                    "session_id": event.session_id
+                })
+                if event.login_status == "success":
+                    user_logins[event.user_id] = max(event.occurred_at, user_logins.get(event.user_id, event.occurred_at))
+            elif event.kind == "admin_login":
+                admin_logins[event.admin_id] = max(event.occurred_at, admin_logins.get(event.admin_id, event.occurred_at))
+                admin_usernames.add(event.admin_username)
+            elif event.kind == "logout" and event.session_id:
+                logouts[event.session_id] = event.occurred_at
+
+        db = self.session_factory()
+        try:
+            if login_rows:
+                db.execute(insert(LoginHistory), login_rows)
+            if user_logins:
+                db.execute(
+                    update(User)
+                    .where(User.user_id.in_(list(user_logins)))
+                    .values(last_login_at=case(user_logins, value=User.user_id))
+                    .execution_options(synchronize_session=False)
+                )
+            if admin_logins:
+                db.execute(
+                    update(Admin)
+                    .where(Admin.id.in_(list(admin_logins)))
+                    .values(last_login_at=case(admin_logins, value=Admin.id))
+                    .execution_options(synchronize_session=False)
+                )
+            if logouts:
+                db.execute(
+                    update(LoginHistory)
+                    .where(and_(LoginHistory.session_id.in_(list(logouts)), LoginHistory.logout_time.is_(None)))
+                    .values(logout_time=case(logouts, value=LoginHistory.session_id))
+                    .execution_options(synchronize_session=False)
+                )
+            db.commit()
+
+        except Exception as e:
+            db.rollback()
+            self._failed_batches += 1
+            logger.error(f"登录事件批量写入失败: {len(events)} 条, 错误: {str(e)}")
+            return False
+        finally:
+            db.close()
+
+        # 登录主体快照包含最后登录时间
+        for user_id in user_logins:
+            principal_cache.invalidate_user(user_id)
+        for username in admin_usernames:
+            principal_cache.invalidate_admin(username)
+
+        self._batches += 1
+        self._written += len(events)
+        self._last_flush_ms = (time.perf_counter() - start) * 1000
+        return True
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取写入器状态"""
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "queued": self._queue.qsize(),
+            "retrying": len(self._retry),
+            "written": self._written,
+            "batches": self._batches,
+            "failed_batches": self._failed_batches,
+            "dropped": self._dropped,
+            "last_flush_ms": round(self._last_flush_ms, 2)
+        }
+
+
+# 创建全局写入器实例
+login_event_writer = LoginEventWriter(
+    flush_interval_ms=settings.LOGIN_EVENT_FLUSH_MS,
+    batch_size=settings.LOGIN_EVENT_BATCH_SIZE,
+    max_queue_size=settings.LOGIN_EVENT_QUEUE_SIZE
+)
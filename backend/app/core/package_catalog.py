@@ -0,0 +1,130 @@
+import hashlib
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import Callable, Dict, Optional, Tuple
+
+from sqlalchemy import asc, func
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .invalidation_bus import invalidation_bus, TOPIC_PACKAGES
+from ..db.database import SessionLocal
+from ..db.models import Package
+from ..schemas.package import PackageListResponse, PackageResponse
+
+logger = logging.getLogger(__name__)
+
+
+class CachedBody:
+    """预先序列化好的响应体及其强ETag"""
+
+    __slots__ = ("body", "etag")
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """If-None-Match 是否命中（按RFC 7232使用弱比较）"""
+        if not if_none_match:
+            return False
+        for candidate in if_none_match.split(","):
+            candidate = candidate.strip()
+            if candidate == "*" or candidate.removeprefix("W/") == self.etag:
+                return True
+        return False
+
+
+class CatalogSnapshot:
+    """订阅目录快照（版本号递增，创建后不再修改）"""
+
+    __slots__ = ("version", "fingerprint", "last_modified", "active_list", "full_list", "details")
+
+    def __init__(self, version: int, fingerprint: Tuple, active_list: CachedBody, full_list: CachedBody,
+                 details: Dict[int, CachedBody]):
+        self.version = version
+        self.fingerprint = fingerprint
+        self.last_modified = format_datetime(datetime.now(timezone.utc), usegmt=True)
+        self.active_list = active_list
+        self.full_list = full_list
+        self.details = details
+
+
+class PackageCatalog:
+    """
+    订阅目录缓存
+
+    订阅列表和详情在构建快照时一次性序列化为JSON字节串，请求直接返回字节串和对应ETag，
+    条件请求命中时返回304，不访问数据库也不重新序列化。
+    PackageCRUD 提交变更后发布失效通知，下一次请求重新构建；
+    多进程部署下其他进程每隔 revalidate_seconds 用一条聚合查询比对指纹，指纹变化时才重建。
+    """
+
+    def __init__(self, revalidate_seconds: int = 60, session_factory: Callable[[], Session] = SessionLocal):
+        self.revalidate_seconds = revalidate_seconds
+        self.session_factory = session_factory
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._stale = True
+        self._checked_at = 0.0
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def invalidate(self) -> None:
+        """标记快照过期（订阅变更提交后调用）"""
+        self._stale = True
+
+    def get_snapshot(self) -> CatalogSnapshot:
+        """获取当前快照（过期时重建）"""
+        snapshot = self._snapshot
+        if snapshot is not None and not self._stale and time.monotonic() - self._checked_at < self.revalidate_seconds:
+            return snapshot
+
+        with self._lock:
+            if self._snapshot is not None and not self._stale and \
+                    time.monotonic() - self._checked_at < self.revalidate_seconds:
+                return self._snapshot
+
+            db = self.session_factory()
+            try:
+                fingerprint = self._fingerprint(db)
+                if self._snapshot is None or self._stale or fingerprint != self._snapshot.fingerprint:
+                    # 先清除标记：构建期间再有变更时下一次请求会再次重建
+                    self._stale = False
+                    self._snapshot = self._build(db, fingerprint)
+                self._checked_at = time.monotonic()
+                return self._snapshot
+            finally:
+                db.close()
+
+    @staticmethod
+    def _fingerprint(db: Session) -> Tuple:
+        count, max_id, max_updated = db.query(
+            func.count(Package.id), func.max(Package.id), func.max(Package.updated_at)
+        ).one()
+        return count, max_id, str(max_updated)
+
+    def _build(self, db: Session, fingerprint: Tuple) -> CatalogSnapshot:
+        packages = [
+            PackageResponse.model_validate(package)
+            for package in db.query(Package).order_by(asc(Package.sort_order)).all()
+        ]
+        active = [package for package in packages if package.is_active]
+
+        self._version += 1
+        snapshot = CatalogSnapshot(
+            version=self._version,
+            fingerprint=fingerprint,
+            active_list=CachedBody(PackageListResponse(packages=active, total=len(active)).model_dump_json().encode("utf-8")),
+            full_list=CachedBody(PackageListResponse(packages=packages, total=len(packages)).model_dump_json().encode("utf-8")),
+            details={package.id: CachedBody(package.model_dump_json().encode("utf-8")) for package in packages}
+        )
+        logger.info(f"订阅目录快照已重建: 版本 {snapshot.version}, 共 {len(packages)} 个订阅")
+        return snapshot
+
+
+# 创建全局订阅目录实例
+package_catalog = PackageCatalog(revalidate_seconds=settings.PACKAGE_CATALOG_REVALIDATE_SECONDS)
+invalidation_bus.subscribe(TOPIC_PACKAGES, lambda package_ids: package_catalog.invalidate())
@@ -0,0 +1,232 @@
+import asyncio
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# 工作进程/线程内使用的密码上下文（进程池模式下每个子进程各自创建一份，按cost缓存）
+_pwd_contexts: Dict[Optional[int], CryptContext] = {}
+
+
+def _get_pwd_context(rounds: Optional[int] = None) -> CryptContext:
+    """获取密码上下文；指定rounds时新哈希使用该cost，cost不同的旧哈希视为需要更新"""
+    context = _pwd_contexts.get(rounds)
+    if context is None:
+        if rounds:
+            context = CryptContext(
+                schemes=["bcrypt"],
+                deprecated="auto",
+                bcrypt__default_rounds=rounds,
+                bcrypt__min_rounds=rounds,
+                bcrypt__max_rounds=rounds
+            )
+        else:
+            context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+        _pwd_contexts[rounds] = context
+    return context
+
+
+def hash_password_sync(password: str, rounds: Optional[int] = None) -> str:
+    """计算密码哈希（在工作进程中执行）"""
+    return _get_pwd_context(rounds).hash(password)
+
+
+def verify_password_sync(plain_password: str, hashed_password: str) -> bool:
+    """校验密码（在工作进程中执行）"""
+    return _get_pwd_context().verify(plain_password, hashed_password)
+
+
+def verify_and_update_sync(plain_password: str, hashed_password: str,
+                           rounds: Optional[int] = None) -> Tuple[bool, Optional[str]]:
+    """
+    校验密码，密码正确且哈希cost与目标不同时顺便用目标cost重新计算哈希（在工作进程中执行）
+
+    Returns:
+        (是否正确, 新哈希；不需要更新时为None)
+    """
+    return _get_pwd_context(rounds).verify_and_update(plain_password, hashed_password)
+
+
+def calibrate_bcrypt_rounds(target_ms: float, min_rounds: int, max_rounds: int, samples: int = 3) -> int:
+    """
+    测量本机bcrypt速度，选出耗时不超过目标的最大cost
+
+    cost每加1耗时翻倍，因此只在min_rounds下实测（取多次中的最小值以排除干扰），再按2的幂推算。
+    结果限制在 [min_rounds, max_rounds] 范围内，目标过低时也不会低于min_rounds。
+    """
+    min_rounds = max(min_rounds, 4)
+    max_rounds = max(max_rounds, min_rounds)
+    context = _get_pwd_context(min_rounds)
+
+    elapsed_ms = float("inf")
+    for _ in range(max(samples, 1)):
+        start = time.perf_counter()
+        context.hash("calibration-password")
+        elapsed_ms = min(elapsed_ms, (time.perf_counter() - start) * 1000)
+
+    rounds = min_rounds
+    while rounds < max_rounds and elapsed_ms * 2 ** (rounds + 1 - min_rounds) <= target_ms:
+        rounds += 1
+
+    logger.info(
+        f"bcrypt cost校准完成: cost={rounds}, 预计耗时={elapsed_ms * 2 ** (rounds - min_rounds):.0f}ms, "
+        f"目标={target_ms:.0f}ms（cost {min_rounds} 实测 {elapsed_ms:.1f}ms）"
+    )
+    return rounds
+
+
+class PasswordHasherBusy(HTTPException):
+    """密码哈希线程池已满，请求被拒绝（返回503，客户端稍后重试）"""
+
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="系统繁忙，请稍后重试",
+            headers={"Retry-After": "1"}
+        )
+
+
+class PasswordHasherPool:
+    """
+    密码哈希工作池
+
+    bcrypt每次计算约占用数百毫秒CPU，直接在async路由中调用会阻塞整个事件循环。
+    这里把哈希/校验放到独立的有界执行器中（默认进程池，绕开GIL），
+    排队中的任务数超过上限时直接拒绝，避免登录高峰拖垮其他接口。
+    """
+
+    def __init__(self, mode: str, workers: int, max_pending: int):
+        self.mode = mode
+        self.workers = max(workers, 1)
+        self.max_pending = max(max_pending, 1)
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        # 新哈希使用的bcrypt cost（None表示使用passlib默认值，且不会触发重新哈希）
+        self.rounds: Optional[int] = None
+
+        # 指标
+        self._in_flight = 0
+        self._max_in_flight = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._total_seconds = 0.0
+        self._rehashed = 0
+
+    def configure_rounds(self, rounds: Optional[int]) -> None:
+        """设置新哈希使用的bcrypt cost"""
+        self.rounds = rounds
+        logger.info(f"密码哈希cost已设置: {rounds}")
+
+    def _get_executor(self) -> Executor:
+        """延迟创建执行器（首次使用时）"""
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    if self.mode == "process":
+                        # 使用spawn避免fork时继承父进程的数据库连接和调度器线程
+                        self._executor = ProcessPoolExecutor(
+                            max_workers=self.workers,
+                            mp_context=multiprocessing.get_context("spawn")
+                        )
+                    else:
+                        self._executor = ThreadPoolExecutor(
+                            max_workers=self.workers,
+                            thread_name_prefix="password-hasher"
+                        )
+                    logger.info(f"密码哈希工作池已启动: 模式={self.mode}, 并发={self.workers}, 排队上限={self.max_pending}")
+        return self._executor
+
+    def _acquire_slot(self) -> None:
+        with self._lock:
+            if self._in_flight >= self.max_pending:
+                self._rejected += 1
+                logger.warning(f"密码哈希工作池已满，拒绝请求: 排队中={self._in_flight}")
+                raise PasswordHasherBusy()
+            self._in_flight += 1
+            self._submitted += 1
+            self._max_in_flight = max(self._max_in_flight, self._in_flight)
+
+    def _release_slot(self, elapsed: float, success: bool) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            self._total_seconds += elapsed
+            if success:
+                self._completed += 1
+            else:
+                self._failed += 1
+
+    async def _run(self, func: Callable[..., Any], *args: Any) -> Any:
+        self._acquire_slot()
+        start = time.perf_counter()
+        success = False
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._get_executor(), func, *args)
+            success = True
+            return result
+        finally:
+            self._release_slot(time.perf_counter() - start, success)
+
+    async def hash(self, password: str) -> str:
+        """异步计算密码哈希"""
+        return await self._run(hash_password_sync, password, self.rounds)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """异步校验密码"""
+        return await self._run(verify_password_sync, plain_password, hashed_password)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """异步校验密码，cost与当前设置不同时同时返回用新cost计算的哈希"""
+        valid, new_hash = await self._run(verify_and_update_sync, plain_password, hashed_password, self.rounds)
+        if new_hash:
+            with self._lock:
+                self._rehashed += 1
+        return valid, new_hash
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取工作池指标"""
+        with self._lock:
+            finished = self._completed + self._failed
+            return {
+                "mode": self.mode,
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "started": self._executor is not None,
+                "in_flight": self._in_flight,
+                "queue_depth": max(self._in_flight - self.workers, 0),
+                "max_in_flight": self._max_in_flight,
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "bcrypt_rounds": self.rounds,
+                "rehashed": self._rehashed,
+                "avg_latency_ms": round(self._total_seconds / finished * 1000, 2) if finished else 0.0
+            }
+
+    def shutdown(self) -> None:
+        """关闭工作池"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+            logger.info("密码哈希工作池已关闭")
+
+
+# 创建全局工作池实例
+password_hasher = PasswordHasherPool(
+    mode=settings.PASSWORD_HASH_EXECUTOR,
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING
+)
@@ -0,0 +1,180 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from .config import settings
+
+
+class Principal:
+    """
+    当前登录主体（普通用户或管理员）的只读快照
+
+    由 get_current_user 返回，只包含鉴权和接口展示需要的字段，创建后不可修改，
+    可以安全地在多个请求之间共享。
+    """
+
+    __slots__ = (
+        "id",
+        "user_id",
+        "username",
+        "email",
+        "phone",
+        "role",
+        "admin_role",
+        "is_active",
+        "is_email_verified",
+        "is_banned",
+        "is_deleted",
+        "last_login_at",
+        "created_at",
+        "updated_at",
+        "is_admin",
+        "user_type",
+    )
+
+    def __init__(self, **fields: Any):
+        for name in self.__slots__:
+            object.__setattr__(self, name, fields.get(name))
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("Principal对象不可修改")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError("Principal对象不可修改")
+
+    def __repr__(self) -> str:
+        return f"Principal(user_id={self.user_id!r}, user_type={self.user_type!r}, role={self.role!r})"
+
+    @classmethod
+    def from_user(cls, user) -> "Principal":
+        """从普通用户记录创建"""
+        return cls(
+            id=user.id,
+            user_id=user.user_id,
+            username=None,
+            email=user.email,
+            phone=user.phone,
+            role="user",  # 普通用户统一角色
+            admin_role=None,
+            is_active=user.is_active,
+            is_email_verified=user.is_email_verified,
+            is_banned=user.is_banned,
+            is_deleted=False,
+            last_login_at=user.last_login_at,
+            created_at=user.created_at,
+            updated_at=user.updated_at,
+            is_admin=False,
+            user_type="user",
+        )
+
+    @classmethod
+    def from_admin(cls, admin) -> "Principal":
+        """从管理员记录创建（与普通用户完全分离）"""
+        return cls(
+            id=admin.id,
+            user_id=f"admin_{admin.username}",
+            username=admin.username,
+            email=admin.username,  # 管理员使用用户名作为标识
+            phone=None,  # 管理员不使用phone字段
+            role=admin.role.value if hasattr(admin.role, 'value') else admin.role,
+            admin_role=admin.role,  # 保留原始管理员角色对象
+            is_active=admin.is_active,
+            is_email_verified=True,  # 管理员不需要邮箱验证
+            is_banned=False,  # 管理员使用is_deleted而非is_banned
+            is_deleted=admin.is_deleted,
+            last_login_at=admin.last_login_at,
+            created_at=admin.created_at,
+            updated_at=admin.updated_at,
+            is_admin=True,
+            user_type="admin",
+        )
+
+    @classmethod
+    def from_claims(cls, payload: dict) -> "Principal":
+        """从携带状态声明的访问令牌创建（不查询数据库，时间类字段为空）"""
+        is_admin = str(payload.get("sub", "")).startswith("admin_")
+        username = payload.get("username")
+        return cls(
+            id=payload.get("admin_id") if is_admin else None,
+            user_id=payload.get("sub"),
+            username=username,
+            email=username if is_admin else payload.get("email"),
+            role=payload.get("role", "user"),
+            admin_role=payload.get("role") if is_admin else None,
+            is_active=bool(payload.get("active")),
+            is_email_verified=True if is_admin else bool(payload.get("verified")),
+            is_banned=bool(payload.get("banned")),
+            is_deleted=False,
+            is_admin=is_admin,
+            user_type="admin" if is_admin else "user",
+        )
+
+
+class PrincipalCache:
+    """
+    登录主体缓存 - 以令牌subject为键的短TTL进程内缓存
+
+    只缓存校验通过的主体；用户/管理员状态变更时由CRUD层主动失效，
+    多进程部署下其他进程最多在TTL内读到旧状态。
+    """
+
+    def __init__(self, ttl_seconds: int, max_size: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, subject: str) -> Optional[Principal]:
+        """获取缓存的主体，过期或不存在时返回None"""
+        if self.ttl_seconds <= 0:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(subject)
+            if entry is None:
+                return None
+
+            principal, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[subject]
+                return None
+
+            self._entries.move_to_end(subject)
+            return principal
+
+    def set(self, subject: str, principal: Principal) -> None:
+        """缓存主体，超出容量时淘汰最久未使用的条目"""
+        if self.ttl_seconds <= 0:
+            return
+
+        with self._lock:
+            self._entries[subject] = (principal, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(subject)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, subject: str) -> None:
+        """使指定主体的缓存失效"""
+        with self._lock:
+            self._entries.pop(subject, None)
+
+    def invalidate_user(self, user_id: str) -> None:
+        """使普通用户的缓存失效"""
+        self.invalidate(user_id)
+
+    def invalidate_admin(self, username: str) -> None:
+        """使管理员的缓存失效"""
+        self.invalidate(f"admin_{username}")
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+
+
+# 创建全局缓存实例
+principal_cache = PrincipalCache(
+    ttl_seconds=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+    max_size=settings.PRINCIPAL_CACHE_MAX_SIZE
+)
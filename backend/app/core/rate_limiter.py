@@ -0,0 +1,417 @@
+import hashlib
+import ipaddress
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+from fastapi import HTTPException, Request, status
+from sqlalchemy import and_, func
+from sqlalchemy.dialects.mysql import insert
+from sqlalchemy.orm import Session
+
+from .config import settings
+from ..db.models import RateLimit
+
+logger = logging.getLogger(__name__)
+
+# rate_limits.user_id 字段长度
+_MAX_IDENTITY_LENGTH = 50
+# 持久化时每条INSERT写入的计数行数
+_FLUSH_CHUNK_SIZE = 500
+
+
+def parse_limit(value: str) -> Tuple[int, int]:
+    """解析 "次数/秒数" 格式的限制配置，如 "20/60" 表示60秒内最多20次"""
+    count, _, seconds = value.partition("/")
+    return int(count), int(seconds or 60)
+
+
+def normalize_identity(identity: str) -> str:
+    """限流主体标识，超过字段长度时使用摘要"""
+    if len(identity) <= _MAX_IDENTITY_LENGTH:
+        return identity
+    return "h:" + hashlib.sha1(identity.encode("utf-8")).hexdigest()
+
+
+class RateLimitPolicy:
+    """限流策略：window_seconds 秒内最多 max_requests 次"""
+
+    __slots__ = ("service", "max_requests", "window_seconds")
+
+    def __init__(self, service: str, max_requests: int, window_seconds: int):
+        self.service = service
+        self.max_requests = max_requests
+        self.window_seconds = max(window_seconds, 1)
+
+
+class RateLimitResult:
+    """一次限流判定的结果"""
+
+    __slots__ = ("allowed", "remaining", "retry_after")
+
+    def __init__(self, allowed: bool, remaining: int, retry_after: int = 0):
+        self.allowed = allowed
+        self.remaining = remaining
+        self.retry_after = retry_after
+
+
+class _WindowCounter:
+    """滑动窗口计数（当前固定窗口 + 上一窗口按剩余比例加权）"""
+
+    __slots__ = ("window_start", "count", "previous_count", "unflushed")
+
+    def __init__(self, window_start: int):
+        self.window_start = window_start
+        self.count = 0
+        self.previous_count = 0
+        self.unflushed = 0
+
+    def roll(self, window_start: int) -> None:
+        """进入新的固定窗口"""
+        if window_start == self.window_start:
+            return
+        # 只跨过一个窗口时，当前计数变为上一窗口计数；跨过多个窗口时全部清零
+        self.previous_count = self.count if window_start - self.window_start == 1 else 0
+        self.window_start = window_start
+        self.count = 0
+
+
+class RateLimiter:
+    """
+    进程内滑动窗口限流器
+
+    判定完全在内存中完成（一次加锁的字典操作），被拒绝的请求不会触达数据库或bcrypt。
+    计数增量定期批量累加到 rate_limits 表，启动时从表中恢复当前窗口的计数，
+    多进程部署时各进程的增量都会累加到同一行（由 uq_rate_limit_window 唯一索引保证每个窗口一行）。
+
+    计数按最近访问顺序保存，条目数达到 max_entries 时淘汰最久未访问的条目（每次O(1)），
+    大量不同主体的请求（如撞库）不会让内存无限增长，也不会在每个请求上扫描全部条目；
+    被淘汰条目未持久化的增量留到下次持久化时写入。已过期条目在每次持久化时统一清理。
+    """
+
+    def __init__(self, enabled: bool = True, max_entries: int = 100000):
+        self.enabled = enabled
+        self.max_entries = max(max_entries, 1)
+        self._policies: Dict[str, RateLimitPolicy] = {}
+        self._counters: "OrderedDict[Tuple[str, str], _WindowCounter]" = OrderedDict()
+        # 被淘汰条目尚未持久化的增量: (策略, 主体, 窗口序号, 增量)
+        self._evicted_pending: List[Tuple[str, str, int, int]] = []
+        self._lock = threading.Lock()
+        self._rejected = 0
+        self._evicted = 0
+
+    def register_policy(self, service: str, max_requests: int, window_seconds: int) -> RateLimitPolicy:
+        """注册（或替换）限流策略"""
+        policy = RateLimitPolicy(service, max_requests, window_seconds)
+        self._policies[service] = policy
+        return policy
+
+    def get_policy(self, service: str) -> Optional[RateLimitPolicy]:
+        return self._policies.get(service)
+
+    def hit(self, service: str, identity: str, now: Optional[float] = None) -> RateLimitResult:
+        """
+        记录一次请求并判定是否放行
+
+        Args:
+            service: 策略名称
+            identity: 限流主体（IP、邮箱、API密钥等）
+            now: 当前时间戳（秒），默认取系统时间
+
+        Returns:
+            判定结果；未注册的策略或限流关闭时总是放行
+        """
+        policy = self._policies.get(service)
+        if not self.enabled or policy is None:
+            return RateLimitResult(True, -1)
+
+        now = time.time() if now is None else now
+        window = policy.window_seconds
+        window_start = int(now // window)
+        elapsed_ratio = (now - window_start * window) / window
+        key = (service, normalize_identity(identity))
+
+        with self._lock:
+            counter = self._counters.get(key)
+            if counter is None:
+                if len(self._counters) >= self.max_entries:
+                    self._evict_oldest_locked()
+                counter = _WindowCounter(window_start)
+                self._counters[key] = counter
+            else:
+                self._counters.move_to_end(key)
+                counter.roll(window_start)
+
+            estimated = counter.previous_count * (1 - elapsed_ratio) + counter.count
+            if estimated >= policy.max_requests:
+                self._rejected += 1
+                # 估算需要等待多久加权计数才会降到上限以下
+                if counter.previous_count and counter.count < policy.max_requests:
+                    needed = (estimated - policy.max_requests + 1) / counter.previous_count
+                    retry_after = needed * window
+                else:
+                    retry_after = (1 - elapsed_ratio) * window
+                return RateLimitResult(False, 0, max(1, math.ceil(retry_after)))
+
+            counter.count += 1
+            counter.unflushed += 1
+            return RateLimitResult(True, max(0, int(policy.max_requests - estimated - 1)))
+
+    def _evict_oldest_locked(self) -> None:
+        """淘汰最久未访问的条目直到低于上限，保留其未持久化的增量"""
+        while len(self._counters) >= self.max_entries:
+            (service, identity), counter = self._counters.popitem(last=False)
+            if counter.unflushed and len(self._evicted_pending) < self.max_entries:
+                self._evicted_pending.append((service, identity, counter.window_start, counter.unflushed))
+            self._evicted += 1
+
+    def _evict_expired_locked(self, now: float) -> None:
+        """淘汰已完全滑出窗口且没有待持久化增量的计数"""
+        expired = []
+        for (service, identity), counter in self._counters.items():
+            policy = self._policies.get(service)
+            if policy is None or (
+                counter.unflushed == 0 and int(now // policy.window_seconds) - counter.window_start > 1
+            ):
+                expired.append((service, identity))
+        for key in expired:
+            del self._counters[key]
+
+    def flush(self, db: Session) -> int:
+        """
+        将计数增量批量累加到 rate_limits 表
+
+        Returns:
+            写入的计数行数
+        """
+        with self._lock:
+            pending, self._evicted_pending = self._evicted_pending, []
+            for (service, identity), counter in self._counters.items():
+                if counter.unflushed:
+                    pending.append((service, identity, counter.window_start, counter.unflushed))
+                    counter.unflushed = 0
+            self._evict_expired_locked(time.time())
+
+        if not pending:
+            return 0
+
+        # 被淘汰后又重新出现的主体可能有两条同一窗口的增量，先合并
+        merged: Dict[Tuple[str, str, int], int] = {}
+        for service, identity, window_start, delta in pending:
+            merged[(service, identity, window_start)] = merged.get((service, identity, window_start), 0) + delta
+        pending = [(service, identity, window_start, delta) for (service, identity, window_start), delta in merged.items()]
+
+        rows = []
+        for service, identity, window_start, delta in pending:
+            policy = self._policies[service]
+            start = datetime.fromtimestamp(window_start * policy.window_seconds)
+            rows.append({
+                "user_id": identity,
+                "service": service,
+                "requests_count": delta,
+                "window_start": start,
+                "window_end": start + timedelta(seconds=policy.window_seconds),
+                "max_requests": policy.max_requests
+            })
+
+        try:
+            # 窗口行已存在时在数据库端累加增量（多进程同时写入时不会丢失计数，也不会插入重复行）
+            for index in range(0, len(rows), _FLUSH_CHUNK_SIZE):
+                statement = insert(RateLimit).values(rows[index:index + _FLUSH_CHUNK_SIZE])
+                db.execute(statement.on_duplicate_key_update(
+                    requests_count=RateLimit.requests_count + statement.inserted.requests_count,
+                    max_requests=statement.inserted.max_requests,
+                    updated_at=func.now()
+                ))
+            db.commit()
+            return len(pending)
+
+        except Exception as e:
+            db.rollback()
+            # 写入失败时把增量加回去，下次重试
+            with self._lock:
+                for service, identity, window_start, delta in pending:
+                    counter = self._counters.get((service, identity))
+                    if counter and counter.window_start == window_start:
+                        counter.unflushed += delta
+                    elif len(self._evicted_pending) < self.max_entries:
+                        self._evicted_pending.append((service, identity, window_start, delta))
+            logger.error(f"限流计数持久化失败: {str(e)}")
+            return 0
+
+    def load(self, db: Session) -> int:
+        """
+        从 rate_limits 表恢复当前窗口和上一窗口的计数（应用启动时调用）
+
+        Returns:
+            恢复的计数行数
+        """
+        if not self._policies:
+            return 0
+
+        now = time.time()
+        oldest = min(
+            datetime.fromtimestamp((int(now // policy.window_seconds) - 1) * policy.window_seconds)
+            for policy in self._policies.values()
+        )
+
+        try:
+            records = (
+                db.query(RateLimit.service, RateLimit.user_id, RateLimit.window_start, RateLimit.requests_count)
+                .filter(
+                    and_(
+                        RateLimit.service.in_(list(self._policies)),
+                        RateLimit.window_start >= oldest
+                    )
+                )
+                .all()
+            )
+        except Exception as e:
+            logger.error(f"恢复限流计数失败: {str(e)}")
+            return 0
+
+        loaded = 0
+        with self._lock:
+            for service, identity, start, count in records:
+                policy = self._policies[service]
+                current_window = int(now // policy.window_seconds)
+                record_window = int(start.replace(tzinfo=None).timestamp() // policy.window_seconds)
+                if record_window not in (current_window, current_window - 1):
+                    continue
+
+                counter = self._counters.setdefault((service, identity), _WindowCounter(current_window))
+                if record_window == current_window:
+                    counter.count = max(counter.count, count)
+                else:
+                    counter.previous_count = max(counter.previous_count, count)
+                loaded += 1
+
+        logger.info(f"已恢复限流计数: {loaded} 条")
+        return loaded
+
+    def purge_expired_records(self, db: Session, older_than: timedelta = timedelta(days=1)) -> int:
+        """删除过期的限流记录"""
+        try:
+            deleted = db.query(RateLimit).filter(
+                RateLimit.window_end < datetime.now() - older_than
+            ).delete(synchronize_session=False)
+            db.commit()
+            return deleted
+        except Exception as e:
+            db.rollback()
+            logger.error(f"清理过期限流记录失败: {str(e)}")
+            return 0
+
+    def get_metrics(self) -> Dict[str, object]:
+        """获取限流器状态"""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "tracked_keys": len(self._counters),
+                "max_entries": self.max_entries,
+                "evicted": self._evicted,
+                "rejected": self._rejected,
+                "policies": {
+                    service: {"max_requests": policy.max_requests, "window_seconds": policy.window_seconds}
+                    for service, policy in self._policies.items()
+                }
+            }
+
+
+def parse_networks(value: str) -> List[Union[ipaddress.IPv4Network, ipaddress.IPv6Network]]:
+    """解析逗号分隔的IP或网段列表，忽略无法解析的项"""
+    networks = []
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        try:
+            networks.append(ipaddress.ip_network(item, strict=False))
+        except ValueError:
+            logger.warning(f"忽略无效的可信代理地址: {item}")
+    return networks
+
+
+_trusted_proxies = parse_networks(settings.RATE_LIMIT_TRUSTED_PROXIES)
+
+
+def _is_trusted_proxy(host: str) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in _trusted_proxies)
+
+
+def client_ip(request: Request) -> str:
+    """
+    限流主体：客户端IP
+
+    连接来自可信代理时，从 X-Forwarded-For 右侧向左跳过可信代理，取第一个不可信的地址；
+    其余情况使用连接地址，客户端自行伪造的 X-Forwarded-For 不会改变限流主体。
+    """
+    host = request.client.host if request.client else "unknown"
+    if not _trusted_proxies or not _is_trusted_proxy(host):
+        return host
+
+    forwarded = [
+        item.strip()
+        for header in request.headers.getlist("x-forwarded-for")
+        for item in header.split(",")
+        if item.strip()
+    ]
+    for address in reversed(forwarded):
+        if not _is_trusted_proxy(address):
+            return address
+    return forwarded[0] if forwarded else host
+
+
+def json_field(field: str, normalize: Callable[[str], str] = str) -> Callable[[Request], Awaitable[str]]:
+    """限流主体：请求体JSON中的字段（请求体已由FastAPI读取并缓存，不会重复读取）"""
+    async def key_func(request: Request) -> str:
+        try:
+            body = await request.json()
+            value = body.get(field) if isinstance(body, dict) else None
+        except Exception:
+            value = None
+        return normalize(str(value)) if value else client_ip(request)
+    return key_func
+
+
+def rate_limit(service: str, key_func: Callable[[Request], object] = client_ip):
+    """
+    生成限流依赖，用于路由的 dependencies=[Depends(rate_limit(...))]
+
+    路由级依赖先于端点参数中的依赖执行，超限请求在访问数据库前直接返回429。
+    """
+    async def dependency(request: Request) -> None:
+        if not rate_limiter.enabled:
+            return
+
+        identity = key_func(request)
+        if hasattr(identity, "__await__"):
+            identity = await identity
+
+        result = rate_limiter.hit(service, identity)
+        if not result.allowed:
+            logger.warning(f"请求被限流: {service}, 主体: {str(identity)[:20]}")
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="请求过于频繁，请稍后再试",
+                headers={"Retry-After": str(result.retry_after)}
+            )
+
+    return dependency
+
+
+# 创建全局限流器实例并注册默认策略
+rate_limiter = RateLimiter(enabled=settings.RATE_LIMIT_ENABLED)
+rate_limiter.register_policy("login_ip", *parse_limit(settings.RATE_LIMIT_LOGIN_IP))
+rate_limiter.register_policy("login_account", *parse_limit(settings.RATE_LIMIT_LOGIN_ACCOUNT))
+rate_limiter.register_policy("register_ip", *parse_limit(settings.RATE_LIMIT_REGISTER_IP))
+rate_limiter.register_policy("password_reset", *parse_limit(settings.RATE_LIMIT_PASSWORD_RESET))
+rate_limiter.register_policy("usage_record", *parse_limit(settings.RATE_LIMIT_USAGE_RECORD))
@@ -0,0 +1,139 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .config import settings
+from ..db.database import SessionLocal
+from ..db.models import TokenRevocation
+
+logger = logging.getLogger(__name__)
+
+
+class TokenRevocationList:
+    """
+    访问令牌吊销列表
+
+    令牌携带状态声明时，封禁、禁用、角色变更后旧令牌仍然有效，直到过期。
+    这里按subject记录吊销时间，签发时间（iat，访问令牌带小数部分）不晚于吊销时间的令牌一律视为失效。
+    校验只查进程内字典；吊销同时写入 token_revocations 表，各进程由 sync 定期增量读取其他进程写入的记录，
+    因此多进程部署下吊销在其他进程最多延迟一个同步间隔生效。
+    条目在访问令牌最长有效期之后自动清理，因为此前签发的令牌已全部过期。
+    """
+
+    # 增量同步的回看余量（秒），覆盖节点间时钟偏差和事务提交先后
+    SYNC_OVERLAP_SECONDS = 60
+    # 清理数据库中过期吊销记录的间隔（秒）
+    DB_PRUNE_INTERVAL = 600
+
+    def __init__(self, ttl_seconds: int, session_factory: Optional[Callable[[], Session]] = None):
+        self.ttl_seconds = ttl_seconds
+        self.session_factory = session_factory
+        self._revoked_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._next_prune = 0.0
+        self._sync_watermark = 0.0
+        self._next_db_prune = 0.0
+
+    def revoke(self, subject: str) -> None:
+        """吊销subject在此之前签发的所有访问令牌"""
+        now = time.time()
+        with self._lock:
+            self._revoked_at[subject] = now
+            self._prune_locked(now)
+        self._persist(subject, now)
+
+    def is_revoked(self, subject: str, issued_at: Optional[float]) -> bool:
+        """判断令牌是否已被吊销（缺少iat的令牌在subject被吊销后一律视为失效）"""
+        now = time.time()
+        with self._lock:
+            if now >= self._next_prune:
+                self._prune_locked(now)
+
+            revoked_at = self._revoked_at.get(subject)
+            if revoked_at is None:
+                return False
+            return issued_at is None or issued_at <= revoked_at
+
+    def sync(self) -> int:
+        """从数据库读取上次同步以来的吊销记录，返回读取的条数"""
+        if self.session_factory is None:
+            return 0
+
+        now = time.time()
+        since = max(self._sync_watermark - self.SYNC_OVERLAP_SECONDS, now - self.ttl_seconds)
+        db = self.session_factory()
+        try:
+            rows = db.query(TokenRevocation.subject, TokenRevocation.revoked_at).filter(
+                TokenRevocation.revoked_at >= int(since * 1000)
+            ).all()
+
+            if now >= self._next_db_prune:
+                db.query(TokenRevocation).filter(
+                    TokenRevocation.revoked_at < int((now - self.ttl_seconds) * 1000)
+                ).delete(synchronize_session=False)
+                db.commit()
+                self._next_db_prune = now + self.DB_PRUNE_INTERVAL
+        except Exception as e:
+            db.rollback()
+            logger.error(f"同步令牌吊销记录失败: {str(e)}")
+            return 0
+        finally:
+            db.close()
+
+        with self._lock:
+            for subject, revoked_at_ms in rows:
+                revoked_at = revoked_at_ms / 1000
+                if revoked_at > self._revoked_at.get(subject, 0.0):
+                    self._revoked_at[subject] = revoked_at
+                self._sync_watermark = max(self._sync_watermark, revoked_at)
+        return len(rows)
+
+    def _persist(self, subject: str, revoked_at: float) -> None:
+        """写入数据库供其他进程同步（失败只记录日志，本进程内的吊销已生效）"""
+        if self.session_factory is None:
+            return
+
+        revoked_at_ms = int(revoked_at * 1000)
+        db = self.session_factory()
+        try:
+            updated = db.query(TokenRevocation).filter(TokenRevocation.subject == subject).update(
+                {"revoked_at": revoked_at_ms}, synchronize_session=False
+            )
+            if not updated:
+                db.add(TokenRevocation(subject=subject, revoked_at=revoked_at_ms))
+            try:
+                db.commit()
+            except IntegrityError:
+                # 其他进程同时插入了同一subject
+                db.rollback()
+                db.query(TokenRevocation).filter(TokenRevocation.subject == subject).update(
+                    {"revoked_at": revoked_at_ms}, synchronize_session=False
+                )
+                db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"保存令牌吊销记录失败: {subject}, 错误: {str(e)}")
+        finally:
+            db.close()
+
+    def _prune_locked(self, now: float) -> None:
+        """清理已超过令牌有效期的条目"""
+        expired_before = now - self.ttl_seconds
+        for subject in [subject for subject, revoked_at in self._revoked_at.items() if revoked_at < expired_before]:
+            del self._revoked_at[subject]
+        self._next_prune = now + 60
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._revoked_at)
+
+
+# 创建全局吊销列表实例（条目保留时长等于访问令牌有效期）
+token_revocation_list = TokenRevocationList(
+    ttl_seconds=settings.JWT_ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    session_factory=SessionLocal
+)
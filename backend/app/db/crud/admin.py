@@ -3,9 +3,14 @@ from sqlalchemy import and_, or_
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 import json
+import logging
 
 from ..models import Admin, UserRole
 from ...core.auth_service import auth_service
+from ...core.principal_cache import principal_cache
+from ...core.token_revocation import token_revocation_list
+
+logger = logging.getLogger(__name__)
 
 
 class AdminCRUD:
@@ -88,6 +93,8 @@ class AdminCRUD:
         if not admin:
             return None
 
+        old_username = admin.username
+
         if username is not None:
             # 检查新用户名是否已被其他管理员使用
             existing = self.db.query(Admin).filter(
@@ -116,6 +123,12 @@ class AdminCRUD:
         admin.updated_at = datetime.now()
         self.db.commit()
         self.db.refresh(admin)
+        principal_cache.invalidate_admin(old_username)
+        principal_cache.invalidate_admin(admin.username)
+        if any(value is not None for value in (username, password, role, is_active)):
+            # 身份、角色或状态变更后，旧令牌中的声明不再可信
+            token_revocation_list.revoke(f"admin_{old_username}")
+            token_revocation_list.revoke(f"admin_{admin.username}")
         return admin
 
     def delete_admin(self, admin_id: int) -> bool:
@@ -128,6 +141,8 @@ class AdminCRUD:
         admin.is_active = False
         admin.updated_at = datetime.now()
         self.db.commit()
+        principal_cache.invalidate_admin(admin.username)
+        token_revocation_list.revoke(f"admin_{admin.username}")
         return True
 
     def get_all_admins(
@@ -181,6 +196,20 @@ class AdminCRUD:
         """验证管理员密码"""
         return auth_service.verify_password(password, admin.password_hash)
 
+    def update_password_hash(self, admin_id: int, password_hash: str) -> bool:
+        """保存按当前cost重新计算的密码哈希（密码本身未变，不吊销已签发的令牌）"""
+        try:
+            updated = self.db.query(Admin).filter(Admin.id == admin_id).update(
+                {Admin.password_hash: password_hash},
+                synchronize_session=False
+            )
+            self.db.commit()
+            return updated > 0
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"更新管理员密码哈希失败: {admin_id}, 错误: {str(e)}")
+            return False
+
     def update_last_login(self, admin_id: int) -> bool:
         """更新最后登录时间"""
         admin = self.get_admin_by_id(admin_id)
@@ -189,6 +218,7 @@ class AdminCRUD:
 
         admin.last_login_at = datetime.now()
         self.db.commit()
+        principal_cache.invalidate_admin(admin.username)
         return True
 
     def search_admins(
@@ -1,16 +1,52 @@
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Callable, Iterator, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import desc, asc, and_, or_
-from ..models import APIKey, User, Package
+from sqlalchemy import desc, asc, and_, or_, func, insert, update, delete
+from sqlalchemy.exc import IntegrityError
+from ..models import APIKey, User, Package, CreditsResetEvent
 from datetime import datetime, timedelta
 import logging
 import secrets
+import threading
+import time
+import pytz
 import string
 from app.schemas.enums import PackageType
+from app.core.config import settings
+from app.core.invalidation_bus import invalidation_bus, TOPIC_API_KEYS
 from app.services.credits_reset_client import credits_reset_client
+from app.services.package_key_stats import package_key_stats
 
 logger = logging.getLogger(__name__)
 
+# 管理后台密钥列表总数缓存：{过滤条件: (计算时间, 总数)}，超过上限时整体清空
+_ADMIN_KEY_COUNT_CACHE_SIZE = 32
+_admin_key_count_cache: Dict[Tuple[Optional[str], Optional[str], Optional[str]], Tuple[float, int]] = {}
+_admin_key_count_lock = threading.Lock()
+# 密钥被批量禁用/删除后总数可能变化
+invalidation_bus.subscribe(TOPIC_API_KEYS, lambda api_keys: _admin_key_count_cache.clear())
+
+_KEY_ALPHABET = (string.ascii_letters + string.digits).encode("ascii")
+# 随机字节映射到字母表（只保留 0-247，保证62个字符等概率）
+_KEY_BYTE_LIMIT = 256 - 256 % len(_KEY_ALPHABET)
+_KEY_TRANSLATION = bytes(_KEY_ALPHABET[b % len(_KEY_ALPHABET)] for b in range(256))
+_KEY_REJECTED_BYTES = bytes(range(_KEY_BYTE_LIMIT, 256))
+
+
+def generate_api_keys(count: int, prefix: str = "sk-", length: int = 32) -> List[str]:
+    """
+    批量生成API密钥
+
+    一次取足够的 secrets.token_bytes，用 bytes.translate 整块映射为字母数字并丢弃会造成偏差的字节，
+    再按长度切分，避免逐字符调用 secrets.choice。
+    """
+    needed = count * length
+    chars = b""
+    while len(chars) < needed:
+        raw = secrets.token_bytes((needed - len(chars)) * 256 // _KEY_BYTE_LIMIT + 16)
+        chars += raw.translate(_KEY_TRANSLATION, _KEY_REJECTED_BYTES)
+    text = chars[:needed].decode("ascii")
+    return [prefix + text[i:i + length] for i in range(0, needed, length)]
+
 
 class APIKeyCRUD:
     """用户密钥CRUD操作（合并后的完整版本）"""
@@ -20,31 +56,13 @@ class APIKeyCRUD:
 
     def generate_api_key(self, prefix: str = "sk-", length: int = 32) -> str:
         """生成API密钥"""
-        alphabet = string.ascii_letters + string.digits
-        random_part = ''.join(secrets.choice(alphabet) for _ in range(length))
-        return f"{prefix}{random_part}"
+        return generate_api_keys(1, prefix, length)[0]
 
     # 原有API密钥管理功能
     def get_api_key_by_key(self, api_key: str) -> Optional[APIKey]:
         """根据API密钥获取记录"""
         return self.db.query(APIKey).filter(APIKey.api_key == api_key).first()
 
-    def get_api_key_with_package_type(self, api_key: str) -> Optional[tuple[APIKey, Optional[str]]]:
-        """根据API密钥获取记录和package_type（用于验证）"""
-        # 使用JOIN一次性获取API密钥和package信息，避免N+1查询
-        result = (
-            self.db.query(APIKey, Package)
-            .outerjoin(Package, APIKey.package_id == Package.id)
-            .filter(APIKey.api_key == api_key)
-            .first()
-        )
-
-        if result:
-            api_key_obj, package_obj = result
-            package_type = package_obj.package_type if package_obj else None
-            return api_key_obj, package_type
-        return None
-
     def get_api_key_by_id(self, api_key_id: int) -> Optional[APIKey]:
         """根据ID获取API密钥记录"""
         return self.db.query(APIKey).filter(APIKey.id == api_key_id).first()
@@ -133,6 +151,7 @@ class APIKeyCRUD:
         self.db.add(db_api_key)
         self.db.commit()
         self.db.refresh(db_api_key)
+        invalidation_bus.publish(TOPIC_API_KEYS, [db_api_key.api_key])
         logger.info(f"创建新API密钥: {api_key_data.get('api_key')}")
         return db_api_key
 
@@ -257,22 +276,7 @@ class APIKeyCRUD:
             self.db.refresh(key)
             logger.info(f"为用户 {user_id} 的密钥 {key.id} 累加积分: {credits}")
 
-            # 调用外部API更新Redis缓存
-            try:
-                external_result = credits_reset_client.reset_credits(
-                    api_key=key.api_key,
-                    remaining_credits=key.remaining_credits,
-                    last_reset_credits_at=key.last_reset_credits_at.isoformat() if key.last_reset_credits_at else None
-                )
-
-                if not external_result["success"]:
-                    logger.warning(f"Redis积分更新失败: {external_result['message']}")
-                else:
-                    logger.info(f"Redis积分更新成功: {key.api_key[:10]}..., 剩余积分: {key.remaining_credits}")
-            except Exception as redis_error:
-                logger.error(f"调用Redis更新API失败: {str(redis_error)}")
-                # Redis更新失败不影响主要功能，继续返回成功
-
+            self._sync_credits_to_redis(key)
             return key
 
         except Exception as e:
@@ -280,6 +284,22 @@ class APIKeyCRUD:
             logger.error(f"累加积分失败: {str(e)}")
             return None
 
+    def _sync_credits_to_redis(self, key: APIKey) -> None:
+        """调用外部API更新Redis中的剩余积分（失败不影响主要功能）"""
+        try:
+            external_result = credits_reset_client.reset_credits(
+                api_key=key.api_key,
+                remaining_credits=key.remaining_credits,
+                last_reset_credits_at=key.last_reset_credits_at.isoformat() if key.last_reset_credits_at else None
+            )
+
+            if not external_result["success"]:
+                logger.warning(f"Redis积分更新失败: {external_result['message']}")
+            else:
+                logger.info(f"Redis积分更新成功: {key.api_key[:10]}..., 剩余积分: {key.remaining_credits}")
+        except Exception as redis_error:
+            logger.error(f"调用Redis更新API失败: {str(redis_error)}")
+
     def delete_api_key(self, api_key: str) -> bool:
         """软删除API密钥（设置为非激活状态）"""
         return self.update_api_key_status(api_key, False)
@@ -314,112 +334,309 @@ class APIKeyCRUD:
 
         return query.offset(skip).limit(limit).all()
 
+    def list_user_keys_for_admin(
+        self,
+        api_key: Optional[str] = None,
+        user_id: Optional[str] = None,
+        status: Optional[str] = None,
+        after: Optional[Tuple[datetime, int]] = None,
+        limit: int = 50
+    ) -> List[Dict[str, Any]]:
+        """
+        管理后台用户密钥列表（按 created_at, id 倒序的游标分页）
+
+        一条查询外连接 users 取邮箱，只投影列表需要的列；
+        after 为上一页最后一条的 (created_at, id)，翻到任意深度每页开销相同。
+        """
+        query = (
+            self.db.query(
+                APIKey.id,
+                APIKey.user_id,
+                APIKey.api_key,
+                APIKey.real_api_key,
+                APIKey.key_name,
+                APIKey.description,
+                User.email,
+                APIKey.status,
+                APIKey.activation_date,
+                APIKey.expire_date,
+                APIKey.remaining_days,
+                APIKey.remaining_credits,
+                APIKey.total_credits,
+                APIKey.last_used_at,
+                APIKey.created_at,
+                APIKey.notes
+            )
+            .outerjoin(User, APIKey.user_id == User.user_id)
+        )
+
+        if api_key:
+            query = query.filter(APIKey.api_key == api_key)
+        if user_id:
+            query = query.filter(APIKey.user_id == user_id)
+        if status:
+            query = query.filter(APIKey.status == status)
+
+        if after is not None:
+            created_at, last_id = after
+            query = query.filter(or_(
+                APIKey.created_at < created_at,
+                and_(APIKey.created_at == created_at, APIKey.id < last_id)
+            ))
+
+        rows = query.order_by(desc(APIKey.created_at), desc(APIKey.id)).limit(limit).all()
+
+        return [
+            {
+                "id": row.id,
+                "user_id": row.user_id,
+                "api_key": row.api_key,
+                "real_api_key": row.real_api_key,
+                "key_name": row.key_name,
+                "description": row.description,
+                "user_email": row.email or "未激活",
+                "status": row.status,
+                "activation_date": row.activation_date,
+                "expire_date": row.expire_date,
+                "remaining_days": row.remaining_days,
+                "remaining_credits": row.remaining_credits,
+                "total_credits": row.total_credits,
+                "last_used_at": row.last_used_at,
+                "created_at": row.created_at,
+                "notes": row.notes
+            }
+            for row in rows
+        ]
+
+    def count_user_keys_for_admin(
+        self,
+        api_key: Optional[str] = None,
+        user_id: Optional[str] = None,
+        status: Optional[str] = None,
+        ttl_seconds: int = 30
+    ) -> int:
+        """
+        管理后台用户密钥总数（只按状态过滤时缓存 ttl_seconds 秒，避免每次翻页都全表计数）
+
+        按密钥或用户ID精确过滤时计数走唯一索引/用户索引，开销很小，不缓存；
+        状态参数来自查询字符串，缓存条目数另有上限。
+        """
+        cacheable = not api_key and not user_id
+        cache_key = (None, None, status)
+        now = time.monotonic()
+        cached = _admin_key_count_cache.get(cache_key) if cacheable else None
+        if cached is not None and now - cached[0] < ttl_seconds:
+            return cached[1]
+
+        query = self.db.query(func.count(APIKey.id))
+        if api_key:
+            query = query.filter(APIKey.api_key == api_key)
+        if user_id:
+            query = query.filter(APIKey.user_id == user_id)
+        if status:
+            query = query.filter(APIKey.status == status)
+        total = query.scalar() or 0
+
+        if cacheable:
+            with _admin_key_count_lock:
+                if len(_admin_key_count_cache) >= _ADMIN_KEY_COUNT_CACHE_SIZE:
+                    _admin_key_count_cache.clear()
+                _admin_key_count_cache[cache_key] = (now, total)
+        return total
+
     # 新增：用户密钥管理功能（从user_key.py合并过来）
     def bulk_generate_standalone_user_keys(self, package_id: int, count: int, real_api_key: str, notes: Optional[str] = None) -> List[Dict[str, Any]]:
         """批量生成独立的用户密钥（不自动创建用户）"""
         try:
-            # 获取套餐信息
             package = self.db.query(Package).filter(Package.id == package_id).first()
             if not package:
                 logger.error(f"套餐不存在: {package_id}")
                 return []
 
             generated_keys = []
-            for i in range(count):
-                # 生成唯一的API密钥
-                api_key = self.generate_api_key()
-
-                # 确保API密钥唯一
-                while self.db.query(APIKey).filter(APIKey.api_key == api_key).first():
-                    api_key = self.generate_api_key()
-
-                # 创建APIKey记录
-                user_key = APIKey(
-                    user_id=None,  # 激活前为空
-                    api_key=api_key,
-                    real_api_key=real_api_key,
-                    key_name=f"批量生成-{i+1}",
-                    description=f"批量生成的用户密钥 - 套餐: {package.package_name}",
-                    is_active=True,
-
-                    # 订阅管理字段
-                    package_id=package_id,
-                    activation_date=None,  # 激活前为空
-                    expire_date=None,  # 激活时计算
-                    remaining_days=package.duration_days,
-                    remaining_credits=package.credits,
-                    total_credits=package.credits,
-                    status="inactive",  # 默认未激活
-                    notes=notes or f"批量生成 - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-                )
+            for chunk in self.generate_user_key_chunks(package, count, real_api_key, notes):
+                generated_keys.extend(chunk)
+            logger.info(f"批量生成用户密钥成功: {len(generated_keys)}个")
+            return generated_keys
+
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"批量生成用户密钥失败: {str(e)}")
+            return []
+
+    def generate_user_key_chunks(
+        self,
+        package: Package,
+        count: int,
+        real_api_key: str,
+        notes: Optional[str] = None,
+        chunk_size: int = 1000,
+        first_index: int = 0,
+        batch_tag: Optional[str] = None
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """
+        分块生成并写入用户密钥，每提交一块就产出这一块的密钥
 
-                self.db.add(user_key)
-                generated_keys.append({
+        每块用一条多行INSERT写入并立即提交，唯一性由 api_key 唯一索引保证：
+        插入冲突时只查出冲突的密钥重新生成，其余密钥原样重试。
+        出错时已提交的块保留，异常向上抛出。first_index 为密钥名称编号的起点（分多次生成时续编）。
+        batch_tag 写入 batch_tag 列，分多次生成时可据此统计已生成的数量。
+        """
+        notes = notes or f"批量生成 - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+        description = f"批量生成的用户密钥 - 套餐: {package.package_name}"
+        chunk_size = max(chunk_size, 1)
+
+        for start in range(0, count, chunk_size):
+            size = min(chunk_size, count - start)
+            keys = list(dict.fromkeys(generate_api_keys(size)))
+            while len(keys) < size:
+                keys = list(dict.fromkeys(keys + generate_api_keys(size - len(keys))))
+
+            for attempt in range(5):
+                rows = [
+                    {
+                        "user_id": None,  # 激活前为空
+                        "api_key": api_key,
+                        "real_api_key": real_api_key,
+                        "key_name": f"批量生成-{first_index + start + index + 1}",
+                        "description": description,
+                        "is_active": True,
+                        "package_id": package.id,
+                        "remaining_days": package.duration_days,
+                        "remaining_credits": package.credits,
+                        "total_credits": package.credits,
+                        "status": "inactive",  # 默认未激活
+                        "notes": notes,
+                        "batch_tag": batch_tag
+                    }
+                    for index, api_key in enumerate(keys)
+                ]
+                try:
+                    self.db.execute(insert(APIKey), rows)
+                    self.db.commit()
+                    break
+                except IntegrityError:
+                    self.db.rollback()
+                    existing = {
+                        row[0] for row in
+                        self.db.query(APIKey.api_key).filter(APIKey.api_key.in_(keys)).all()
+                    }
+                    if not existing:
+                        raise
+                    logger.warning(f"批量生成用户密钥冲突 {len(existing)} 个，重新生成后重试")
+                    fresh = [key for key in generate_api_keys(len(existing)) if key not in keys]
+                    keys = [key for key in keys if key not in existing] + fresh
+            else:
+                raise RuntimeError("批量生成用户密钥多次冲突，已停止")
+
+            invalidation_bus.publish(TOPIC_API_KEYS, keys)
+
+            yield [
+                {
                     "api_key": api_key,
                     "real_api_key": real_api_key,
                     "package_name": package.package_name,
                     "credits": package.credits,
                     "duration_days": package.duration_days
-                })
+                }
+                for api_key in keys
+            ]
 
-            self.db.commit()
-            logger.info(f"批量生成用户密钥成功: {count}个")
-            return generated_keys
+    def _claim_user_key(self, key_id: int, values: Dict[str, Any]) -> bool:
+        """
+        原子认领密钥：只有 user_id 为空且状态为 inactive 时才写入，返回是否认领成功
 
-        except Exception as e:
-            self.db.rollback()
-            logger.error(f"批量生成用户密钥失败: {str(e)}")
-            return []
+        并发兑换同一密钥时数据库只会让其中一条UPDATE命中，其余请求影响行数为0。
+        """
+        result = self.db.execute(
+            update(APIKey)
+            .where(APIKey.id == key_id, APIKey.user_id.is_(None), APIKey.status == "inactive")
+            .values(**values)
+        )
+        return result.rowcount == 1
 
     def activate_user_key(self, api_key: str, user_email: str) -> Dict[str, Any]:
-        """激活用户密钥"""
+        """
+        激活用户密钥
+
+        整个兑换在一个短事务内完成：先锁定当前用户行，使同一用户的并发兑换串行执行
+        （一人一激活、加油包累加的检查不会被并发绕过，不同用户之间互不等待），
+        再用条件UPDATE认领密钥，不对密钥行加读锁；认领失败说明密钥已被他人兑换。
+        """
         try:
-            # 查找用户密钥
-            user_key_record = self.db.query(APIKey).filter(APIKey.api_key == api_key).first()
-            if not user_key_record:
+            # 结束会话中此前只读查询开启的事务，本次兑换的读取从锁定用户行之后开始
+            self.db.rollback()
+
+            user = self.db.query(User).filter(User.email == user_email).with_for_update().first()
+            if not user:
+                self.db.rollback()
+                return {"success": False, "message": "用户不存在，请先注册"}
+
+            # 查找用户密钥及其订阅（普通读取，不加锁）
+            row = (
+                self.db.query(
+                    APIKey.id, APIKey.user_id, APIKey.remaining_days, APIKey.total_credits,
+                    Package.package_type, Package.credits
+                )
+                .outerjoin(Package, Package.id == APIKey.package_id)
+                .filter(APIKey.api_key == api_key)
+                .first()
+            )
+            if not row:
+                self.db.rollback()
                 return {"success": False, "message": "用户密钥不存在"}
 
             # 检查密钥是否已被使用（无论是active还是inactive状态，只要有关联用户）
-            if user_key_record.user_id:
+            if row.user_id:
+                self.db.rollback()
                 return {"success": False, "message": "用户密钥已被使用，无法重复激活"}
 
-            # 查找或创建用户
-            user = self.db.query(User).filter(User.email == user_email).first()
-            if not user:
-                return {"success": False, "message": "用户不存在，请先注册"}
-
-            # 获取套餐信息
-            package = None
-            if user_key_record.package_id:
-                package = self.db.query(Package).filter(Package.id == user_key_record.package_id).first()
+            activation_date = datetime.now()
 
             # 处理加油包
-            if package and package.package_type == PackageType.FUEL_PACK:
+            if row.package_type == PackageType.FUEL_PACK:
                 # 检查用户是否只有一个激活且在有效期限内的API密钥
                 active_keys = self.get_user_active_valid_keys(user.user_id)
 
                 if not active_keys:
+                    self.db.rollback()
                     return {"success": False, "message": "您没有激活的有效密钥，无法使用加油包"}
 
                 if len(active_keys) > 1:
+                    self.db.rollback()
                     return {"success": False, "message": "您有多个激活的有效密钥，无法使用加油包"}
 
-                # 给用户唯一的有效密钥累加积分
-                credits_to_add = user_key_record.total_credits or package.credits
-                updated_key = self.add_credits_to_active_key(user.user_id, credits_to_add)
-
-                if not updated_key:
+                target_key = active_keys[0]
+                credits_to_add = row.total_credits or row.credits
+                if not credits_to_add:
+                    self.db.rollback()
                     return {"success": False, "message": "积分累加失败"}
 
-                # 更新加油包密钥信息
-                activation_date = datetime.now()
-                user_key_record.user_id = user.user_id
-                user_key_record.status = "inactive"
-                user_key_record.activation_date = activation_date  # 记录激活时间
-                user_key_record.notes = f"加油包积分已累加到密钥 {updated_key.id}，增加积分: {credits_to_add}，激活时间: {activation_date}"
-
+                # 认领加油包密钥（状态保持inactive，只记录使用人和激活时间）
+                claimed = self._claim_user_key(row.id, {
+                    "user_id": user.user_id,
+                    "activation_date": activation_date,  # 记录激活时间
+                    "notes": f"加油包积分已累加到密钥 {target_key.id}，增加积分: {credits_to_add}，激活时间: {activation_date}"
+                })
+                if not claimed:
+                    self.db.rollback()
+                    return {"success": False, "message": "用户密钥已被使用，无法重复激活"}
+
+                # 给用户唯一的有效密钥累加积分（加油包只增加剩余积分，不修改总积分）
+                self.db.execute(
+                    update(APIKey)
+                    .where(APIKey.id == target_key.id)
+                    .values(
+                        remaining_credits=func.coalesce(APIKey.remaining_credits, 0) + credits_to_add,
+                        updated_at=activation_date
+                    )
+                )
                 self.db.commit()
 
+                self.db.refresh(target_key)
+                self._sync_credits_to_redis(target_key)
+                invalidation_bus.publish(TOPIC_API_KEYS, [api_key, target_key.api_key])
+
                 logger.info(f"加油包积分累加成功: {api_key} -> 用户 {user.user_id}，增加积分: {credits_to_add}")
                 return {
                     "success": True,
@@ -431,35 +648,37 @@ class APIKeyCRUD:
                 }
 
             # 处理标准订阅（非加油包类型套餐）
-            # 检查一人一激活限制（仅对非加油包类型套餐）
-            if package and package.package_type != PackageType.FUEL_PACK:
+            # 检查一人一激活限制（仅对关联了订阅的密钥）
+            if row.package_type is not None:
                 # 检查用户是否有激活且在有效期限内的API密钥
                 active_keys = self.get_user_active_valid_keys(user.user_id)
                 if active_keys:
+                    self.db.rollback()
                     return {"success": False, "message": "您已有激活且在有效期内的API密钥，无法激活新的标准订阅"}
 
-            # 计算过期时间（使用操作系统时区）
-            activation_date = datetime.now()
-
-            # 检查是否为体验积分包或临时积分包
-            is_trial_or_temp = False
-            if package:
-                is_trial_or_temp = package.package_type in [PackageType.EXPERIENCE_PACKAGE, PackageType.TEMPORARY_PACKAGE]
+            values = {
+                "user_id": user.user_id,
+                "activation_date": activation_date,
+                "status": "active",
+                # 激活当天的积分即为当天额度，按需重置从次日开始
+                "reset_epoch": datetime.now(pytz.timezone('Asia/Shanghai')).date()
+            }
 
             # 对于体验积分包和临时积分包，设置expire_date和remaining_days为null
-            if is_trial_or_temp:
+            if row.package_type in [PackageType.EXPERIENCE_PACKAGE, PackageType.TEMPORARY_PACKAGE]:
                 expire_date = None
-                user_key_record.remaining_days = None
+                values["remaining_days"] = None
             else:
-                expire_date = activation_date + timedelta(days=user_key_record.remaining_days) if user_key_record.remaining_days else None
+                # 计算过期时间（使用操作系统时区）
+                expire_date = activation_date + timedelta(days=row.remaining_days) if row.remaining_days else None
+            values["expire_date"] = expire_date
 
-            # 更新用户密钥信息
-            user_key_record.user_id = user.user_id
-            user_key_record.activation_date = activation_date
-            user_key_record.expire_date = expire_date
-            user_key_record.status = "active"
+            if not self._claim_user_key(row.id, values):
+                self.db.rollback()
+                return {"success": False, "message": "用户密钥已被使用，无法重复激活"}
 
             self.db.commit()
+            invalidation_bus.publish(TOPIC_API_KEYS, [api_key])
 
             logger.info(f"用户密钥激活成功: {api_key} -> {user_email}")
             return {
@@ -531,61 +750,97 @@ class APIKeyCRUD:
             return []
 
     def get_package_user_keys_count(self, package_id: int, status_filter: Optional[str] = None) -> int:
-        """获取订阅用户密钥总数"""
+        """获取订阅用户密钥总数（读取缓存的分组计数）"""
         try:
-            query = self.db.query(APIKey).filter(APIKey.package_id == package_id)
-
-            if status_filter:
-                query = query.filter(APIKey.status == status_filter)
-
-            return query.count()
+            return package_key_stats.count(package_id, status_filter)
         except Exception as e:
             logger.error(f"获取订阅用户密钥总数失败: {str(e)}")
             return 0
 
-    def delete_user_keys_by_ids(self, api_key_ids: List[int]) -> Dict[str, Any]:
-        """根据ID列表删除用户密钥"""
-        try:
-            # 查询要删除的密钥
-            keys_to_delete = self.db.query(APIKey).filter(APIKey.id.in_(api_key_ids)).all()
-
-            if not keys_to_delete:
-                return {"success": False, "message": "没有找到要删除的密钥"}
-
-            deleted_count = len(keys_to_delete)
-
-            # 删除密钥
-            for key in keys_to_delete:
-                self.db.delete(key)
+    def _apply_to_keys_in_chunks(
+        self,
+        api_key_ids: List[int],
+        build_statement: Callable[[List[int]], Any],
+        action: str,
+        chunk_size: Optional[int] = None,
+        on_progress: Optional[Callable[[int, int, int], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        按块对密钥执行集合操作（DELETE/UPDATE ... WHERE id IN (...)）
 
-            self.db.commit()
+        每块先只取 api_key 列（用于缓存失效），再执行一条集合语句并单独提交，
+        不把密钥对象加载进会话。每块完成后发布失效通知并回调 on_progress(已处理ID数, ID总数, 累计影响行数)。
+        中途出错时已提交的块保留，返回值中的 affected 为已生效的行数。
+        """
+        ids = list(dict.fromkeys(api_key_ids))
+        chunk_size = max(chunk_size or settings.USER_KEY_BULK_CHUNK_SIZE, 1)
+        affected = 0
+        done = 0
 
-            logger.info(f"删除用户密钥成功: {deleted_count}个")
-            return {"success": True, "deleted_count": deleted_count}
+        try:
+            for start in range(0, len(ids), chunk_size):
+                chunk = ids[start:start + chunk_size]
+                api_keys = [row[0] for row in self.db.query(APIKey.api_key).filter(APIKey.id.in_(chunk)).all()]
+                if api_keys:
+                    affected += self.db.execute(
+                        build_statement(chunk).execution_options(synchronize_session=False)
+                    ).rowcount
+                    self.db.commit()
+                    invalidation_bus.publish(TOPIC_API_KEYS, api_keys)
+
+                done += len(chunk)
+                logger.info(f"{action}用户密钥进度: {done}/{len(ids)}, 已生效 {affected} 个")
+                if on_progress:
+                    on_progress(done, len(ids), affected)
+
+            return {"success": True, "affected": affected}
 
         except Exception as e:
             self.db.rollback()
-            logger.error(f"删除用户密钥失败: {str(e)}")
-            return {"success": False, "message": f"删除失败: {str(e)}"}
-
-    def disable_user_keys_by_ids(self, api_key_ids: List[int]) -> Dict[str, Any]:
-        """根据ID列表禁用用户密钥"""
-        try:
-            # 更新密钥状态
-            result = self.db.query(APIKey).filter(APIKey.id.in_(api_key_ids)).update(
-                {"status": "inactive", "is_active": False},
-                synchronize_session=False
-            )
+            logger.error(f"{action}用户密钥失败（已生效 {affected} 个）: {str(e)}")
+            return {"success": False, "affected": affected, "message": f"{action}失败: {str(e)}"}
+
+    def delete_user_keys_by_ids(
+        self,
+        api_key_ids: List[int],
+        chunk_size: Optional[int] = None,
+        on_progress: Optional[Callable[[int, int, int], None]] = None
+    ) -> Dict[str, Any]:
+        """根据ID列表删除用户密钥（分块集合删除，每块单独提交）"""
+        result = self._apply_to_keys_in_chunks(
+            api_key_ids,
+            lambda chunk: delete(APIKey).where(APIKey.id.in_(chunk)),
+            "删除",
+            chunk_size=chunk_size,
+            on_progress=on_progress
+        )
+        if result["success"] and not result["affected"]:
+            return {"success": False, "message": "没有找到要删除的密钥"}
 
-            self.db.commit()
+        result["deleted_count"] = result.pop("affected")
+        if result["success"]:
+            logger.info(f"删除用户密钥成功: {result['deleted_count']}个")
+        return result
 
-            logger.info(f"禁用用户密钥成功: {result}个")
-            return {"success": True, "disabled_count": result}
+    def disable_user_keys_by_ids(
+        self,
+        api_key_ids: List[int],
+        chunk_size: Optional[int] = None,
+        on_progress: Optional[Callable[[int, int, int], None]] = None
+    ) -> Dict[str, Any]:
+        """根据ID列表禁用用户密钥（分块集合更新，每块单独提交）"""
+        result = self._apply_to_keys_in_chunks(
+            api_key_ids,
+            lambda chunk: update(APIKey).where(APIKey.id.in_(chunk)).values(status="inactive", is_active=False),
+            "禁用",
+            chunk_size=chunk_size,
+            on_progress=on_progress
+        )
 
-        except Exception as e:
-            self.db.rollback()
-            logger.error(f"禁用用户密钥失败: {str(e)}")
-            return {"success": False, "message": f"禁用失败: {str(e)}"}
+        result["disabled_count"] = result.pop("affected")
+        if result["success"]:
+            logger.info(f"禁用用户密钥成功: {result['disabled_count']}个")
+        return result
 
     def get_user_keys_by_user_id(self, user_id: str) -> List[Dict[str, Any]]:
         """获取用户的所有密钥"""
@@ -625,13 +880,20 @@ class APIKeyCRUD:
     def get_user_key_statistics(self, user_id: Optional[str] = None) -> Dict[str, Any]:
         """获取用户密钥统计"""
         try:
-            query = self.db.query(APIKey)
             if user_id:
-                query = query.filter(APIKey.user_id == user_id)
+                # 单个用户：一条按状态分组的计数查询
+                by_status = dict(
+                    self.db.query(APIKey.status, func.count(APIKey.id))
+                    .filter(APIKey.user_id == user_id)
+                    .group_by(APIKey.status)
+                    .all()
+                )
+            else:
+                by_status = package_key_stats.totals()
 
-            total_keys = query.count()
-            active_keys = query.filter(APIKey.status == "active").count()
-            inactive_keys = query.filter(APIKey.status == "inactive").count()
+            total_keys = sum(by_status.values())
+            active_keys = by_status.get("active", 0)
+            inactive_keys = by_status.get("inactive", 0)
 
             return {
                 "total_keys": total_keys,
@@ -757,6 +1019,17 @@ class APIKeyCRUD:
             api_key.remaining_credits = api_key.total_credits
             api_key.last_reset_credits_at = now
 
+            # 记录重置明细
+            self.db.add(CreditsResetEvent(
+                api_key_id=api_key.id,
+                user_id=api_key.user_id,
+                reset_type="manual",
+                reset_date=datetime.now(pytz.timezone('Asia/Shanghai')).date(),
+                old_credits=old_remaining,
+                new_credits=api_key.total_credits,
+                success=True
+            ))
+
             self.db.commit()
 
             logger.info(f"API密钥 {api_key_id} 积分重置: {old_remaining} -> {api_key.total_credits}")
@@ -0,0 +1,99 @@
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import and_
+from sqlalchemy.orm import Session
+
+from ..models import EmailVerification
+
+logger = logging.getLogger(__name__)
+
+
+def compute_code_digest(verification_code: str) -> str:
+    """验证码/验证token的SHA-256摘要（定长，用于索引查找）"""
+    return hashlib.sha256(verification_code.encode("utf-8")).hexdigest()
+
+
+class EmailVerificationCRUD:
+    """邮箱验证记录CRUD操作"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def replace_verification(self, user_id: str, email: str, verification_code: str,
+                             verification_type: str, expire_at: datetime) -> EmailVerification:
+        """创建验证记录，同时删除该用户同类型未使用的旧记录"""
+        self.db.query(EmailVerification).filter(
+            and_(
+                EmailVerification.user_id == user_id,
+                EmailVerification.verification_type == verification_type,
+                EmailVerification.is_used == False
+            )
+        ).delete(synchronize_session=False)
+
+        verification = EmailVerification(
+            user_id=user_id,
+            email=email,
+            verification_code=verification_code,
+            code_digest=compute_code_digest(verification_code),
+            verification_type=verification_type,
+            expire_at=expire_at
+        )
+        self.db.add(verification)
+        self.db.commit()
+        self.db.refresh(verification)
+        return verification
+
+    def get_active_verification(self, email: str, verification_code: str) -> Optional[EmailVerification]:
+        """按摘要查找未使用且未过期的验证记录"""
+        return self.db.query(EmailVerification).filter(
+            and_(
+                EmailVerification.code_digest == compute_code_digest(verification_code),
+                EmailVerification.email == email,
+                EmailVerification.verification_code == verification_code,
+                EmailVerification.is_used == False,
+                EmailVerification.expire_at > datetime.now()
+            )
+        ).first()
+
+    def purge_expired(self, batch_size: int = 1000, retention: timedelta = timedelta(hours=24)) -> int:
+        """
+        分批删除过期的验证记录（已使用的记录过期后一并删除）
+
+        每批先按过期时间索引取出一批ID再按主键删除并提交，单个事务的锁范围和时长都有上限。
+
+        Returns:
+            删除的记录数
+        """
+        cutoff = datetime.now() - retention
+        total_deleted = 0
+
+        while True:
+            try:
+                ids = [
+                    row.id for row in self.db.query(EmailVerification.id)
+                    .filter(EmailVerification.expire_at < cutoff)
+                    .order_by(EmailVerification.expire_at)
+                    .limit(batch_size)
+                    .all()
+                ]
+                if not ids:
+                    break
+
+                deleted = self.db.query(EmailVerification).filter(
+                    EmailVerification.id.in_(ids)
+                ).delete(synchronize_session=False)
+                self.db.commit()
+                total_deleted += deleted
+
+                if len(ids) < batch_size:
+                    break
+
+            except Exception as e:
+                self.db.rollback()
+                logger.error(f"清理过期邮箱验证记录失败: {str(e)}")
+                break
+
+        return total_deleted
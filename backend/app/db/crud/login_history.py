@@ -1,8 +1,10 @@
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import desc, and_, func, text
-from ..models import LoginHistory, User
-from datetime import datetime, timedelta
+from sqlalchemy import desc, and_, func, case
+from ..models import LoginHistory, LoginDailyRollup, User
+from ...core.config import settings
+from ...utils.hyperloglog import HyperLogLog
+from datetime import date, datetime, time as datetime_time, timedelta
 import logging
 
 logger = logging.getLogger(__name__)
@@ -14,6 +16,20 @@ class LoginHistoryCRUD:
     def __init__(self, db: Session):
         self.db = db
 
+    @staticmethod
+    def _active_session_filter():
+        """
+        活跃会话：登录成功、带会话ID、尚未退出，且登录时间在刷新令牌有效期内
+
+        未主动退出的会话在刷新令牌过期后不再计入。
+        """
+        return and_(
+            LoginHistory.login_status == "success",
+            LoginHistory.session_id.isnot(None),
+            LoginHistory.logout_time.is_(None),
+            LoginHistory.login_time >= datetime.now() - timedelta(days=settings.JWT_REFRESH_TOKEN_EXPIRE_DAYS)
+        )
+
     def create_login_record(self, user_id: str, ip_address: Optional[str] = None,
                           user_agent: Optional[str] = None, device_info: Optional[str] = None,
                           login_status: str = "success", session_id: Optional[str] = None) -> Optional[LoginHistory]:
@@ -125,10 +141,7 @@ class LoginHistoryCRUD:
             query = self.db.query(LoginHistory, User).join(
                 User, LoginHistory.user_id == User.user_id
             ).filter(
-                and_(
-                    LoginHistory.logout_time.is_(None),
-                    LoginHistory.login_status == "success"
-                )
+                self._active_session_filter()
             )
 
             results = query.order_by(desc(LoginHistory.login_time)).all()
@@ -153,52 +166,55 @@ class LoginHistoryCRUD:
             return []
 
     def get_login_statistics(self, days: int = 30) -> Dict[str, Any]:
-        """获取登录统计"""
+        """
+        获取登录统计
+
+        历史日期读取每日汇总表（缺失的日期先补算一次），当天只对当天明细做一次分组聚合，
+        跨天独立用户数通过合并每日HyperLogLog草图估算。
+        """
         try:
-            start_date = datetime.utcnow() - timedelta(days=days)
-
-            # 总登录次数
-            total_logins = self.db.query(LoginHistory).filter(
-                LoginHistory.login_time >= start_date
-            ).count()
-
-            # 成功登录次数
-            successful_logins = self.db.query(LoginHistory).filter(
-                and_(
-                    LoginHistory.login_time >= start_date,
-                    LoginHistory.login_status == "success"
-                )
-            ).count()
-
-            # 失败登录次数
-            failed_logins = self.db.query(LoginHistory).filter(
-                and_(
-                    LoginHistory.login_time >= start_date,
-                    LoginHistory.login_status == "failed"
-                )
-            ).count()
-
-            # 独立用户数
-            unique_users = self.db.query(LoginHistory.user_id).filter(
-                LoginHistory.login_time >= start_date
-            ).distinct().count()
+            today = date.today()
+            start_date = today - timedelta(days=days)
 
-            # 当前活跃会话数
-            active_sessions = self.db.query(LoginHistory).filter(
-                and_(
-                    LoginHistory.logout_time.is_(None),
-                    LoginHistory.login_status == "success"
-                )
-            ).count()
+            rollups = self.ensure_daily_rollups(start_date, today - timedelta(days=1))
+            today_stats, today_sketch = self._aggregate_range(datetime.combine(today, datetime_time.min))
+
+            sketch = HyperLogLog()
+            daily_stats = []
+            total_logins = successful_logins = failed_logins = 0
+            for rollup in rollups:
+                total_logins += rollup.total_logins
+                successful_logins += rollup.successful_logins
+                failed_logins += rollup.failed_logins
+                if rollup.user_sketch:
+                    sketch.merge(HyperLogLog.from_bytes(rollup.user_sketch))
+                if rollup.total_logins:
+                    daily_stats.append({
+                        "date": str(rollup.stat_date),
+                        "total_logins": rollup.total_logins,
+                        "successful_logins": rollup.successful_logins,
+                        "unique_users": rollup.unique_users
+                    })
+
+            total_logins += today_stats["total_logins"]
+            successful_logins += today_stats["successful_logins"]
+            failed_logins += today_stats["failed_logins"]
+            sketch.merge(today_sketch)
+            if today_stats["total_logins"]:
+                daily_stats.append({"date": str(today), **{
+                    key: today_stats[key] for key in ("total_logins", "successful_logins", "unique_users")
+                }})
 
-            # 每日登录统计
-            daily_stats = self._get_daily_login_stats(days)
+            # 当前活跃会话数
+            active_sessions = self.db.query(func.count(LoginHistory.id)).filter(
+                self._active_session_filter()
+            ).scalar() or 0
 
             return {
                 "total_logins": total_logins,
                 "successful_logins": successful_logins,
                 "failed_logins": failed_logins,
-                "unique_users": unique_users,
+                "unique_users": sketch.count() if total_logins else 0,
                 "active_sessions": active_sessions,
                 "success_rate": (successful_logins / total_logins * 100) if total_logins > 0 else 0,
                 "daily_stats": daily_stats
@@ -216,6 +232,71 @@ class LoginHistoryCRUD:
                 "daily_stats": []
             }
 
+    def rollup_day(self, stat_date: date) -> Optional[LoginDailyRollup]:
+        """汇总指定日期的登录统计（可重复执行，覆盖已有汇总）"""
+        try:
+            start = datetime.combine(stat_date, datetime_time.min)
+            stats, sketch = self._aggregate_range(start, start + timedelta(days=1))
+
+            rollup = self.db.query(LoginDailyRollup).filter(LoginDailyRollup.stat_date == stat_date).first()
+            if rollup is None:
+                rollup = LoginDailyRollup(stat_date=stat_date)
+                self.db.add(rollup)
+
+            rollup.total_logins = stats["total_logins"]
+            rollup.successful_logins = stats["successful_logins"]
+            rollup.failed_logins = stats["failed_logins"]
+            rollup.unique_users = stats["unique_users"]
+            rollup.user_sketch = sketch.to_bytes()
+            self.db.commit()
+            return rollup
+
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"汇总每日登录统计失败: {stat_date}, 错误: {str(e)}")
+            return None
+
+    def ensure_daily_rollups(self, start_date: date, end_date: date) -> List[LoginDailyRollup]:
+        """获取日期范围内的每日汇总，缺失的日期（不含今天）立即补算"""
+        rollups = {
+            rollup.stat_date: rollup
+            for rollup in self.db.query(LoginDailyRollup).filter(
+                and_(LoginDailyRollup.stat_date >= start_date, LoginDailyRollup.stat_date <= end_date)
+            ).all()
+        }
+
+        current = start_date
+        while current <= end_date and current < date.today():
+            if current not in rollups:
+                rollup = self.rollup_day(current)
+                if rollup is not None:
+                    rollups[current] = rollup
+            current += timedelta(days=1)
+
+        return [rollups[day] for day in sorted(rollups)]
+
+    def _aggregate_range(self, start: datetime, end: Optional[datetime] = None) -> Tuple[Dict[str, int], HyperLogLog]:
+        """对时间范围内的登录明细做一次按用户分组的条件聚合，返回统计值和独立用户草图"""
+        conditions = [LoginHistory.login_time >= start]
+        if end is not None:
+            conditions.append(LoginHistory.login_time < end)
+
+        rows = self.db.query(
+            LoginHistory.user_id,
+            func.count(LoginHistory.id),
+            func.sum(case((LoginHistory.login_status == "success", 1), else_=0)),
+            func.sum(case((LoginHistory.login_status == "failed", 1), else_=0))
+        ).filter(and_(*conditions)).group_by(LoginHistory.user_id).all()
+
+        sketch = HyperLogLog()
+        stats = {"total_logins": 0, "successful_logins": 0, "failed_logins": 0, "unique_users": len(rows)}
+        for user_id, total, successful, failed in rows:
+            stats["total_logins"] += total or 0
+            stats["successful_logins"] += int(successful or 0)
+            stats["failed_logins"] += int(failed or 0)
+            sketch.add(user_id)
+        return stats, sketch
+
     def force_logout_session(self, session_id: str) -> bool:
         """强制退出会话"""
         return self.update_logout_time(session_id)
@@ -248,38 +329,3 @@ class LoginHistoryCRUD:
             duration = datetime.utcnow() - login_record.login_time
             return int(duration.total_seconds() / 60)
         return None
-
-    def _get_daily_login_stats(self, days: int) -> List[Dict[str, Any]]:
-        """获取每日登录统计"""
-        try:
-            start_date = datetime.utcnow() - timedelta(days=days)
-
-            # 使用原生SQL查询每日统计
-            query = text("""
-                SELECT
-                    DATE(login_time) as login_date,
-                    COUNT(*) as total_logins,
-                    SUM(CASE WHEN login_status = 'success' THEN 1 ELSE 0 END) as successful_logins,
-                    COUNT(DISTINCT user_id) as unique_users
-                FROM login_history
-                WHERE login_time >= :start_date
-                GROUP BY DATE(login_time)
-                ORDER BY login_date
-            """)
-
-            result = self.db.execute(query, {"start_date": start_date})
-
-            daily_stats = []
-            for row in result:
-                daily_stats.append({
-                    "date": str(row.login_date),
-                    "total_logins": row.total_logins,
-                    "successful_logins": row.successful_logins,
-                    "unique_users": row.unique_users
-                })
-
-            return daily_stats
-
-        except Exception as e:
-            logger.error(f"获取每日登录统计失败: {str(e)}")
-            return []
\ No newline at end of file
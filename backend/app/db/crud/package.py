@@ -5,6 +5,8 @@ from ..models import Package
 from datetime import datetime
 import logging
 from app.schemas.enums import PackageType
+from app.core.invalidation_bus import invalidation_bus, TOPIC_PACKAGES
+from app.services.package_key_stats import package_key_stats
 
 logger = logging.getLogger(__name__)
 
@@ -41,6 +43,7 @@ class PackageCRUD:
             self.db.add(package)
             self.db.commit()
             self.db.refresh(package)
+            invalidation_bus.publish(TOPIC_PACKAGES, [str(package.id)])
 
             logger.info(f"套餐创建成功: {package.package_code}, 每日重置积分: {daily_reset_credits}")
             return package
@@ -105,6 +108,7 @@ class PackageCRUD:
 
             package.updated_at = datetime.now()
             self.db.commit()
+            invalidation_bus.publish(TOPIC_PACKAGES, [str(package_id)])
 
             logger.info(f"套餐更新成功: {package.package_code}")
             return True
@@ -124,6 +128,7 @@ class PackageCRUD:
             package.is_active = not package.is_active
             package.updated_at = datetime.now()
             self.db.commit()
+            invalidation_bus.publish(TOPIC_PACKAGES, [str(package_id)])
 
             logger.info(f"套餐状态切换成功: {package.package_code}, 新状态: {package.is_active}")
             return True
@@ -143,6 +148,7 @@ class PackageCRUD:
             package.is_active = False
             package.updated_at = datetime.now()
             self.db.commit()
+            invalidation_bus.publish(TOPIC_PACKAGES, [str(package_id)])
 
             logger.info(f"套餐删除成功: {package.package_code}")
             return True
@@ -153,15 +159,36 @@ class PackageCRUD:
             return False
 
     def get_package_statistics(self) -> Dict[str, Any]:
-        """获取套餐统计信息"""
+        """获取套餐统计信息（密钥计数读取缓存的分组计数，不扫描 api_keys 表）"""
         try:
-            total_packages = self.db.query(Package).count()
-            active_packages = self.db.query(Package).filter(Package.is_active == True).count()
-
+            packages = self.db.query(
+                Package.id, Package.package_code, Package.package_name, Package.is_active
+            ).order_by(asc(Package.sort_order)).all()
+            key_counts = package_key_stats.get_counts()
+            key_totals = package_key_stats.totals()
+
+            package_key_counts = []
+            for package in packages:
+                by_status = key_counts.get(package.id, {})
+                package_key_counts.append({
+                    "package_id": package.id,
+                    "package_code": package.package_code,
+                    "package_name": package.package_name,
+                    "is_active": package.is_active,
+                    "total_keys": sum(by_status.values()),
+                    "active_keys": by_status.get("active", 0),
+                    "inactive_keys": by_status.get("inactive", 0)
+                })
+
+            active_packages = sum(1 for package in packages if package.is_active)
             return {
-                "total_packages": total_packages,
+                "total_packages": len(packages),
                 "active_packages": active_packages,
-                "inactive_packages": total_packages - active_packages
+                "inactive_packages": len(packages) - active_packages,
+                "total_user_keys": sum(key_totals.values()),
+                "active_user_keys": key_totals.get("active", 0),
+                "inactive_user_keys": key_totals.get("inactive", 0),
+                "package_key_counts": package_key_counts
             }
         except Exception as e:
             logger.error(f"获取套餐统计失败: {str(e)}")
@@ -1,6 +1,8 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from sqlalchemy import and_
 from ..models import User
+from ...core.principal_cache import principal_cache
+from ...core.token_revocation import token_revocation_list
 from datetime import datetime
 from typing import Optional, Dict, Any
 import logging
@@ -48,6 +50,10 @@ class UserCRUD:
 
         user.updated_at = datetime.now()
         self.db.commit()
+        principal_cache.invalidate_user(user_id)
+        if is_active is False or is_banned is True:
+            # 已签发的携带状态声明的访问令牌立即失效
+            token_revocation_list.revoke(user_id)
         logger.info(f"更新用户状态: {user_id}")
         return True
 
@@ -66,6 +72,7 @@ class UserCRUD:
         user.updated_at = datetime.now()
         self.db.commit()
         self.db.refresh(user)
+        principal_cache.invalidate_user(user_id)
         logger.info(f"更新用户信息: {user_id}")
         return user
 
@@ -79,6 +86,7 @@ class UserCRUD:
         user.is_active = True
         user.updated_at = datetime.now()
         self.db.commit()
+        principal_cache.invalidate_user(user_id)
         logger.info(f"用户邮箱验证完成: {user_id}")
         return True
 
@@ -90,6 +98,7 @@ class UserCRUD:
 
         user.last_login_at = datetime.now()
         self.db.commit()
+        principal_cache.invalidate_user(user_id)
         return True
 
     def delete_user(self, user_id: str) -> bool:
@@ -127,53 +136,3 @@ class UserCRUD:
             query = query.filter(User.is_active == True, User.is_banned == False)
 
         return query.all()
-
-    def search_users(
-        self,
-        search: str = None,
-        is_active: bool = None,
-        page: int = 1,
-        page_size: int = 20
-    ) -> list:
-        """搜索用户（带分页）"""
-        query = self.db.query(User)
-
-        # 关键字搜索
-        if search:
-            search_filter = or_(
-                User.user_id.contains(search),
-                User.email.contains(search),
-                User.phone.contains(search) if User.phone else False
-            )
-            query = query.filter(search_filter)
-
-        # 状态过滤
-        if is_active is not None:
-            query = query.filter(User.is_active == is_active)
-
-        # 分页
-        offset = (page - 1) * page_size
-        return query.offset(offset).limit(page_size).all()
-
-    def count_search_users(
-        self,
-        search: str = None,
-        is_active: bool = None
-    ) -> int:
-        """统计搜索结果数量"""
-        query = self.db.query(User)
-
-        # 关键字搜索
-        if search:
-            search_filter = or_(
-                User.user_id.contains(search),
-                User.email.contains(search),
-                User.phone.contains(search) if User.phone else False
-            )
-            query = query.filter(search_filter)
-
-        # 状态过滤
-        if is_active is not None:
-            query = query.filter(User.is_active == is_active)
-
-        return query.count()
\ No newline at end of file
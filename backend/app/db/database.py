@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, text, inspect
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.pool import QueuePool
@@ -49,12 +49,61 @@ def create_tables():
     """
     try:
         Base.metadata.create_all(bind=engine)
+        upgrade_tables()
         logger.info("数据库表创建成功")
     except Exception as e:
         logger.error(f"创建数据库表失败: {str(e)}")
         raise
 
 
+# 新增唯一索引前需要先合并的重复数据（索引名: SQL列表）
+_UNIQUE_INDEX_PREPARE = {
+    # 同一限流窗口的重复行：计数累加到ID最小的一行，再删除其余行
+    "uq_rate_limit_window": [
+        "UPDATE rate_limits keep JOIN ("
+        " SELECT user_id, service, window_start, MIN(id) AS keep_id, SUM(requests_count) AS total"
+        " FROM rate_limits GROUP BY user_id, service, window_start HAVING COUNT(*) > 1"
+        ") dup ON keep.id = dup.keep_id SET keep.requests_count = dup.total",
+        "DELETE extra FROM rate_limits extra JOIN rate_limits keep"
+        " ON keep.user_id = extra.user_id AND keep.service = extra.service"
+        " AND keep.window_start = extra.window_start AND keep.id < extra.id"
+    ]
+}
+
+
+def upgrade_tables():
+    """
+    补齐已存在表中缺失的列和索引
+
+    create_all 只会创建不存在的表，已有表新增的字段/索引需要在这里补齐。
+    新增列一律按可空添加，默认值由业务代码处理。
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+
+            existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type} NULL"))
+                logger.info(f"数据库表 {table.name} 新增列: {column.name}")
+
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing_indexes:
+                    continue
+                for statement in _UNIQUE_INDEX_PREPARE.get(index.name, []):
+                    connection.execute(text(statement))
+                index.create(bind=connection)
+                logger.info(f"数据库表 {table.name} 新增索引: {index.name}")
+
+
 def drop_tables():
     """
     删除所有数据库表（用于开发和测试）
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, DECIMAL, Index, Enum
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Date, Boolean, Text, DECIMAL, Index, Enum, LargeBinary
 from sqlalchemy.sql import func
 from .database import Base
 from datetime import datetime
@@ -55,6 +55,8 @@ class APIKey(Base):
     status = Column(String(20), default="inactive", nullable=False, comment="状态: active/inactive/expired")
     notes = Column(Text, nullable=True, comment="备注信息")
     last_reset_credits_at = Column(DateTime(timezone=True), nullable=True, comment="最后重置积分时间")
+    reset_epoch = Column(Date, nullable=True, comment="最近一次每日积分重置对应的北京日期")
+    batch_tag = Column(String(32), nullable=True, comment="批量生成任务的批次标记（内部使用）")
 
     created_at = Column(DateTime(timezone=True), server_default=func.now(), comment="创建时间")
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), comment="更新时间")
@@ -108,6 +110,7 @@ class EmailVerification(Base):
     user_id = Column(String(50), nullable=False, comment="用户ID")
     email = Column(String(255), nullable=False, comment="待验证邮箱")
     verification_code = Column(String(512), nullable=False, comment="验证码")
+    code_digest = Column(String(64), nullable=True, comment="验证码SHA-256摘要（用于索引查找）")
     verification_type = Column(String(20), nullable=False, comment="验证类型: register/reset_password")
     is_used = Column(Boolean, default=False, nullable=False, comment="是否已使用")
     expire_at = Column(DateTime(timezone=True), nullable=False, comment="过期时间")
@@ -194,14 +197,141 @@ class AdminOperation(Base):
     # 删除关联关系以简化架构
 
 
+class SchedulerLease(Base):
+    """定时任务租约表（多进程/多副本部署时保证同一任务只有一个节点执行）"""
+    __tablename__ = "scheduler_leases"
+
+    job_id = Column(String(100), primary_key=True, comment="任务ID")
+    holder = Column(String(150), nullable=True, comment="持有租约的节点")
+    lease_until = Column(DateTime(timezone=True), nullable=True, comment="租约到期时间")
+    acquired_at = Column(DateTime(timezone=True), nullable=True, comment="获取租约时间")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), comment="更新时间")
+
+
+class SchedulerJobRun(Base):
+    """定时任务执行记录表"""
+    __tablename__ = "scheduler_job_runs"
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    job_id = Column(String(100), nullable=False, comment="任务ID")
+    run_key = Column(String(50), nullable=False, comment="执行批次标识（同一任务同一批次只执行一次）")
+    node_id = Column(String(150), nullable=False, comment="执行节点")
+    status = Column(String(20), default="running", nullable=False, comment="状态: running/success/failed")
+    summary = Column(Text, nullable=True, comment="执行结果摘要（JSON格式）")
+    started_at = Column(DateTime(timezone=True), nullable=False, comment="开始时间")
+    finished_at = Column(DateTime(timezone=True), nullable=True, comment="结束时间")
+
+
+class CreditsResetRun(Base):
+    """积分重置执行记录表（每次每日重置任务一条）"""
+    __tablename__ = "credits_reset_runs"
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    mode = Column(String(20), nullable=False, comment="重置模式: batch/lazy")
+    status = Column(String(20), default="running", nullable=False, comment="状态: running/success/failed")
+    reset_date = Column(Date, nullable=False, comment="重置日期（北京时间）")
+    shard_index = Column(Integer, nullable=True, comment="分片序号（分片重置时）")
+    shard_count = Column(Integer, nullable=True, comment="分片总数（分片重置时）")
+    total_processed = Column(Integer, default=0, nullable=False, comment="处理总数")
+    total_success = Column(Integer, default=0, nullable=False, comment="成功数")
+    total_failed = Column(Integer, default=0, nullable=False, comment="失败数")
+    message = Column(Text, nullable=True, comment="执行信息")
+    started_at = Column(DateTime(timezone=True), nullable=False, comment="开始时间")
+    finished_at = Column(DateTime(timezone=True), nullable=True, comment="结束时间")
+
+
+class CreditsResetEvent(Base):
+    """积分重置明细表（每个密钥每次重置一条，批量写入）"""
+    __tablename__ = "credits_reset_events"
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    run_id = Column(Integer, nullable=True, comment="所属重置任务ID（按需重置和手动重置为空）")
+    api_key_id = Column(Integer, nullable=False, comment="API密钥ID")
+    user_id = Column(String(50), nullable=True, comment="用户ID")
+    reset_type = Column(String(20), nullable=False, comment="重置类型: daily/lazy/manual")
+    reset_date = Column(Date, nullable=False, comment="重置日期（北京时间）")
+    old_credits = Column(Integer, nullable=True, comment="重置前积分")
+    new_credits = Column(Integer, nullable=True, comment="重置后积分")
+    success = Column(Boolean, default=True, nullable=False, comment="是否成功")
+    external_api_success = Column(Boolean, nullable=True, comment="Redis同步是否成功")
+    message = Column(String(255), nullable=True, comment="失败原因")
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), comment="创建时间")
+
+
+class LoginDailyRollup(Base):
+    """每日登录统计汇总表（历史日期的登录统计直接读取该表）"""
+    __tablename__ = "login_daily_rollups"
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    stat_date = Column(Date, nullable=False, comment="统计日期")
+    total_logins = Column(Integer, default=0, nullable=False, comment="登录次数")
+    successful_logins = Column(Integer, default=0, nullable=False, comment="成功登录次数")
+    failed_logins = Column(Integer, default=0, nullable=False, comment="失败登录次数")
+    unique_users = Column(Integer, default=0, nullable=False, comment="独立用户数")
+    user_sketch = Column(LargeBinary, nullable=True, comment="独立用户HyperLogLog草图（用于跨天合并）")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), comment="更新时间")
+
+
+class EmailOutbox(Base):
+    """待发送邮件队列表（由邮件投递工作协程批量发送）"""
+    __tablename__ = "email_outbox"
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    recipients = Column(String(1000), nullable=False, comment="收件人（逗号分隔）")
+    subject = Column(String(255), nullable=False, comment="邮件主题")
+    html_content = Column(Text, nullable=False, comment="HTML正文")
+    text_content = Column(Text, nullable=True, comment="纯文本正文")
+    status = Column(String(20), default="pending", nullable=False, comment="状态: pending/sending/sent/failed")
+    attempts = Column(Integer, default=0, nullable=False, comment="已尝试次数")
+    next_attempt_at = Column(DateTime(timezone=True), nullable=False, comment="下次发送时间")
+    locked_by = Column(String(150), nullable=True, comment="正在发送的节点")
+    locked_until = Column(DateTime(timezone=True), nullable=True, comment="发送锁过期时间")
+    last_error = Column(String(500), nullable=True, comment="最近一次失败原因")
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), comment="创建时间")
+    sent_at = Column(DateTime(timezone=True), nullable=True, comment="发送成功时间")
+
+
+class AdminJob(Base):
+    """管理后台异步任务表（批量操作在后台分块执行，进度和断点保存在这里）"""
+    __tablename__ = "admin_jobs"
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    job_type = Column(String(50), nullable=False, comment="任务类型")
+    status = Column(String(20), default="pending", nullable=False, comment="状态: pending/running/success/failed/cancelled")
+    params = Column(Text, nullable=True, comment="任务参数（JSON格式）")
+    checkpoint = Column(Text, nullable=True, comment="断点（JSON格式，每块完成后更新）")
+    total = Column(Integer, default=0, nullable=False, comment="预计处理总数")
+    processed = Column(Integer, default=0, nullable=False, comment="已处理数")
+    succeeded = Column(Integer, default=0, nullable=False, comment="成功数")
+    failed = Column(Integer, default=0, nullable=False, comment="失败数")
+    message = Column(Text, nullable=True, comment="执行信息")
+    cancel_requested = Column(Boolean, default=False, nullable=False, comment="是否已请求取消")
+    created_by = Column(String(100), nullable=True, comment="提交人")
+    locked_by = Column(String(150), nullable=True, comment="执行节点")
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True, comment="最近一次心跳（每块完成后更新）")
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), comment="创建时间")
+    started_at = Column(DateTime(timezone=True), nullable=True, comment="开始时间")
+    finished_at = Column(DateTime(timezone=True), nullable=True, comment="结束时间")
+
+
+
+class TokenRevocation(Base):
+    """访问令牌吊销记录表（多进程部署下各进程定期同步到进程内吊销列表）"""
+    __tablename__ = "token_revocations"
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    subject = Column(String(150), nullable=False, comment="令牌subject（用户ID或admin_用户名）")
+    revoked_at = Column(BigInteger, nullable=False, comment="吊销时间（Unix毫秒时间戳），此前签发的令牌失效")
 
 
 # 创建复合索引优化查询性能
 Index('idx_api_key_user', APIKey.user_id, APIKey.api_key)
 # Index('idx_user_plan_active', UserPlan.user_id, UserPlan.is_active, UserPlan.expire_date)  # UserPlan表已删除
 Index('idx_usage_record_time_new', UsageRecord.api_key_id, UsageRecord.request_timestamp)
-Index('idx_rate_limit_window', RateLimit.user_id, RateLimit.service, RateLimit.window_start, RateLimit.window_end)
-Index('idx_email_verification', EmailVerification.email, EmailVerification.verification_code, EmailVerification.is_used)
+Index('uq_rate_limit_window', RateLimit.user_id, RateLimit.service, RateLimit.window_start, unique=True)
+Index('idx_email_verification_digest', EmailVerification.code_digest)
+Index('idx_email_verification_user', EmailVerification.user_id, EmailVerification.verification_type, EmailVerification.is_used)
+Index('idx_email_verification_expire', EmailVerification.expire_at)
 # Index('idx_user_key_relation', UserKey.user_id, UserKey.api_key_id, UserKey.status)  # UserKey表已删除
 Index('idx_login_history', LoginHistory.user_id, LoginHistory.login_time)
 Index('idx_admin_operations', AdminOperation.admin_user_id, AdminOperation.operation_type, AdminOperation.created_at)
@@ -216,4 +346,39 @@ Index('idx_api_key_status_active', APIKey.user_id, APIKey.status, APIKey.is_acti
 Index('idx_usage_record_stats', UsageRecord.api_key_id, UsageRecord.service, UsageRecord.request_timestamp)
 
 # 优化套餐关联查询
-Index('idx_api_key_package_status', APIKey.package_id, APIKey.status, APIKey.created_at)
\ No newline at end of file
+Index('idx_api_key_package_status', APIKey.package_id, APIKey.status, APIKey.created_at)
+
+# 定时任务执行记录：同一任务同一批次唯一，防止多节点重复执行
+Index('uq_scheduler_job_run', SchedulerJobRun.job_id, SchedulerJobRun.run_key, unique=True)
+Index('idx_scheduler_job_run_time', SchedulerJobRun.job_id, SchedulerJobRun.started_at)
+
+# 积分重置明细：按日期和类型统计、按任务/密钥追溯
+Index('idx_credits_reset_event_date', CreditsResetEvent.reset_date, CreditsResetEvent.reset_type)
+Index('idx_credits_reset_event_run', CreditsResetEvent.run_id)
+Index('idx_credits_reset_event_key', CreditsResetEvent.api_key_id, CreditsResetEvent.created_at)
+Index('idx_credits_reset_run_date', CreditsResetRun.reset_date)
+
+# 邮件队列：按状态和下次发送时间取待发送邮件
+Index('idx_email_outbox_dispatch', EmailOutbox.status, EmailOutbox.next_attempt_at)
+
+# 登录统计：按登录时间范围扫描当天明细，按日期读取汇总
+Index('idx_login_history_time', LoginHistory.login_time, LoginHistory.login_status)
+Index('uq_login_daily_rollup_date', LoginDailyRollup.stat_date, unique=True)
+
+# 管理后台密钥列表：按 (created_at, id) 游标分页（可选按状态过滤）
+Index('idx_api_key_created', APIKey.created_at, APIKey.id)
+Index('idx_api_key_status_created', APIKey.status, APIKey.created_at, APIKey.id)
+
+# 管理后台搜索：ngram全文索引支持邮箱/手机号/用户ID、密钥名称的包含匹配
+Index('ft_user_search', User.user_id, User.email, User.phone, mysql_prefix='FULLTEXT', mysql_with_parser='ngram')
+Index('ft_api_key_name', APIKey.key_name, mysql_prefix='FULLTEXT', mysql_with_parser='ngram')
+
+# 管理后台异步任务：按状态取待执行任务、按时间列出最近任务
+Index('idx_admin_job_status', AdminJob.status, AdminJob.created_at)
+
+# 令牌吊销：按subject更新吊销时间，按吊销时间增量同步和清理
+Index('uq_token_revocation_subject', TokenRevocation.subject, unique=True)
+Index('idx_token_revocation_time', TokenRevocation.revoked_at)
+
+# 批量生成任务：按批次标记统计已生成的密钥数（断点续跑）
+Index('idx_api_key_batch_tag', APIKey.batch_tag)
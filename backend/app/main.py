@@ -1,19 +1,27 @@
 import os
 from datetime import datetime
-from fastapi import FastAPI, Request, HTTPException
+from fastapi import Depends, FastAPI, Request, HTTPException
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
 from apscheduler.jobstores.memory import MemoryJobStore
 from pytz import timezone
 
 from .core.config import settings
 from .core.logging import setup_logging, logger
 from .db.database import check_db_connection, create_tables, SessionLocal
-from .api.routes import api_key_validation, auth, user, user_keys, packages, admin, usage_history
-from .services.credits_reset_service import CreditsResetService
+from .api.routes import api_key_validation, auth, user, user_keys, packages, admin, admin_jobs, usage_history
+from .api.routes.admin import get_admin_user
+from .services.scheduled_jobs import register_scheduled_jobs, run_manual_credits_reset_job
+from .services.scheduler_lease_service import SchedulerLeaseService
+from .core.password_hasher import password_hasher
+from .core.rate_limiter import rate_limiter
+from .core.token_revocation import token_revocation_list
+from .core.email_delivery import email_delivery
+from .core.email_templates import email_templates
+from .core.login_event_writer import login_event_writer
+from .services.admin_job_service import admin_job_worker
 
 # 设置日志
 setup_logging()
@@ -22,46 +30,6 @@ setup_logging()
 scheduler = None
 
 
-def execute_daily_credits_reset():
-    """执行每日积分重置任务"""
-    try:
-        logger.info("开始执行每日积分重置任务...")
-
-        # 创建数据库会话
-        db = SessionLocal()
-        try:
-            # 创建积分重置服务
-            reset_service = CreditsResetService(db)
-
-            # 执行重置任务
-            result = reset_service.execute_daily_reset(batch_size=100)
-
-            if result["success"]:
-                logger.info(
-                    f"每日积分重置任务执行成功: "
-                    f"处理总数={result['total_processed']}, "
-                    f"成功={result['total_success']}, "
-                    f"失败={result['total_failed']}, "
-                    f"耗时={result['execution_time_seconds']:.2f}秒"
-                )
-            else:
-                logger.warning(
-                    f"每日积分重置任务执行完成但有失败: "
-                    f"处理总数={result['total_processed']}, "
-                    f"成功={result['total_success']}, "
-                    f"失败={result['total_failed']}, "
-                    f"消息={result.get('message', '未知错误')}"
-                )
-
-        except Exception as e:
-            logger.error(f"执行每日积分重置任务时发生异常: {str(e)}", exc_info=True)
-        finally:
-            db.close()
-
-    except Exception as e:
-        logger.error(f"每日积分重置任务执行失败: {str(e)}", exc_info=True)
-
-
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """应用生命周期管理"""
@@ -79,6 +47,17 @@ async def lifespan(app: FastAPI):
             logger.info("数据库表检查完成")
         except Exception as e:
             logger.error(f"创建数据库表失败: {str(e)}")
+
+        # 恢复限流计数（跨重启保持限流窗口）
+        db = SessionLocal()
+        try:
+            rate_limiter.load(db)
+        finally:
+            db.close()
+
+        # 载入其他进程写入的令牌吊销记录（之后由定时任务增量同步）
+        if settings.JWT_EMBED_CLAIMS:
+            token_revocation_list.sync()
     else:
         logger.error("数据库连接失败，请检查配置")
 
@@ -91,33 +70,50 @@ async def lifespan(app: FastAPI):
             timezone=beijing_tz
         )
 
-        # 配置每日0时执行积分重置任务（北京时间）
-        scheduler.add_job(
-            execute_daily_credits_reset,
-            trigger=CronTrigger(hour=0, minute=0, second=0, timezone=beijing_tz),  # 每天北京时间0:00:00执行
-            id="daily_credits_reset",
-            name="每日积分重置任务",
-            replace_existing=True,
-            misfire_grace_time=300,  # 允许错过执行时间300秒
-            coalesce=True  # 合并多次错过执行
-        )
+        # 注册定时任务（多进程部署时由租约保证每个任务只有一个节点执行）
+        register_scheduled_jobs(scheduler, beijing_tz)
 
         # 启动调度器
         scheduler.start()
         logger.info(f"定时任务调度器启动成功，每日积分重置任务已注册，时区: {beijing_tz}")
 
         # 立即执行一次测试（可选，用于调试）
-        # scheduler.add_job(execute_daily_credits_reset, trigger='date', run_date=datetime.now())
+        # scheduler.add_job(run_manual_credits_reset_job, trigger='date', run_date=datetime.now())
 
     except Exception as e:
         logger.error(f"定时任务调度器启动失败: {str(e)}", exc_info=True)
         scheduler = None
 
+    # 设置bcrypt cost（固定配置，所有进程一致，避免各自校准导致反复重新哈希）
+    password_hasher.configure_rounds(settings.BCRYPT_ROUNDS or None)
+
+    # 预编译邮件模板
+    try:
+        email_templates.compile_all()
+    except Exception as e:
+        logger.error(f"邮件模板编译失败: {str(e)}")
+
+    # 启动登录事件写入线程
+    login_event_writer.start()
+
+    # 启动邮件投递协程
+    if settings.EMAIL_OUTBOX_ENABLED:
+        email_delivery.start()
+
+    # 启动管理后台任务工作线程
+    admin_job_worker.start()
+
     yield
 
     # 关闭时
     logger.info("应用正在关闭...")
 
+    # 停止邮件投递协程（未发送的邮件留在队列中，下次启动后继续发送）
+    await email_delivery.stop()
+
+    # 停止管理后台任务工作线程（执行中的任务退回待执行，下次启动后从断点继续）
+    admin_job_worker.stop()
+
     # 关闭定时任务调度器
     if scheduler:
         try:
@@ -126,6 +122,19 @@ async def lifespan(app: FastAPI):
         except Exception as e:
             logger.error(f"关闭定时任务调度器时发生错误: {str(e)}")
 
+    # 写完队列中剩余的登录事件
+    login_event_writer.stop()
+
+    # 写入尚未持久化的限流计数
+    db = SessionLocal()
+    try:
+        rate_limiter.flush(db)
+    finally:
+        db.close()
+
+    # 关闭密码哈希工作池
+    password_hasher.shutdown()
+
 # 创建FastAPI应用
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -189,13 +198,21 @@ async def trigger_daily_reset():
         # 这里可以添加权限检查，例如检查请求头中的管理员令牌
         # 暂时先允许所有请求用于测试
 
-        # 执行任务
-        execute_daily_credits_reset()
+        # 执行任务（与定时任务共用租约，其他节点正在执行时直接返回）
+        result = run_manual_credits_reset_job()
 
         # 使用+8时区时间
         beijing_tz = timezone('Asia/Shanghai')
         now = datetime.now(beijing_tz)
 
+        if result is None:
+            return {
+                "success": False,
+                "message": "积分重置任务正在其他节点执行，本次触发已跳过",
+                "timestamp": now.isoformat(),
+                "timezone": "Asia/Shanghai (+8)"
+            }
+
         return {
             "success": True,
             "message": "手动触发每日积分重置任务已执行",
@@ -228,17 +245,63 @@ async def get_scheduler_status():
                 "trigger": str(job.trigger)
             })
 
+        # 租约与执行记录（多节点部署时可看到当前由哪个节点持有任务）
+        db = SessionLocal()
+        try:
+            lease_service = SchedulerLeaseService(db)
+            node_id = lease_service.node_id
+            leases = lease_service.get_leases()
+            recent_runs = lease_service.get_recent_runs(limit=20)
+        finally:
+            db.close()
+
         return {
             "success": True,
             "scheduler_running": scheduler.running,
+            "node_id": node_id,
             "jobs": jobs,
-            "job_count": len(jobs)
+            "job_count": len(jobs),
+            "leases": leases,
+            "recent_runs": recent_runs
         }
 
     except Exception as e:
         logger.error(f"获取定时任务状态失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"获取状态失败: {str(e)}")
 
+
+@app.get("/api/v1/admin/password-hasher-status")
+async def get_password_hasher_status(current_admin = Depends(get_admin_user)):
+    """获取密码哈希工作池状态（并发、排队深度、拒绝次数、平均耗时）（管理员）"""
+    return {
+        "success": True,
+        "metrics": password_hasher.get_metrics()
+    }
+
+
+@app.get("/api/v1/admin/login-event-writer-status")
+async def get_login_event_writer_status():
+    """获取登录事件写入器状态（队列积压、批次数、丢弃数）"""
+    return {
+        "success": True,
+        "metrics": login_event_writer.get_metrics()
+    }
+
+@app.get("/api/v1/admin/email-delivery-status")
+async def get_email_delivery_status(current_admin = Depends(get_admin_user)):
+    """获取邮件投递状态（队列积压、连接池、每分钟吞吐）（管理员）"""
+    db = SessionLocal()
+    try:
+        queue = email_delivery.get_queue_depth(db)
+    finally:
+        db.close()
+
+    return {
+        "success": True,
+        "queue": queue,
+        "metrics": email_delivery.get_metrics()
+    }
+
 # 全局异常处理器
 @app.exception_handler(Exception)
 def global_exception_handler(request: Request, exc: Exception):
@@ -263,6 +326,7 @@ app.include_router(user_keys.router)
 app.include_router(api_key_validation.router)
 app.include_router(packages.router)
 app.include_router(admin.router)
+app.include_router(admin_jobs.router)
 app.include_router(usage_history.router)
 # user_key_management.router 已删除（功能合并到其他路由）
 
@@ -255,4 +255,9 @@ class AdminOperationNewResponse(BaseModel):
     created_at: datetime
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class AdminJobSubmitRequest(BaseModel):
+    """提交管理后台异步任务请求"""
+    job_type: str = Field(..., description="任务类型，如 userkeys.generate/userkeys.delete/userkeys.disable/data_integrity.fix/credits.manual_reset")
+    params: Dict[str, Any] = Field(default_factory=dict, description="任务参数")
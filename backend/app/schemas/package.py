@@ -114,8 +114,23 @@ class PackagePurchaseResponse(BaseModel):
     expire_date: datetime
 
 
+class PackageKeyCountResponse(BaseModel):
+    """单个订阅的用户密钥计数"""
+    package_id: int
+    package_code: str
+    package_name: str
+    is_active: bool
+    total_keys: int
+    active_keys: int
+    inactive_keys: int
+
+
 class PackageStatisticsResponse(BaseModel):
     """订阅统计响应"""
     total_packages: int
     active_packages: int
-    inactive_packages: int
\ No newline at end of file
+    inactive_packages: int
+    total_user_keys: int = 0
+    active_user_keys: int = 0
+    inactive_user_keys: int = 0
+    package_key_counts: List[PackageKeyCountResponse] = []
\ No newline at end of file
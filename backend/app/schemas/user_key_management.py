@@ -80,5 +80,6 @@ class BulkUserKeyOperation(BaseModel):
     """批量用户密钥操作"""
     user_ids: List[str] = Field(..., description="用户ID列表")
     api_key_id: int = Field(..., description="API密钥ID")
+    api_key_ids: List[int] = Field(default_factory=list, description="要禁用/删除的密钥ID列表")
     operation: str = Field(..., description="操作类型: activate/deactivate/delete")
     notes: Optional[str] = Field(None, description="操作备注")
\ No newline at end of file
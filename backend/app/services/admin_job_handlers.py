@@ -0,0 +1,197 @@
+"""
+管理后台异步任务类型
+
+导入本模块即完成注册。现有的按ID列表执行的批量CRUD方法通过 _register_id_list_job 包装为任务：
+ID列表按块切分，每块调用一次原方法，断点为已处理的ID个数。
+"""
+import logging
+import secrets
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import and_, func
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..core.invalidation_bus import invalidation_bus, TOPIC_API_KEYS
+from ..db.crud.api_key import APIKeyCRUD
+from ..db.models import APIKey, Package
+from .admin_job_service import JobChunkResult, JobHandler, register_job_handler
+from .scheduled_jobs import run_manual_credits_reset_job
+
+logger = logging.getLogger(__name__)
+
+
+def _get_package(db: Session, package_id: Any) -> Package:
+    package = db.query(Package).filter(Package.id == package_id).first() if package_id else None
+    if not package:
+        raise ValueError("订阅不存在")
+    return package
+
+
+def _validate_id_list(db: Session, params: Dict[str, Any]) -> None:
+    ids = params.get("api_key_ids")
+    if not isinstance(ids, list) or not ids or not all(isinstance(item, int) for item in ids):
+        raise ValueError("api_key_ids 必须是非空的整数列表")
+
+
+def _register_id_list_job(job_type: str, description: str, method_name: str, count_field: str) -> None:
+    """把 APIKeyCRUD 中接收ID列表、返回 {success, <count_field>} 的批量方法注册为任务"""
+
+    def run_chunk(db: Session, params: Dict[str, Any], checkpoint: Optional[int], chunk_size: int) -> JobChunkResult:
+        ids: List[int] = params["api_key_ids"]
+        offset = checkpoint or 0
+        chunk = ids[offset:offset + chunk_size]
+        result = getattr(APIKeyCRUD(db), method_name)(chunk) if chunk else {"success": True}
+        succeeded = result.get(count_field, 0) if result.get("success") else 0
+        next_offset = offset + len(chunk)
+        return JobChunkResult(
+            processed=len(chunk),
+            succeeded=succeeded,
+            failed=len(chunk) - succeeded,
+            checkpoint=next_offset,
+            done=next_offset >= len(ids),
+            message=f"{description}完成"
+        )
+
+    register_job_handler(JobHandler(
+        job_type=job_type,
+        description=description,
+        run_chunk=run_chunk,
+        estimate=lambda db, params: len(params["api_key_ids"]),
+        validate=_validate_id_list
+    ))
+
+
+_register_id_list_job("userkeys.delete", "批量删除用户密钥", "delete_user_keys_by_ids", "deleted_count")
+_register_id_list_job("userkeys.disable", "批量禁用用户密钥", "disable_user_keys_by_ids", "disabled_count")
+
+
+def _validate_generate(db: Session, params: Dict[str, Any]) -> None:
+    _get_package(db, params.get("package_id"))
+    count = params.get("count")
+    if not isinstance(count, int) or count <= 0 or count > settings.USER_KEY_BATCH_MAX_COUNT:
+        raise ValueError(f"生成数量必须在 1 到 {settings.USER_KEY_BATCH_MAX_COUNT} 之间")
+    # 本任务生成的密钥都带此标记，断点按标记统计
+    params.setdefault("batch_tag", secrets.token_hex(8))
+
+
+def _count_generated(db: Session, batch_tag: str) -> int:
+    """统计任务已提交的密钥数"""
+    return db.query(func.count(APIKey.id)).filter(APIKey.batch_tag == batch_tag).scalar() or 0
+
+
+def _run_generate_chunk(db: Session, params: Dict[str, Any], checkpoint: Optional[int], chunk_size: int) -> JobChunkResult:
+    """
+    生成一块密钥
+
+    密钥与任务断点分两次提交，生成后、保存断点前中断时断点会落后于实际生成数，
+    因此已生成数以数据库中带本任务批次标记的密钥数为准，断点只用于累计进度。
+    """
+    package = _get_package(db, params["package_id"])
+    batch_tag = params["batch_tag"]
+    recorded = checkpoint or 0
+    generated = _count_generated(db, batch_tag)
+    size = min(chunk_size, params["count"] - generated)
+
+    created = 0
+    if size > 0:
+        for chunk in APIKeyCRUD(db).generate_user_key_chunks(
+            package, size, params.get("real_api_key") or "default-real-key", params.get("notes"),
+            chunk_size=size, first_index=generated, batch_tag=batch_tag
+        ):
+            created += len(chunk)
+
+    total = generated + created
+    return JobChunkResult(
+        processed=total - recorded,
+        succeeded=total - recorded,
+        checkpoint=total,
+        done=total >= params["count"],
+        message=f"成功生成 {total} 个用户密钥"
+    )
+
+
+register_job_handler(JobHandler(
+    job_type="userkeys.generate",
+    description="批量生成用户密钥",
+    run_chunk=_run_generate_chunk,
+    estimate=lambda db, params: params["count"],
+    validate=_validate_generate
+))
+
+
+def _missing_package_filter(after_id: int):
+    return and_(APIKey.package_id.is_(None), APIKey.id > after_id)
+
+
+def _run_assign_package_chunk(db: Session, params: Dict[str, Any], checkpoint: Optional[int], chunk_size: int) -> JobChunkResult:
+    last_id = checkpoint or 0
+    package = _get_package(db, params["default_package_id"])
+
+    rows = db.query(APIKey.id, APIKey.api_key).filter(
+        _missing_package_filter(last_id)
+    ).order_by(APIKey.id).limit(chunk_size).all()
+    ids = [row.id for row in rows]
+    if not ids:
+        return JobChunkResult(processed=0, succeeded=0, checkpoint=last_id, done=True, message="数据修复完成")
+
+    updated = db.query(APIKey).filter(
+        and_(APIKey.id.in_(ids), APIKey.package_id.is_(None))
+    ).update(
+        {
+            "package_id": package.id,
+            "remaining_days": package.duration_days,
+            "remaining_credits": package.credits,
+            "total_credits": package.credits,
+            "notes": f"Auto-fixed by admin job on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+        },
+        synchronize_session=False
+    )
+    db.commit()
+    invalidation_bus.publish(TOPIC_API_KEYS, [row.api_key for row in rows])
+
+    return JobChunkResult(
+        processed=len(ids),
+        succeeded=updated,
+        failed=len(ids) - updated,
+        checkpoint=ids[-1],
+        done=len(ids) < chunk_size,
+        message="数据修复完成"
+    )
+
+
+def _validate_assign_package(db: Session, params: Dict[str, Any]) -> None:
+    _get_package(db, params.get("default_package_id"))
+
+
+register_job_handler(JobHandler(
+    job_type="data_integrity.fix",
+    description="为未关联订阅的密钥补齐默认订阅",
+    run_chunk=_run_assign_package_chunk,
+    estimate=lambda db, params: db.query(APIKey.id).filter(APIKey.package_id.is_(None)).count(),
+    validate=_validate_assign_package
+))
+
+
+def _run_manual_reset(db: Session, params: Dict[str, Any], checkpoint: Optional[int], chunk_size: int) -> JobChunkResult:
+    # 积分重置自身按批处理并记录明细，这里整体作为一块执行（与定时任务共用租约）
+    result = run_manual_credits_reset_job()
+    if result is None:
+        return JobChunkResult(processed=0, succeeded=0, done=True, message="积分重置任务正在其他节点执行，已跳过")
+    if not result.get("success") and "total_processed" not in result:
+        raise RuntimeError(result.get("message") or "积分重置失败")
+    return JobChunkResult(
+        processed=result.get("total_processed", 0),
+        succeeded=result.get("total_success", 0),
+        failed=result.get("total_failed", 0),
+        done=True,
+        message=result.get("message") or "积分重置完成"
+    )
+
+
+register_job_handler(JobHandler(
+    job_type="credits.manual_reset",
+    description="手动执行每日积分重置",
+    run_chunk=_run_manual_reset
+))
@@ -0,0 +1,390 @@
+import json
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import and_, desc, func, or_
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..db.database import SessionLocal
+from ..db.models import AdminJob
+from .scheduler_lease_service import get_node_id
+
+logger = logging.getLogger(__name__)
+
+JOB_STATUS_PENDING = "pending"
+JOB_STATUS_RUNNING = "running"
+JOB_STATUS_SUCCESS = "success"
+JOB_STATUS_FAILED = "failed"
+JOB_STATUS_CANCELLED = "cancelled"
+
+
+class JobChunkResult:
+    """任务处理一块后的结果"""
+
+    __slots__ = ("processed", "succeeded", "failed", "checkpoint", "done", "message")
+
+    def __init__(self, processed: int, succeeded: int, failed: int = 0, checkpoint: Any = None,
+                 done: bool = False, message: Optional[str] = None):
+        self.processed = processed
+        self.succeeded = succeeded
+        self.failed = failed
+        self.checkpoint = checkpoint
+        self.done = done
+        self.message = message
+
+
+class JobHandler:
+    """
+    任务类型定义
+
+    run_chunk(db, params, checkpoint, chunk_size) 处理一块数据并返回 JobChunkResult，
+    工作线程反复调用直到 done，每块之后保存断点；节点重启后从断点继续。
+    estimate(db, params) 返回预计处理总数（用于进度）；validate(db, params) 在提交时校验参数，
+    不合法时抛出 ValueError，也可以向 params 补充执行所需的字段（随任务一起保存）。
+    """
+
+    __slots__ = ("job_type", "description", "run_chunk", "estimate", "validate")
+
+    def __init__(self, job_type: str, description: str,
+                 run_chunk: Callable[[Session, Dict[str, Any], Any, int], JobChunkResult],
+                 estimate: Optional[Callable[[Session, Dict[str, Any]], int]] = None,
+                 validate: Optional[Callable[[Session, Dict[str, Any]], None]] = None):
+        self.job_type = job_type
+        self.description = description
+        self.run_chunk = run_chunk
+        self.estimate = estimate
+        self.validate = validate
+
+
+_job_handlers: Dict[str, JobHandler] = {}
+
+
+def register_job_handler(handler: JobHandler) -> JobHandler:
+    """注册任务类型"""
+    _job_handlers[handler.job_type] = handler
+    return handler
+
+
+def get_job_handler(job_type: str) -> Optional[JobHandler]:
+    """获取任务类型定义"""
+    return _job_handlers.get(job_type)
+
+
+def list_job_handlers() -> List[Dict[str, str]]:
+    """列出已注册的任务类型"""
+    return [
+        {"job_type": handler.job_type, "description": handler.description}
+        for handler in sorted(_job_handlers.values(), key=lambda handler: handler.job_type)
+    ]
+
+
+class AdminJobService:
+    """管理后台异步任务服务 - 提交、查询、取消任务"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def submit(self, job_type: str, params: Dict[str, Any], created_by: Optional[str] = None) -> AdminJob:
+        """
+        提交任务
+
+        Raises:
+            ValueError: 任务类型不存在或参数不合法
+        """
+        handler = get_job_handler(job_type)
+        if handler is None:
+            raise ValueError(f"不支持的任务类型: {job_type}")
+        if handler.validate:
+            handler.validate(self.db, params)
+
+        job = AdminJob(
+            job_type=job_type,
+            status=JOB_STATUS_PENDING,
+            params=json.dumps(params, ensure_ascii=False),
+            total=handler.estimate(self.db, params) if handler.estimate else 0,
+            created_by=created_by
+        )
+        self.db.add(job)
+        self.db.commit()
+        self.db.refresh(job)
+
+        logger.info(f"管理后台任务已提交: #{job.id} {job_type}, 提交人: {created_by}")
+        admin_job_worker.notify()
+        return job
+
+    def get_job(self, job_id: int) -> Optional[AdminJob]:
+        """获取任务"""
+        return self.db.query(AdminJob).filter(AdminJob.id == job_id).first()
+
+    def list_jobs(self, status: Optional[str] = None, limit: int = 50) -> List[AdminJob]:
+        """列出最近的任务"""
+        query = self.db.query(AdminJob)
+        if status:
+            query = query.filter(AdminJob.status == status)
+        return query.order_by(desc(AdminJob.id)).limit(limit).all()
+
+    def request_cancel(self, job_id: int) -> Dict[str, Any]:
+        """请求取消任务（未开始的任务直接取消，执行中的任务在当前块完成后停止）"""
+        try:
+            cancelled = self.db.query(AdminJob).filter(
+                and_(AdminJob.id == job_id, AdminJob.status == JOB_STATUS_PENDING)
+            ).update(
+                {"status": JOB_STATUS_CANCELLED, "cancel_requested": True, "finished_at": datetime.now(),
+                 "message": "任务已取消"},
+                synchronize_session=False
+            )
+            if not cancelled:
+                cancelled = self.db.query(AdminJob).filter(
+                    and_(AdminJob.id == job_id, AdminJob.status == JOB_STATUS_RUNNING)
+                ).update({"cancel_requested": True}, synchronize_session=False)
+            self.db.commit()
+
+            if not cancelled:
+                return {"success": False, "message": "任务不存在或已结束"}
+            return {"success": True, "message": "已请求取消任务"}
+
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"取消管理后台任务失败: {str(e)}")
+            return {"success": False, "message": f"取消失败: {str(e)}"}
+
+    @staticmethod
+    def to_progress(job: AdminJob) -> Dict[str, Any]:
+        """任务进度（含吞吐量和预计剩余时间）"""
+        elapsed = 0.0
+        if job.started_at:
+            end = job.finished_at or datetime.now()
+            elapsed = max((end.replace(tzinfo=None) - job.started_at.replace(tzinfo=None)).total_seconds(), 0.0)
+        throughput = job.processed / elapsed if elapsed > 0 else 0.0
+
+        remaining = max((job.total or 0) - job.processed, 0)
+        eta_seconds = None
+        if job.status == JOB_STATUS_RUNNING and throughput > 0 and job.total:
+            eta_seconds = round(remaining / throughput, 1)
+
+        return {
+            "id": job.id,
+            "job_type": job.job_type,
+            "status": job.status,
+            "total": job.total,
+            "processed": job.processed,
+            "succeeded": job.succeeded,
+            "failed": job.failed,
+            "percent": round(min(job.processed / job.total, 1.0) * 100, 1) if job.total else None,
+            "throughput_per_second": round(throughput, 1),
+            "elapsed_seconds": round(elapsed, 1),
+            "eta_seconds": eta_seconds,
+            "cancel_requested": job.cancel_requested,
+            "message": job.message,
+            "created_by": job.created_by,
+            "locked_by": job.locked_by,
+            "created_at": job.created_at,
+            "started_at": job.started_at,
+            "finished_at": job.finished_at
+        }
+
+
+class AdminJobWorker:
+    """
+    管理后台任务工作线程池
+
+    每个线程循环认领一个待执行任务（条件UPDATE抢占，多进程部署时同一任务只会被一个节点执行），
+    分块执行并在每块之后更新进度和断点；执行期间另有心跳线程定期刷新心跳，
+    心跳超过 stale_seconds 的执行中任务视为节点已退出，由其他节点从断点接管。
+    应用关闭时正在执行的任务在当前块完成后退回待执行状态。
+    """
+
+    def __init__(self, workers: int = 2, chunk_size: int = 1000, poll_seconds: float = 2,
+                 stale_seconds: int = 300, session_factory: Callable[[], Session] = SessionLocal):
+        self.workers = max(workers, 1)
+        self.chunk_size = max(chunk_size, 1)
+        self.poll_seconds = max(poll_seconds, 0.1)
+        self.stale_seconds = stale_seconds
+        self.session_factory = session_factory
+        self.node_id = get_node_id()
+
+        self._threads: List[threading.Thread] = []
+        self._stop_event = threading.Event()
+        self._wakeup = threading.Event()
+
+    def start(self) -> None:
+        """启动工作线程"""
+        if any(thread.is_alive() for thread in self._threads):
+            return
+        self._stop_event.clear()
+        self._threads = [
+            threading.Thread(target=self._run, name=f"admin-job-worker-{index}", daemon=True)
+            for index in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+        logger.info(f"管理后台任务工作线程已启动: {self.workers} 个, 每块 {self.chunk_size} 条")
+
+    def stop(self, timeout: float = 30) -> None:
+        """停止工作线程（正在执行的任务完成当前块后退回待执行）"""
+        self._stop_event.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+        logger.info("管理后台任务工作线程已停止")
+
+    def notify(self) -> None:
+        """有新任务提交时唤醒工作线程"""
+        self._wakeup.set()
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                job_id = self._claim()
+                if job_id is not None:
+                    self._execute(job_id)
+                    continue
+            except Exception as e:
+                logger.error(f"管理后台任务认领失败: {str(e)}", exc_info=True)
+
+            self._wakeup.wait(self.poll_seconds)
+            self._wakeup.clear()
+
+    def _claimable(self, now: datetime):
+        return or_(
+            AdminJob.status == JOB_STATUS_PENDING,
+            and_(
+                AdminJob.status == JOB_STATUS_RUNNING,
+                AdminJob.heartbeat_at < now - timedelta(seconds=self.stale_seconds)
+            )
+        )
+
+    def _claim(self) -> Optional[int]:
+        """认领一个任务，返回任务ID"""
+        db = self.session_factory()
+        try:
+            now = datetime.now()
+            candidates = [
+                row[0] for row in
+                db.query(AdminJob.id).filter(self._claimable(now)).order_by(AdminJob.id).limit(self.workers).all()
+            ]
+            for job_id in candidates:
+                claimed = db.query(AdminJob).filter(
+                    and_(AdminJob.id == job_id, self._claimable(now))
+                ).update(
+                    {
+                        "status": JOB_STATUS_RUNNING,
+                        "locked_by": self.node_id,
+                        "heartbeat_at": now,
+                        "started_at": func.coalesce(AdminJob.started_at, now)
+                    },
+                    synchronize_session=False
+                )
+                db.commit()
+                if claimed:
+                    return job_id
+            return None
+        finally:
+            db.close()
+
+    def _finish(self, db: Session, job_id: int, status: str, message: Optional[str]) -> None:
+        db.query(AdminJob).filter(
+            and_(AdminJob.id == job_id, AdminJob.locked_by == self.node_id)
+        ).update(
+            {"status": status, "message": message, "finished_at": datetime.now()},
+            synchronize_session=False
+        )
+        db.commit()
+
+    def _keep_alive(self, job_id: int, done: threading.Event) -> None:
+        """执行期间定期刷新心跳（单块耗时较长时也不会被其他节点接管）"""
+        interval = max(self.stale_seconds / 3, 1)
+        while not done.wait(interval):
+            db = self.session_factory()
+            try:
+                db.query(AdminJob).filter(
+                    and_(AdminJob.id == job_id, AdminJob.locked_by == self.node_id)
+                ).update({"heartbeat_at": datetime.now()}, synchronize_session=False)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.error(f"刷新管理后台任务心跳失败: #{job_id}, 错误: {str(e)}")
+            finally:
+                db.close()
+
+    def _execute(self, job_id: int) -> None:
+        db = self.session_factory()
+        done = threading.Event()
+        threading.Thread(
+            target=self._keep_alive, args=(job_id, done), name=f"admin-job-heartbeat-{job_id}", daemon=True
+        ).start()
+        try:
+            job = db.query(AdminJob).filter(AdminJob.id == job_id).first()
+            handler = get_job_handler(job.job_type)
+            if handler is None:
+                self._finish(db, job_id, JOB_STATUS_FAILED, f"不支持的任务类型: {job.job_type}")
+                return
+
+            params = json.loads(job.params or "{}")
+            checkpoint = json.loads(job.checkpoint) if job.checkpoint else None
+            logger.info(f"开始执行管理后台任务: #{job_id} {job.job_type}, 断点: {checkpoint}")
+
+            while True:
+                cancel_requested = db.query(AdminJob.cancel_requested).filter(AdminJob.id == job_id).scalar()
+                if cancel_requested:
+                    self._finish(db, job_id, JOB_STATUS_CANCELLED, "任务已取消")
+                    logger.info(f"管理后台任务已取消: #{job_id}")
+                    return
+
+                if self._stop_event.is_set():
+                    # 应用关闭：退回待执行，重启后从断点继续
+                    db.query(AdminJob).filter(
+                        and_(AdminJob.id == job_id, AdminJob.locked_by == self.node_id)
+                    ).update({"status": JOB_STATUS_PENDING, "locked_by": None}, synchronize_session=False)
+                    db.commit()
+                    return
+
+                result = handler.run_chunk(db, params, checkpoint, self.chunk_size)
+                checkpoint = result.checkpoint
+
+                updated = db.query(AdminJob).filter(
+                    and_(AdminJob.id == job_id, AdminJob.locked_by == self.node_id)
+                ).update(
+                    {
+                        "processed": AdminJob.processed + result.processed,
+                        "succeeded": AdminJob.succeeded + result.succeeded,
+                        "failed": AdminJob.failed + result.failed,
+                        "checkpoint": json.dumps(checkpoint, ensure_ascii=False),
+                        "heartbeat_at": datetime.now()
+                    },
+                    synchronize_session=False
+                )
+                db.commit()
+                if not updated:
+                    logger.warning(f"管理后台任务 #{job_id} 已被其他节点接管，停止执行")
+                    return
+
+                if result.done:
+                    self._finish(db, job_id, JOB_STATUS_SUCCESS, result.message)
+                    logger.info(f"管理后台任务执行完成: #{job_id} {job.job_type}")
+                    return
+
+        except Exception as e:
+            db.rollback()
+            logger.error(f"管理后台任务执行失败: #{job_id}, 错误: {str(e)}", exc_info=True)
+            try:
+                self._finish(db, job_id, JOB_STATUS_FAILED, str(e)[:1000])
+            except Exception as finish_error:
+                db.rollback()
+                logger.error(f"更新管理后台任务状态失败: #{job_id}, 错误: {str(finish_error)}")
+        finally:
+            done.set()
+            db.close()
+
+
+# 创建全局任务工作线程池实例
+admin_job_worker = AdminJobWorker(
+    workers=settings.ADMIN_JOB_WORKERS,
+    chunk_size=settings.ADMIN_JOB_CHUNK_SIZE,
+    poll_seconds=settings.ADMIN_JOB_POLL_SECONDS,
+    stale_seconds=settings.ADMIN_JOB_STALE_SECONDS
+)
@@ -0,0 +1,105 @@
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy import and_, case, func
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..core.invalidation_bus import invalidation_bus, TOPIC_API_KEYS
+from ..db.crud.login_history import LoginHistoryCRUD
+from ..db.models import Admin, APIKey, Package, User
+
+logger = logging.getLogger(__name__)
+
+
+def _count_if(condition):
+    """条件计数：SUM(CASE WHEN condition THEN 1 ELSE 0 END)"""
+    return func.sum(case((condition, 1), else_=0))
+
+
+class AdminStatisticsService:
+    """
+    管理后台统计服务
+
+    所有计数都用条件聚合在数据库中完成（每张表一条查询），结果作为快照缓存在进程内。
+    快照过期后由第一个请求重新计算，计算期间其他请求继续返回旧快照。
+    """
+
+    def __init__(self, refresh_seconds: int):
+        self.refresh_seconds = refresh_seconds
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._computed_at = 0.0
+        self._refresh_lock = threading.Lock()
+
+    def get_snapshot(self, db: Session, force: bool = False) -> Dict[str, Any]:
+        """获取统计快照（过期时刷新）"""
+        snapshot = self._snapshot
+        if not force and snapshot is not None and time.monotonic() - self._computed_at < self.refresh_seconds:
+            return snapshot
+
+        if snapshot is not None and not force:
+            # 已有其他请求在刷新时直接返回旧快照
+            if not self._refresh_lock.acquire(blocking=False):
+                return snapshot
+        else:
+            self._refresh_lock.acquire()
+
+        try:
+            # 等待锁期间可能已被其他请求刷新
+            if not force and self._snapshot is not None and time.monotonic() - self._computed_at < self.refresh_seconds:
+                return self._snapshot
+            self._snapshot = self.compute(db)
+            self._computed_at = time.monotonic()
+            return self._snapshot
+        finally:
+            self._refresh_lock.release()
+
+    def invalidate(self) -> None:
+        """使快照失效，下次请求重新计算"""
+        self._computed_at = 0.0
+
+    def compute(self, db: Session) -> Dict[str, Any]:
+        """计算全部统计数据"""
+        start = time.perf_counter()
+
+        total_users, active_users, banned_users = db.query(
+            func.count(User.id),
+            _count_if(User.is_active == True),
+            _count_if(User.is_banned == True)
+        ).one()
+
+        admin_users, = db.query(func.count(Admin.id)).filter(Admin.is_deleted == False).one()
+
+        total_api_keys, active_api_keys = db.query(
+            func.count(APIKey.id),
+            _count_if(and_(APIKey.status == "active", APIKey.is_active == True))
+        ).one()
+
+        total_packages, active_packages = db.query(
+            func.count(Package.id),
+            _count_if(Package.is_active == True)
+        ).one()
+
+        snapshot = {
+            "total_users": total_users or 0,
+            "active_users": int(active_users or 0),
+            "banned_users": int(banned_users or 0),
+            "admin_users": admin_users or 0,
+            "total_api_keys": total_api_keys or 0,
+            "active_api_keys": int(active_api_keys or 0),
+            "total_packages": total_packages or 0,
+            "active_packages": int(active_packages or 0),
+            "login_statistics": LoginHistoryCRUD(db).get_login_statistics(),
+            "generated_at": datetime.now().isoformat()
+        }
+
+        logger.info(f"管理后台统计快照已刷新，耗时 {(time.perf_counter() - start) * 1000:.0f}ms")
+        return snapshot
+
+
+# 创建全局统计服务实例
+admin_statistics_service = AdminStatisticsService(refresh_seconds=settings.ADMIN_STATISTICS_REFRESH_SECONDS)
+invalidation_bus.subscribe(TOPIC_API_KEYS, lambda api_keys: admin_statistics_service.invalidate())
@@ -0,0 +1,223 @@
+import logging
+import zlib
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import pytz
+from sqlalchemy import and_, func
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..db.models import APIKey
+from .credits_reset_client import CreditsResetClient, credits_reset_client
+from .credits_reset_service import shard_expression
+
+logger = logging.getLogger(__name__)
+
+
+def compute_bucket_checksums(entries: Iterable[Tuple[str, Optional[int]]], bucket_count: int) -> Dict[int, Dict[str, int]]:
+    """
+    计算分桶校验和（外部积分服务需按相同规则实现）
+
+    分桶：CRC32(api_key) % bucket_count
+    校验和：桶内所有密钥 CRC32("{api_key}:{remaining_credits}") 之和，积分为空按0计算
+
+    Args:
+        entries: (api_key, remaining_credits) 序列
+        bucket_count: 分桶数
+
+    Returns:
+        {桶序号: {"count": 密钥数, "checksum": 校验和}}，只包含非空桶
+    """
+    buckets: Dict[int, Dict[str, int]] = {}
+    for api_key, credits in entries:
+        bucket = zlib.crc32(api_key.encode("utf-8")) % bucket_count
+        digest = zlib.crc32(f"{api_key}:{credits or 0}".encode("utf-8"))
+        item = buckets.setdefault(bucket, {"count": 0, "checksum": 0})
+        item["count"] += 1
+        item["checksum"] += digest
+    return buckets
+
+
+class CreditsReconcileService:
+    """积分对账服务 - 通过分桶校验和比对数据库与外部积分服务（Redis）中的剩余积分"""
+
+    # 结果中列出的外部多出密钥上限
+    EXTRA_REMOTE_REPORT_LIMIT = 100
+
+    def __init__(self, db: Session, client: Optional[CreditsResetClient] = None):
+        self.db = db
+        self.client = client or credits_reset_client
+
+    def _reconcile_scope(self):
+        """参与对账的密钥：已激活且有剩余积分记录"""
+        return and_(
+            APIKey.status == 'active',
+            APIKey.remaining_credits.isnot(None)
+        )
+
+    def get_db_bucket_checksums(self, bucket_count: int) -> Dict[int, Dict[str, int]]:
+        """在数据库中按桶计算密钥数和校验和（一条分组聚合查询）"""
+        bucket = shard_expression(bucket_count).label("bucket")
+        digest = func.crc32(func.concat(APIKey.api_key, ':', func.coalesce(APIKey.remaining_credits, 0)))
+        rows = (
+            self.db.query(bucket, func.count(APIKey.id), func.sum(digest))
+            .filter(self._reconcile_scope())
+            .group_by(bucket)
+            .all()
+        )
+        return {
+            int(index): {"count": count, "checksum": int(checksum or 0)}
+            for index, count, checksum in rows
+        }
+
+    def get_db_bucket_entries(self, bucket_count: int, bucket: int) -> Dict[str, int]:
+        """获取数据库中单个桶的全部密钥积分"""
+        rows = (
+            self.db.query(APIKey.api_key, APIKey.remaining_credits)
+            .filter(
+                and_(
+                    self._reconcile_scope(),
+                    shard_expression(bucket_count) == bucket
+                )
+            )
+            .all()
+        )
+        return {api_key: credits or 0 for api_key, credits in rows}
+
+    def _diff_bucket(self, db_entries: Dict[str, int], remote_entries: Dict[str, Any]) -> Dict[str, List]:
+        """比对单个桶的明细，返回需要修复的密钥和外部多出的密钥"""
+        mismatched = []
+        missing_remote = []
+        for api_key, credits in db_entries.items():
+            if api_key not in remote_entries:
+                missing_remote.append({"api_key": api_key, "remaining_credits": credits})
+            elif int(remote_entries[api_key] or 0) != credits:
+                mismatched.append({"api_key": api_key, "remaining_credits": credits})
+
+        extra_remote = [api_key for api_key in remote_entries if api_key not in db_entries]
+        return {"mismatched": mismatched, "missing_remote": missing_remote, "extra_remote": extra_remote}
+
+    def reconcile(self, bucket_count: Optional[int] = None, repair: bool = True, batch_size: int = 100) -> Dict[str, Any]:
+        """
+        执行积分对账
+
+        1. 分别获取数据库和外部服务的分桶校验和，逐桶比较
+        2. 只对校验和不一致的桶拉取明细比对
+        3. repair为True时，以数据库为准分批同步不一致的密钥
+        4. 外部服务多出的密钥（数据库中未激活、已删除或积分为空）不自动处理，
+           在结果的 extra_remote_key_list 和 action_items 中列出，由管理员核实后清理
+
+        Args:
+            bucket_count: 分桶数，默认使用配置
+            repair: 是否修复不一致的密钥
+            batch_size: 每批同步的密钥数量
+
+        Returns:
+            对账结果统计
+        """
+        bucket_count = bucket_count or settings.CREDITS_RECONCILE_BUCKETS
+        beijing_tz = pytz.timezone('Asia/Shanghai')
+        start_time = datetime.now(beijing_tz)
+
+        try:
+            remote_result = self.client.get_bucket_checksums(bucket_count)
+            if not remote_result["success"]:
+                return {
+                    "success": False,
+                    "message": f"获取外部服务校验和失败: {remote_result.get('message')}",
+                    "bucket_count": bucket_count
+                }
+
+            remote_buckets = {
+                int(item["bucket"]): {"count": int(item.get("count", 0)), "checksum": int(item.get("checksum", 0))}
+                for item in remote_result["data"].get("buckets", [])
+            }
+            db_buckets = self.get_db_bucket_checksums(bucket_count)
+
+            empty = {"count": 0, "checksum": 0}
+            mismatched_buckets = sorted(
+                bucket for bucket in set(db_buckets) | set(remote_buckets)
+                if db_buckets.get(bucket, empty) != remote_buckets.get(bucket, empty)
+            )
+
+            total_mismatched = 0
+            total_missing_remote = 0
+            total_extra_remote = 0
+            total_repaired = 0
+            total_repair_failed = 0
+            failed_buckets = []
+            extra_remote_keys = []
+
+            for bucket in mismatched_buckets:
+                entries_result = self.client.get_bucket_entries(bucket_count, bucket)
+                if not entries_result["success"]:
+                    logger.warning(f"获取外部服务分桶明细失败: 桶 {bucket}, {entries_result.get('message')}")
+                    failed_buckets.append(bucket)
+                    continue
+
+                diff = self._diff_bucket(
+                    self.get_db_bucket_entries(bucket_count, bucket),
+                    entries_result["data"].get("entries", {})
+                )
+                total_mismatched += len(diff["mismatched"])
+                total_missing_remote += len(diff["missing_remote"])
+                total_extra_remote += len(diff["extra_remote"])
+                extra_remote_keys.extend(
+                    diff["extra_remote"][:self.EXTRA_REMOTE_REPORT_LIMIT - len(extra_remote_keys)]
+                )
+
+                if not repair:
+                    continue
+
+                to_sync = diff["mismatched"] + diff["missing_remote"]
+                for index in range(0, len(to_sync), batch_size):
+                    sync_result = self.client.reset_credits_batch(to_sync[index:index + batch_size])
+                    total_repaired += sync_result["synced"]
+                    total_repair_failed += sync_result["failed"]
+
+            action_items = []
+            if total_extra_remote:
+                action_items.append(
+                    f"外部服务中有 {total_extra_remote} 个密钥在数据库中不是有效的激活密钥，"
+                    f"对账不会修改这些密钥，请核实后在外部服务中清理"
+                )
+                logger.warning(
+                    f"积分对账发现外部服务多出 {total_extra_remote} 个密钥，"
+                    f"示例: {', '.join(api_key[:10] + '...' for api_key in extra_remote_keys[:5])}"
+                )
+
+            end_time = datetime.now(beijing_tz)
+            result = {
+                "success": not failed_buckets and total_repair_failed == 0,
+                "bucket_count": bucket_count,
+                "total_keys": sum(item["count"] for item in db_buckets.values()),
+                "mismatched_buckets": len(mismatched_buckets),
+                "failed_buckets": failed_buckets,
+                "mismatched_keys": total_mismatched,
+                "missing_remote_keys": total_missing_remote,
+                "extra_remote_keys": total_extra_remote,
+                "extra_remote_key_list": extra_remote_keys,
+                "action_items": action_items,
+                "repaired": total_repaired,
+                "repair_failed": total_repair_failed,
+                "repair": repair,
+                "start_time": start_time.isoformat(),
+                "end_time": end_time.isoformat(),
+                "execution_time_seconds": (end_time - start_time).total_seconds()
+            }
+
+            logger.info(
+                f"积分对账完成: 分桶={bucket_count}, 不一致桶={len(mismatched_buckets)}, "
+                f"不一致密钥={total_mismatched}, 外部缺失={total_missing_remote}, 外部多出={total_extra_remote}, "
+                f"已修复={total_repaired}, 修复失败={total_repair_failed}"
+            )
+            return result
+
+        except Exception as e:
+            logger.error(f"积分对账失败: {str(e)}")
+            return {
+                "success": False,
+                "message": f"对账失败: {str(e)}",
+                "bucket_count": bucket_count
+            }
@@ -1,6 +1,6 @@
 import requests
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, List
 from ..core.config import settings
 
 logger = logging.getLogger(__name__)
@@ -105,6 +105,99 @@ class CreditsResetClient:
                 "message": f"外部API调用未知错误: {str(e)}"
             }
 
+    def _post(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """发送POST请求到外部积分服务，统一处理异常"""
+        url = f"{self.base_url}{path}"
+        try:
+            response = requests.post(
+                url,
+                json=payload,
+                timeout=self.timeout,
+                headers={"Content-Type": "application/json"}
+            )
+
+            if response.status_code != 200:
+                logger.error(f"外部积分服务调用失败: {path}, 状态码: {response.status_code}")
+                return {
+                    "success": False,
+                    "message": f"外部API调用失败，状态码: {response.status_code}",
+                    "status_code": response.status_code
+                }
+
+            result = response.json()
+            if not result.get("success"):
+                return {
+                    "success": False,
+                    "message": f"外部API返回失败: {result.get('message', 'Unknown error')}",
+                    "external_response": result
+                }
+
+            return {"success": True, "data": result.get("data") or {}}
+
+        except requests.exceptions.Timeout:
+            logger.error(f"外部积分服务调用超时: {url}")
+            return {"success": False, "message": "外部API调用超时"}
+
+        except requests.exceptions.ConnectionError:
+            logger.error(f"无法连接到外部积分服务: {url}")
+            return {"success": False, "message": "无法连接到外部API"}
+
+        except Exception as e:
+            logger.error(f"外部积分服务调用异常: {path}, 错误: {str(e)}")
+            return {"success": False, "message": f"外部API调用异常: {str(e)}"}
+
+    def get_bucket_checksums(self, bucket_count: int) -> Dict[str, Any]:
+        """
+        获取外部服务中各分桶的校验和
+
+        外部服务需按 CRC32(api_key) % bucket_count 分桶，返回每个桶的
+        count（密钥数）和 checksum（SUM(CRC32("{api_key}:{remaining_credits}"))），
+        计算方式见 credits_reconcile_service.compute_bucket_checksums。
+
+        Returns:
+            成功时 data 为 {"buckets": [{"bucket": 0, "count": 10, "checksum": 123}, ...]}
+        """
+        return self._post("/v1/credits/checksums", {"bucket_count": bucket_count})
+
+    def get_bucket_entries(self, bucket_count: int, bucket: int) -> Dict[str, Any]:
+        """
+        获取外部服务中单个分桶的全部密钥积分
+
+        Returns:
+            成功时 data 为 {"entries": {"sk-xxx": 100, ...}}
+        """
+        return self._post("/v1/credits/buckets/entries", {"bucket_count": bucket_count, "bucket": bucket})
+
+    def reset_credits_batch(self, items: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        批量同步积分到外部服务
+
+        外部服务不支持批量接口时，逐个调用 reset_credits 兜底。
+
+        Args:
+            items: [{"api_key": "sk-xxx", "remaining_credits": 100}, ...]
+
+        Returns:
+            {"success": bool, "synced": 成功数, "failed": 失败数}
+        """
+        if not items:
+            return {"success": True, "synced": 0, "failed": 0}
+
+        result = self._post("/v1/credits/reset/batch", {"items": items})
+        if result["success"]:
+            return {"success": True, "synced": len(items), "failed": 0}
+
+        if result.get("status_code") not in (404, 405):
+            logger.warning(f"批量同步积分失败，改为逐个同步: {result.get('message')}")
+
+        synced = 0
+        for item in items:
+            single = self.reset_credits(api_key=item["api_key"], remaining_credits=item["remaining_credits"])
+            if single.get("success"):
+                synced += 1
+
+        return {"success": synced == len(items), "synced": synced, "failed": len(items) - synced}
+
 
 # 创建全局客户端实例
 credits_reset_client = CreditsResetClient()
\ No newline at end of file
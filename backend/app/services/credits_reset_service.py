@@ -1,17 +1,52 @@
 import logging
+import zlib
 from typing import List, Dict, Any, Optional
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, date
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, or_, update, insert, func, case
 import pytz
 
-from ..db.models import APIKey, Package
+from ..core.config import settings
+from ..db.models import APIKey, Package, CreditsResetRun, CreditsResetEvent
 from ..db.crud.api_key import APIKeyCRUD
 from .credits_reset_client import credits_reset_client
 from ..schemas.enums import PackageType
 
 logger = logging.getLogger(__name__)
 
+# 参与每日重置的套餐类型：标准订阅和Max系列订阅
+DAILY_RESET_PACKAGE_TYPES = [PackageType.STANDARD, PackageType.MAX_SERIES]
+
+
+def get_reset_epoch() -> date:
+    """获取当前的重置周期（北京时间日期）"""
+    return datetime.now(pytz.timezone('Asia/Shanghai')).date()
+
+
+def shard_expression(shard_count: int):
+    """密钥所属分片：CRC32(api_key) % 分片数（与 get_shard_of_key 一致）"""
+    return func.crc32(APIKey.api_key) % shard_count
+
+
+def get_shard_of_key(api_key: str, shard_count: int) -> int:
+    """计算密钥所属分片"""
+    return zlib.crc32(api_key.encode("utf-8")) % shard_count
+
+
+def get_shard_slot_offsets(shard_count: int, window_minutes: int) -> List[int]:
+    """
+    计算各分片在重置窗口内的执行时间偏移（秒）
+
+    分片均匀分布在 [0, window_minutes) 内，第0个分片在0点整执行；窗口最长不超过一天。
+    """
+    window_seconds = min(max(window_minutes, 0), 24 * 60 - 1) * 60
+    return [window_seconds * index // shard_count for index in range(shard_count)]
+
+
+def is_lazy_reset_mode() -> bool:
+    """是否启用按需（惰性）每日积分重置"""
+    return settings.CREDITS_RESET_MODE == "lazy"
+
 
 class CreditsResetService:
     """积分重置服务 - 负责每日自动重置积分"""
@@ -20,13 +55,42 @@ class CreditsResetService:
         self.db = db
         self.api_key_crud = APIKeyCRUD(db)
 
-    def get_api_keys_for_daily_reset(self, batch_size: int = 100, offset: int = 0) -> List[APIKey]:
+    def _daily_reset_conditions(self, now: datetime):
+        """每日重置的筛选条件（需与packages表关联）"""
+        # 查询条件：
+        # 1. 状态为"active"
+        # 2. 关联的套餐类型为"01"或"02"（标准订阅或Max系列订阅）
+        # 3. 套餐的daily_reset_credits > 0
+        # 4. 在有效期内（expire_date > now 或 expire_date为NULL）
+        # 注意：数据库中的时间可能是UTC，这里比较时需要考虑时区转换
+        return and_(
+            APIKey.status == 'active',
+            Package.package_type.in_(DAILY_RESET_PACKAGE_TYPES),  # 只重置标准订阅和Max系列订阅，排除体验积分包、临时积分包和加油包
+            Package.daily_reset_credits > 0,
+            # 新增：检查有效期，确保只重置在有效期内的API密钥
+            or_(
+                APIKey.expire_date.is_(None),  # 没有设置过期时间（理论上不应该，但保留兼容性）
+                APIKey.expire_date > now  # 过期时间在当前时间之后
+            )
+        )
+
+    def get_api_keys_for_daily_reset(
+        self,
+        batch_size: int = 100,
+        offset: int = 0,
+        after_id: Optional[int] = None,
+        shard_index: Optional[int] = None,
+        shard_count: int = 1
+    ) -> List[APIKey]:
         """
         获取需要每日重置积分的API密钥
 
         Args:
             batch_size: 批量大小
-            offset: 偏移量
+            offset: 偏移量（指定after_id时忽略）
+            after_id: 只返回ID大于该值的密钥（按ID游标分页）
+            shard_index: 分片序号，为空时不分片
+            shard_count: 分片总数
 
         Returns:
             需要重置的API密钥列表
@@ -36,38 +100,53 @@ class CreditsResetService:
             beijing_tz = pytz.timezone('Asia/Shanghai')
             now = datetime.now(beijing_tz)
 
-            # 查询条件：
-            # 1. 状态为"active"
-            # 2. 关联的套餐类型为"01"或"02"（标准订阅或Max系列订阅）
-            # 3. 套餐的daily_reset_credits > 0
-            # 4. 在有效期内（expire_date > now 或 expire_date为NULL）
-            # 注意：数据库中的时间可能是UTC，这里比较时需要考虑时区转换
             query = (
                 self.db.query(APIKey)
                 .join(Package, APIKey.package_id == Package.id)
-                .filter(
-                    and_(
-                        APIKey.status == 'active',
-                        Package.package_type.in_([PackageType.STANDARD, PackageType.MAX_SERIES]),  # 只重置标准订阅和Max系列订阅，排除体验积分包、临时积分包和加油包
-                        Package.daily_reset_credits > 0,
-                        # 新增：检查有效期，确保只重置在有效期内的API密钥
-                        or_(
-                            APIKey.expire_date.is_(None),  # 没有设置过期时间（理论上不应该，但保留兼容性）
-                            APIKey.expire_date > now  # 过期时间在当前时间之后
-                        )
-                    )
-                )
-                .order_by(APIKey.id)
-                .limit(batch_size)
-                .offset(offset)
+                .filter(self._daily_reset_conditions(now))
             )
 
+            if shard_index is not None and shard_count > 1:
+                query = query.filter(shard_expression(shard_count) == shard_index)
+
+            if after_id is not None:
+                query = query.filter(APIKey.id > after_id).order_by(APIKey.id).limit(batch_size)
+            else:
+                query = query.order_by(APIKey.id).limit(batch_size).offset(offset)
+
             return query.all()
 
         except Exception as e:
             logger.error(f"查询需要重置的API密钥失败: {str(e)}")
             return []
 
+    def get_shard_sizes(self, shard_count: int) -> Dict[int, int]:
+        """
+        统计各分片中需要每日重置的密钥数量
+
+        Args:
+            shard_count: 分片总数
+
+        Returns:
+            {分片序号: 密钥数量}，没有密钥的分片数量为0
+        """
+        beijing_tz = pytz.timezone('Asia/Shanghai')
+        now = datetime.now(beijing_tz)
+
+        shard = shard_expression(shard_count).label("shard")
+        rows = (
+            self.db.query(shard, func.count(APIKey.id))
+            .join(Package, APIKey.package_id == Package.id)
+            .filter(self._daily_reset_conditions(now))
+            .group_by(shard)
+            .all()
+        )
+
+        sizes = {index: 0 for index in range(shard_count)}
+        for index, count in rows:
+            sizes[int(index)] = count
+        return sizes
+
     def reset_api_key_credits(self, api_key: APIKey) -> Dict[str, Any]:
         """
         重置单个API密钥的积分
@@ -104,6 +183,7 @@ class CreditsResetService:
             beijing_tz = pytz.timezone('Asia/Shanghai')
             now = datetime.now(beijing_tz)
             api_key.remaining_credits = reset_credits
+            api_key.reset_epoch = now.date()
             # 注意：last_reset_credits_at字段用于用户手动重置积分，每日自动重置不更新此字段
 
             # 提交数据库更改
@@ -143,52 +223,256 @@ class CreditsResetService:
                 "api_key_id": api_key.id
             }
 
-    def execute_daily_reset(self, batch_size: int = 100) -> Dict[str, Any]:
+    def apply_lazy_reset(self, api_key_id: int) -> Optional[int]:
+        """
+        按需执行每日积分重置（惰性模式）
+
+        密钥在新的一天首次被验证或记录使用时调用。通过一条带条件的UPDATE完成重置：
+        只有符合每日重置条件且reset_epoch早于今天（或为空）的密钥才会被更新，
+        并发请求中只有一个会真正生效。
+
+        Args:
+            api_key_id: API密钥ID
+
+        Returns:
+            重置后的积分；无需重置时返回None
+        """
+        try:
+            beijing_tz = pytz.timezone('Asia/Shanghai')
+            now = datetime.now(beijing_tz)
+            epoch = now.date()
+
+            result = self.db.execute(
+                update(APIKey)
+                .where(
+                    and_(
+                        APIKey.id == api_key_id,
+                        APIKey.package_id == Package.id,
+                        APIKey.status == 'active',
+                        Package.package_type.in_(DAILY_RESET_PACKAGE_TYPES),
+                        Package.daily_reset_credits > 0,
+                        or_(
+                            APIKey.expire_date.is_(None),
+                            APIKey.expire_date > now
+                        ),
+                        or_(
+                            APIKey.reset_epoch.is_(None),
+                            APIKey.reset_epoch < epoch
+                        )
+                    )
+                )
+                .values(remaining_credits=Package.daily_reset_credits, reset_epoch=epoch)
+                .execution_options(synchronize_session=False)
+            )
+
+            if not result.rowcount:
+                self.db.commit()
+                return None
+
+            new_credits, user_id = (
+                self.db.query(APIKey.remaining_credits, APIKey.user_id).filter(APIKey.id == api_key_id).one()
+            )
+            # 与重置在同一事务中写入明细
+            self.db.add(CreditsResetEvent(
+                api_key_id=api_key_id,
+                user_id=user_id,
+                reset_type="lazy",
+                reset_date=epoch,
+                new_credits=new_credits,
+                success=True
+            ))
+            self.db.commit()
+
+            logger.info(f"API密钥 {api_key_id} 按需完成每日积分重置: 重置周期={epoch.isoformat()}, 积分={new_credits}")
+            return new_credits
+
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"按需重置API密钥 {api_key_id} 积分失败: {str(e)}")
+            return None
+
+    def execute_lazy_reconcile(self) -> Dict[str, Any]:
+        """
+        惰性模式下的每日对账（只统计，不写入）
+
+        统计符合每日重置条件的密钥中，本周期已按需重置的数量和仍处于空闲（未被使用、未重置）的数量。
+        空闲密钥会在下次被使用时自动重置，因此这里不需要更新它们。
+
+        Returns:
+            对账统计
+        """
+        beijing_tz = pytz.timezone('Asia/Shanghai')
+        start_time = datetime.now(beijing_tz)
+        epoch = start_time.date()
+
+        try:
+            reset_today = func.sum(case((APIKey.reset_epoch >= epoch, 1), else_=0))
+            total, already_reset = (
+                self.db.query(func.count(APIKey.id), reset_today)
+                .join(Package, APIKey.package_id == Package.id)
+                .filter(self._daily_reset_conditions(start_time))
+                .one()
+            )
+            total = total or 0
+            already_reset = int(already_reset or 0)
+
+            end_time = datetime.now(beijing_tz)
+            execution_time = (end_time - start_time).total_seconds()
+
+            reset_run = CreditsResetRun(
+                mode="lazy",
+                status="success",
+                reset_date=epoch,
+                total_processed=total,
+                total_success=already_reset,
+                total_failed=0,
+                message=f"空闲待重置: {total - already_reset}",
+                started_at=start_time,
+                finished_at=end_time
+            )
+            self.db.add(reset_run)
+            self.db.commit()
+
+            logger.info(
+                f"每日积分重置对账完成（按需模式）: 重置周期={epoch.isoformat()}, "
+                f"应重置={total}, 已按需重置={already_reset}, 空闲待重置={total - already_reset}"
+            )
+
+            return {
+                "success": True,
+                "mode": "lazy",
+                "run_id": reset_run.id,
+                "reset_epoch": epoch.isoformat(),
+                "total_processed": total,
+                "total_success": already_reset,
+                "total_failed": 0,
+                "total_idle": total - already_reset,
+                "start_time": start_time.isoformat(),
+                "end_time": end_time.isoformat(),
+                "execution_time_seconds": execution_time,
+                "timezone": "Asia/Shanghai (+8)"
+            }
+
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"每日积分重置对账失败: {str(e)}")
+            end_time = datetime.now(beijing_tz)
+            return {
+                "success": False,
+                "mode": "lazy",
+                "message": f"对账失败: {str(e)}",
+                "total_processed": 0,
+                "total_success": 0,
+                "total_failed": 0,
+                "start_time": start_time.isoformat(),
+                "end_time": end_time.isoformat(),
+                "execution_time_seconds": (end_time - start_time).total_seconds(),
+                "timezone": "Asia/Shanghai (+8)"
+            }
+
+    def _build_reset_event(self, run_id: int, reset_date: date, result: Dict[str, Any]) -> Dict[str, Any]:
+        """将单个密钥的重置结果转换为明细记录"""
+        return {
+            "run_id": run_id,
+            "api_key_id": result["api_key_id"],
+            "user_id": result.get("user_id"),
+            "reset_type": "daily",
+            "reset_date": reset_date,
+            "old_credits": result.get("old_credits"),
+            "new_credits": result.get("new_credits"),
+            "success": result["success"],
+            "external_api_success": result.get("external_api_success"),
+            "message": None if result["success"] else (result.get("message") or "")[:255]
+        }
+
+    def _flush_reset_events(self, events: List[Dict[str, Any]]) -> None:
+        """批量写入重置明细（一批一次多行INSERT）"""
+        if not events:
+            return
+        try:
+            self.db.execute(insert(CreditsResetEvent), events)
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"写入积分重置明细失败: {str(e)}")
+
+    def execute_daily_reset(
+        self,
+        batch_size: int = 100,
+        shard_index: Optional[int] = None,
+        shard_count: int = 1
+    ) -> Dict[str, Any]:
         """
         执行每日积分重置任务
 
+        执行过程只维护计数器，每个密钥的结果按批写入credits_reset_events，
+        任务汇总写入credits_reset_runs。
+
         Args:
             batch_size: 每批处理的数量
+            shard_index: 分片序号，为空时重置全部密钥
+            shard_count: 分片总数
 
         Returns:
             任务执行统计
         """
-        logger.info("开始执行每日积分重置任务")
+        is_sharded = shard_index is not None and shard_count > 1
+        shard_label = f"分片 {shard_index}/{shard_count}" if is_sharded else "全部"
+        logger.info(f"开始执行每日积分重置任务: {shard_label}")
 
         beijing_tz = pytz.timezone('Asia/Shanghai')
         start_time = datetime.now(beijing_tz)
         total_processed = 0
         total_success = 0
         total_failed = 0
-        results = []
+
+        reset_run = CreditsResetRun(
+            mode="batch",
+            status="running",
+            reset_date=start_time.date(),
+            shard_index=shard_index if is_sharded else None,
+            shard_count=shard_count if is_sharded else None,
+            started_at=start_time
+        )
+        self.db.add(reset_run)
+        self.db.commit()
+        run_id = reset_run.id
 
         try:
-            offset = 0
+            last_id = 0
             has_more = True
 
             while has_more:
-                # 获取一批需要重置的API密钥
-                api_keys = self.get_api_keys_for_daily_reset(batch_size, offset)
+                # 获取一批需要重置的API密钥（按ID游标分页）
+                api_keys = self.get_api_keys_for_daily_reset(
+                    batch_size,
+                    after_id=last_id,
+                    shard_index=shard_index,
+                    shard_count=shard_count
+                )
 
                 if not api_keys:
                     has_more = False
                     break
 
                 # 处理当前批次
+                events = []
                 for api_key in api_keys:
                     total_processed += 1
 
                     # 重置积分
                     result = self.reset_api_key_credits(api_key)
-                    results.append(result)
+                    events.append(self._build_reset_event(run_id, start_time.date(), result))
 
                     if result["success"]:
                         total_success += 1
                     else:
                         total_failed += 1
 
-                # 更新偏移量
-                offset += batch_size
+                self._flush_reset_events(events)
+
+                # 更新游标
+                last_id = api_keys[-1].id
 
                 # 如果返回的数量小于批次大小，说明没有更多数据了
                 if len(api_keys) < batch_size:
@@ -198,22 +482,27 @@ class CreditsResetService:
             end_time = datetime.now(beijing_tz)
             execution_time = (end_time - start_time).total_seconds()
 
+            self._finish_reset_run(run_id, "success" if total_failed == 0 else "failed",
+                                   total_processed, total_success, total_failed, end_time)
+
             # 生成统计报告
             stats = {
                 "success": total_failed == 0,  # 只有当所有都成功时才返回true
+                "run_id": run_id,
+                "shard_index": shard_index if is_sharded else None,
+                "shard_count": shard_count if is_sharded else None,
                 "total_processed": total_processed,
                 "total_success": total_success,
                 "total_failed": total_failed,
                 "start_time": start_time.isoformat(),
                 "end_time": end_time.isoformat(),
                 "execution_time_seconds": execution_time,
-                "timezone": "Asia/Shanghai (+8)",
-                "results": results
+                "timezone": "Asia/Shanghai (+8)"
             }
 
             # 记录任务执行统计
             logger.info(
-                f"每日积分重置任务执行完成: "
+                f"每日积分重置任务执行完成（{shard_label}）: "
                 f"处理总数={total_processed}, 成功={total_success}, 失败={total_failed}, "
                 f"耗时={execution_time:.2f}秒"
             )
@@ -221,88 +510,114 @@ class CreditsResetService:
             return stats
 
         except Exception as e:
+            self.db.rollback()
             logger.error(f"每日积分重置任务执行失败: {str(e)}")
             end_time = datetime.now(beijing_tz)
+            self._finish_reset_run(run_id, "failed", total_processed, total_success, total_failed,
+                                   end_time, message=str(e))
             return {
                 "success": False,
                 "message": f"任务执行失败: {str(e)}",
+                "run_id": run_id,
                 "total_processed": total_processed,
                 "total_success": total_success,
                 "total_failed": total_failed,
                 "start_time": start_time.isoformat(),
                 "end_time": end_time.isoformat(),
                 "execution_time_seconds": (end_time - start_time).total_seconds(),
-                "timezone": "Asia/Shanghai (+8)",
-                "results": results
+                "timezone": "Asia/Shanghai (+8)"
             }
 
+    def _finish_reset_run(
+        self,
+        run_id: int,
+        status: str,
+        total_processed: int,
+        total_success: int,
+        total_failed: int,
+        finished_at: datetime,
+        message: Optional[str] = None
+    ) -> None:
+        """更新重置任务汇总"""
+        try:
+            self.db.query(CreditsResetRun).filter(CreditsResetRun.id == run_id).update(
+                {
+                    "status": status,
+                    "total_processed": total_processed,
+                    "total_success": total_success,
+                    "total_failed": total_failed,
+                    "finished_at": finished_at,
+                    "message": message
+                },
+                synchronize_session=False
+            )
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"更新积分重置任务记录失败: {run_id}, 错误: {str(e)}")
+
     def get_reset_statistics(self, days: int = 7) -> Dict[str, Any]:
         """
         获取最近N天的积分重置统计
 
-        注意：此方法仅统计手动重置的记录（基于last_reset_credits_at字段）
-        每日自动重置不更新last_reset_credits_at字段，因此不会被此方法统计
+        基于积分重置明细表按日期和重置类型分组汇总（daily-每日批量重置，lazy-按需重置，manual-用户手动重置）
 
         Args:
             days: 统计天数
 
         Returns:
-            统计信息（仅包含手动重置记录）
+            统计信息
         """
         try:
             # 使用+8时区计算日期范围
             beijing_tz = pytz.timezone('Asia/Shanghai')
-            end_date = datetime.now(beijing_tz)
+            end_date = datetime.now(beijing_tz).date()
             start_date = end_date - timedelta(days=days)
 
-            # 查询最近N天有重置记录的API密钥
-            query = (
-                self.db.query(APIKey)
+            rows = (
+                self.db.query(
+                    CreditsResetEvent.reset_date,
+                    CreditsResetEvent.reset_type,
+                    func.count(CreditsResetEvent.id),
+                    func.coalesce(func.sum(CreditsResetEvent.new_credits), 0)
+                )
                 .filter(
                     and_(
-                        APIKey.last_reset_credits_at >= start_date,
-                        APIKey.last_reset_credits_at <= end_date
+                        CreditsResetEvent.reset_date >= start_date,
+                        CreditsResetEvent.reset_date <= end_date,
+                        CreditsResetEvent.success.is_(True)
                     )
                 )
-                .order_by(APIKey.last_reset_credits_at.desc())
+                .group_by(CreditsResetEvent.reset_date, CreditsResetEvent.reset_type)
+                .all()
             )
 
-            reset_keys = query.all()
-
             # 按日期分组统计（使用+8时区日期）
             daily_stats = {}
-            for key in reset_keys:
-                if key.last_reset_credits_at:
-                    # 将数据库时间转换为+8时区
-                    if key.last_reset_credits_at.tzinfo is None:
-                        # 如果数据库时间没有时区信息，假设为UTC并转换为+8时区
-                        utc_time = key.last_reset_credits_at.replace(tzinfo=pytz.UTC)
-                        beijing_time = utc_time.astimezone(beijing_tz)
-                    else:
-                        beijing_time = key.last_reset_credits_at.astimezone(beijing_tz)
-
-                    date_str = beijing_time.date().isoformat()
-                    if date_str not in daily_stats:
-                        daily_stats[date_str] = {
-                            "count": 0,
-                            "total_credits_reset": 0
-                        }
-
-                    daily_stats[date_str]["count"] += 1
-                    # 这里需要知道重置了多少积分，可以从package表获取
-                    package = self.db.query(Package).filter(Package.id == key.package_id).first()
-                    if package:
-                        daily_stats[date_str]["total_credits_reset"] += package.daily_reset_credits
+            total_resets = 0
+            for reset_date, reset_type, count, credits in rows:
+                date_str = reset_date.isoformat()
+                if date_str not in daily_stats:
+                    daily_stats[date_str] = {
+                        "count": 0,
+                        "total_credits_reset": 0,
+                        "by_type": {}
+                    }
+
+                daily_stats[date_str]["count"] += count
+                daily_stats[date_str]["total_credits_reset"] += int(credits)
+                daily_stats[date_str]["by_type"][reset_type] = count
+                total_resets += count
 
             return {
                 "success": True,
                 "period": {
-                    "start_date": start_date.date().isoformat(),
-                    "end_date": end_date.date().isoformat(),
+                    "start_date": start_date.isoformat(),
+                    "end_date": end_date.isoformat(),
                     "timezone": "Asia/Shanghai (+8)"
                 },
-                "total_resets": len(reset_keys),
-                "daily_stats": daily_stats
+                "total_resets": total_resets,
+                "daily_stats": dict(sorted(daily_stats.items()))
             }
 
         except Exception as e:
@@ -310,4 +625,4 @@ class CreditsResetService:
             return {
                 "success": False,
                 "message": f"获取统计失败: {str(e)}"
-            }
\ No newline at end of file
+            }
@@ -0,0 +1,123 @@
+"""
+分片每日积分重置命令行工具
+
+用法：
+    python -m app.services.credits_reset_shards --dry-run            # 打印各分片密钥数量
+    python -m app.services.credits_reset_shards --workers 4          # 多进程并行重置所有分片
+    python -m app.services.credits_reset_shards --shard 2            # 只重置指定分片
+
+每个分片与定时分片任务共用租约和执行批次（北京时间日期）：分片正被其他节点执行或当天已执行过时跳过。
+按需重置模式下积分在密钥首次使用时重置，本工具拒绝执行批量重置。
+"""
+import argparse
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
+
+from ..core.config import settings
+from ..db.database import SessionLocal, engine
+from .credits_reset_service import CreditsResetService, get_shard_slot_offsets, is_lazy_reset_mode
+from .scheduled_jobs import run_daily_credits_reset_shard_job
+
+logger = logging.getLogger(__name__)
+
+
+def plan_shards(shard_count: int, window_minutes: int) -> List[Dict[str, Any]]:
+    """生成分片执行计划（分片序号、计划执行时间、密钥数量）"""
+    db = SessionLocal()
+    try:
+        sizes = CreditsResetService(db).get_shard_sizes(shard_count)
+    finally:
+        db.close()
+
+    offsets = get_shard_slot_offsets(shard_count, window_minutes)
+    return [
+        {
+            "shard_index": shard_index,
+            "scheduled_at": f"{offset // 3600:02d}:{offset % 3600 // 60:02d}:{offset % 60:02d}",
+            "key_count": sizes.get(shard_index, 0)
+        }
+        for shard_index, offset in enumerate(offsets)
+    ]
+
+
+def _init_worker() -> None:
+    """子进程初始化：丢弃从父进程继承的连接池，子进程使用自己的数据库连接"""
+    engine.dispose(close=False)
+
+
+def reset_shard(shard_index: int, shard_count: int, batch_size: int = 100) -> Dict[str, Any]:
+    """在分片租约保护下重置一个分片"""
+    result = run_daily_credits_reset_shard_job(shard_index, shard_count, batch_size)
+    if result is None:
+        return {
+            "success": True,
+            "skipped": True,
+            "shard_index": shard_index,
+            "message": "分片正由其他节点执行或今日已执行，已跳过"
+        }
+    result.setdefault("shard_index", shard_index)
+    return result
+
+
+def reset_all_shards(shard_count: int, workers: int, batch_size: int = 100) -> List[Dict[str, Any]]:
+    """使用多个进程并行重置所有分片"""
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        futures = {
+            executor.submit(reset_shard, shard_index, shard_count, batch_size): shard_index
+            for shard_index in range(shard_count)
+        }
+        for future in as_completed(futures):
+            shard_index = futures[future]
+            try:
+                results.append(future.result())
+            except Exception as e:
+                logger.error(f"分片 {shard_index} 重置失败: {str(e)}")
+                results.append({"success": False, "shard_index": shard_index, "message": str(e)})
+
+    return sorted(results, key=lambda result: result.get("shard_index") or 0)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="分片每日积分重置")
+    parser.add_argument("--shards", type=int, default=settings.CREDITS_RESET_SHARDS, help="分片总数")
+    parser.add_argument("--window", type=int, default=settings.CREDITS_RESET_WINDOW_MINUTES, help="重置窗口（分钟）")
+    parser.add_argument("--workers", type=int, default=1, help="并行进程数")
+    parser.add_argument("--batch-size", type=int, default=100, help="每批处理的密钥数量")
+    parser.add_argument("--shard", type=int, default=None, help="只处理指定分片")
+    parser.add_argument("--dry-run", action="store_true", help="只打印各分片的密钥数量，不执行重置")
+    args = parser.parse_args(argv)
+
+    shard_count = max(args.shards, 1)
+
+    if args.dry_run:
+        plan = plan_shards(shard_count, args.window)
+        total = sum(item["key_count"] for item in plan)
+        print(f"分片数: {shard_count}, 窗口: {args.window} 分钟, 待重置密钥总数: {total}")
+        for item in plan:
+            print(f"  分片 {item['shard_index']:>3}  计划时间 {item['scheduled_at']}  密钥数 {item['key_count']}")
+        return 0
+
+    if is_lazy_reset_mode():
+        print("当前为按需重置模式（CREDITS_RESET_MODE=lazy），积分在密钥首次使用时重置，不执行批量重置")
+        return 2
+
+    if args.shard is not None:
+        results = [reset_shard(args.shard, shard_count, args.batch_size)]
+    else:
+        results = reset_all_shards(shard_count, max(args.workers, 1), args.batch_size)
+
+    for result in results:
+        if result.get("skipped"):
+            print(f"分片 {result.get('shard_index')}: {result['message']}")
+            continue
+        print(
+            f"分片 {result.get('shard_index')}: 处理={result.get('total_processed', 0)}, "
+            f"成功={result.get('total_success', 0)}, 失败={result.get('total_failed', 0)}"
+        )
+    return 0 if all(result.get("success") for result in results) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
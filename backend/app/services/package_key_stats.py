@@ -0,0 +1,104 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..core.invalidation_bus import invalidation_bus, TOPIC_API_KEYS, TOPIC_PACKAGES
+from ..db.database import SessionLocal
+from ..db.models import APIKey
+
+logger = logging.getLogger(__name__)
+
+
+class PackageKeyStats:
+    """
+    订阅密钥计数缓存
+
+    一条 GROUP BY package_id, status 的聚合查询（由 idx_api_key_package_status 索引覆盖）得到全部订阅的分状态密钥数，
+    结果缓存在进程内，读取计数只查字典，开销与订阅数相关，与 api_keys 表的行数无关。
+    密钥创建、兑换、禁用、删除以及订阅变更提交后通过失效通知标记过期，下一次读取重新聚合，
+    重新聚合期间其他请求继续使用旧结果；多进程部署下每隔 refresh_seconds 重新聚合。
+    """
+
+    def __init__(self, refresh_seconds: int = 60, session_factory: Callable[[], Session] = SessionLocal):
+        self.refresh_seconds = refresh_seconds
+        self.session_factory = session_factory
+        self._counts: Optional[Dict[Optional[int], Dict[str, int]]] = None
+        self._computed_at = 0.0
+        self._stale = True
+        self._refresh_lock = threading.Lock()
+
+    def invalidate(self) -> None:
+        """标记计数过期"""
+        self._stale = True
+
+    def get_counts(self) -> Dict[Optional[int], Dict[str, int]]:
+        """获取 {订阅ID: {状态: 密钥数}}（未关联订阅的密钥记在 None 下）"""
+        counts = self._counts
+        if counts is not None and not self._stale and time.monotonic() - self._computed_at < self.refresh_seconds:
+            return counts
+
+        if counts is not None:
+            # 已有其他请求在重新聚合时直接返回旧结果
+            if not self._refresh_lock.acquire(blocking=False):
+                return counts
+        else:
+            self._refresh_lock.acquire()
+
+        try:
+            if self._counts is not None and not self._stale and \
+                    time.monotonic() - self._computed_at < self.refresh_seconds:
+                return self._counts
+            # 先清除标记：聚合期间再有变更时下一次读取会再次聚合
+            self._stale = False
+            try:
+                self._counts = self._compute()
+            except Exception:
+                self._stale = True
+                raise
+            self._computed_at = time.monotonic()
+            return self._counts
+        finally:
+            self._refresh_lock.release()
+
+    def count(self, package_id: Optional[int], status: Optional[str] = None) -> int:
+        """获取订阅的密钥数（可按状态过滤）"""
+        by_status = self.get_counts().get(package_id, {})
+        if status:
+            return by_status.get(status, 0)
+        return sum(by_status.values())
+
+    def totals(self) -> Dict[str, int]:
+        """获取全部密钥的分状态计数"""
+        totals: Dict[str, int] = defaultdict(int)
+        for by_status in self.get_counts().values():
+            for status, count in by_status.items():
+                totals[status] += count
+        return dict(totals)
+
+    def _compute(self) -> Dict[Optional[int], Dict[str, int]]:
+        start = time.perf_counter()
+        db = self.session_factory()
+        try:
+            rows = db.query(APIKey.package_id, APIKey.status, func.count(APIKey.id)).group_by(
+                APIKey.package_id, APIKey.status
+            ).all()
+        finally:
+            db.close()
+
+        counts: Dict[Optional[int], Dict[str, int]] = defaultdict(dict)
+        for package_id, status, count in rows:
+            counts[package_id][status] = count
+        logger.info(f"订阅密钥计数已重新聚合: {len(counts)} 个订阅，耗时 {(time.perf_counter() - start) * 1000:.0f}ms")
+        return dict(counts)
+
+
+# 创建全局订阅密钥计数实例
+package_key_stats = PackageKeyStats(refresh_seconds=settings.PACKAGE_KEY_STATS_REFRESH_SECONDS)
+invalidation_bus.subscribe(TOPIC_API_KEYS, lambda api_keys: package_key_stats.invalidate())
+invalidation_bus.subscribe(TOPIC_PACKAGES, lambda package_ids: package_key_stats.invalidate())
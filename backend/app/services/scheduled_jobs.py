@@ -0,0 +1,372 @@
+import logging
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Any, Dict, Optional
+
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+from pytz import timezone
+
+from ..core.config import settings
+from ..core.email_delivery import email_delivery
+from ..core.rate_limiter import rate_limiter
+from ..core.token_revocation import token_revocation_list
+from ..db.crud.email_verification import EmailVerificationCRUD
+from ..db.crud.login_history import LoginHistoryCRUD
+from ..db.database import SessionLocal
+from .credits_reconcile_service import CreditsReconcileService
+from .credits_reset_service import CreditsResetService, get_shard_slot_offsets, is_lazy_reset_mode
+from .scheduler_lease_service import run_exclusive_job
+
+logger = logging.getLogger(__name__)
+
+DAILY_CREDITS_RESET_JOB_ID = "daily_credits_reset"
+CREDITS_RECONCILE_JOB_ID = "credits_reconcile"
+RATE_LIMIT_FLUSH_JOB_ID = "rate_limit_flush"
+RATE_LIMIT_PURGE_JOB_ID = "rate_limit_purge"
+TOKEN_REVOCATION_SYNC_JOB_ID = "token_revocation_sync"
+EMAIL_VERIFICATION_PURGE_JOB_ID = "email_verification_purge"
+EMAIL_OUTBOX_PURGE_JOB_ID = "email_outbox_purge"
+LOGIN_ROLLUP_JOB_ID = "login_daily_rollup"
+
+
+def execute_daily_credits_reset(
+    shard_index: Optional[int] = None, shard_count: int = 1, batch_size: int = 100
+) -> Optional[Dict[str, Any]]:
+    """执行每日积分重置任务（指定分片时只重置该分片的密钥）"""
+    try:
+        logger.info("开始执行每日积分重置任务...")
+
+        # 创建数据库会话
+        db = SessionLocal()
+        try:
+            # 创建积分重置服务
+            reset_service = CreditsResetService(db)
+
+            # 执行重置任务（按需模式下积分在密钥首次使用时重置，这里只做对账统计）
+            if is_lazy_reset_mode():
+                result = reset_service.execute_lazy_reconcile()
+            else:
+                result = reset_service.execute_daily_reset(
+                    batch_size=batch_size,
+                    shard_index=shard_index,
+                    shard_count=shard_count
+                )
+
+            if result["success"]:
+                logger.info(
+                    f"每日积分重置任务执行成功: "
+                    f"处理总数={result['total_processed']}, "
+                    f"成功={result['total_success']}, "
+                    f"失败={result['total_failed']}, "
+                    f"耗时={result['execution_time_seconds']:.2f}秒"
+                )
+            else:
+                logger.warning(
+                    f"每日积分重置任务执行完成但有失败: "
+                    f"处理总数={result['total_processed']}, "
+                    f"成功={result['total_success']}, "
+                    f"失败={result['total_failed']}, "
+                    f"消息={result.get('message', '未知错误')}"
+                )
+
+            return result
+
+        except Exception as e:
+            logger.error(f"执行每日积分重置任务时发生异常: {str(e)}", exc_info=True)
+            return {"success": False, "message": str(e)}
+        finally:
+            db.close()
+
+    except Exception as e:
+        logger.error(f"每日积分重置任务执行失败: {str(e)}", exc_info=True)
+        return {"success": False, "message": str(e)}
+
+
+def run_daily_credits_reset_job() -> Optional[Dict[str, Any]]:
+    """定时触发的每日积分重置（以北京时间日期作为批次，每天只会有一个节点执行一次）"""
+    run_key = datetime.now(timezone('Asia/Shanghai')).date().isoformat()
+    return run_exclusive_job(DAILY_CREDITS_RESET_JOB_ID, run_key, execute_daily_credits_reset)
+
+
+def run_daily_credits_reset_shard_job(shard_index: int, shard_count: int, batch_size: int = 100) -> Optional[Dict[str, Any]]:
+    """分片积分重置（每个分片独立租约，可由不同节点并行执行；定时任务和命令行工具共用）"""
+    run_key = datetime.now(timezone('Asia/Shanghai')).date().isoformat()
+    return run_exclusive_job(
+        get_shard_job_id(shard_index),
+        run_key,
+        partial(execute_daily_credits_reset, shard_index, shard_count, batch_size)
+    )
+
+
+def get_shard_job_id(shard_index: int) -> str:
+    """分片重置任务ID"""
+    return f"{DAILY_CREDITS_RESET_JOB_ID}_shard_{shard_index}"
+
+
+def run_manual_credits_reset_job() -> Optional[Dict[str, Any]]:
+    """
+    手动触发的积分重置（与定时任务共用租约，避免并发执行）
+
+    分片模式下定时任务持有的是各分片的租约，这里同样逐个分片在分片租约下执行，
+    正在由定时任务或其他节点重置的分片跳过；全部分片都被跳过时返回None。
+    """
+    run_key = f"manual-{datetime.now(timezone('Asia/Shanghai')).strftime('%Y%m%d%H%M%S')}"
+    shard_count = settings.CREDITS_RESET_SHARDS
+    if shard_count <= 1 or is_lazy_reset_mode():
+        return run_exclusive_job(DAILY_CREDITS_RESET_JOB_ID, run_key, execute_daily_credits_reset)
+
+    totals = {"total_processed": 0, "total_success": 0, "total_failed": 0}
+    failed_shards = []
+    skipped_shards = []
+    for shard_index in range(shard_count):
+        result = run_exclusive_job(
+            get_shard_job_id(shard_index),
+            run_key,
+            partial(execute_daily_credits_reset, shard_index, shard_count)
+        )
+        if result is None:
+            skipped_shards.append(shard_index)
+            continue
+        for field in totals:
+            totals[field] += result.get(field, 0)
+        if not result.get("success"):
+            failed_shards.append(shard_index)
+
+    if len(skipped_shards) == shard_count:
+        return None
+
+    message = f"分片积分重置完成: 执行 {shard_count - len(skipped_shards)}/{shard_count} 个分片"
+    if skipped_shards:
+        message += f"，跳过正在其他节点执行的分片 {skipped_shards}"
+    if failed_shards:
+        message += f"，有失败的分片 {failed_shards}"
+    return {
+        "success": not failed_shards,
+        "message": message,
+        "shard_count": shard_count,
+        "skipped_shards": skipped_shards,
+        "failed_shards": failed_shards,
+        **totals
+    }
+
+
+def execute_credits_reconcile() -> Optional[Dict[str, Any]]:
+    """执行数据库与外部积分服务的对账任务"""
+    db = SessionLocal()
+    try:
+        return CreditsReconcileService(db).reconcile(repair=True)
+    except Exception as e:
+        logger.error(f"积分对账任务执行失败: {str(e)}", exc_info=True)
+        return {"success": False, "message": str(e)}
+    finally:
+        db.close()
+
+
+def run_credits_reconcile_job() -> Optional[Dict[str, Any]]:
+    """定时触发的积分对账（每天只会有一个节点执行一次）"""
+    run_key = datetime.now(timezone('Asia/Shanghai')).date().isoformat()
+    return run_exclusive_job(CREDITS_RECONCILE_JOB_ID, run_key, execute_credits_reconcile)
+
+
+def flush_rate_limits() -> None:
+    """将本进程的限流计数增量写入数据库（每个进程各自执行，不使用租约）"""
+    db = SessionLocal()
+    try:
+        rate_limiter.flush(db)
+    finally:
+        db.close()
+
+
+def sync_token_revocations() -> None:
+    """同步其他进程写入的令牌吊销记录（每个进程各自执行，不使用租约）"""
+    token_revocation_list.sync()
+
+
+def execute_rate_limit_purge() -> Optional[Dict[str, Any]]:
+    """清理过期的限流记录"""
+    db = SessionLocal()
+    try:
+        deleted = rate_limiter.purge_expired_records(db)
+        logger.info(f"清理过期限流记录: {deleted} 条")
+        return {"success": True, "deleted": deleted}
+    finally:
+        db.close()
+
+
+def run_rate_limit_purge_job() -> Optional[Dict[str, Any]]:
+    """定时触发的限流记录清理（每天只会有一个节点执行一次）"""
+    run_key = datetime.now(timezone('Asia/Shanghai')).date().isoformat()
+    return run_exclusive_job(RATE_LIMIT_PURGE_JOB_ID, run_key, execute_rate_limit_purge)
+
+
+def execute_email_verification_purge() -> Optional[Dict[str, Any]]:
+    """分批清理过期的邮箱验证记录"""
+    db = SessionLocal()
+    try:
+        deleted = EmailVerificationCRUD(db).purge_expired(
+            batch_size=settings.EMAIL_VERIFICATION_PURGE_BATCH_SIZE,
+            retention=timedelta(hours=settings.EMAIL_VERIFICATION_RETENTION_HOURS)
+        )
+        logger.info(f"清理过期邮箱验证记录: {deleted} 条")
+        return {"success": True, "deleted": deleted}
+    finally:
+        db.close()
+
+
+def run_email_verification_purge_job() -> Optional[Dict[str, Any]]:
+    """定时触发的邮箱验证记录清理（每小时只会有一个节点执行一次）"""
+    run_key = datetime.now(timezone('Asia/Shanghai')).strftime('%Y-%m-%dT%H')
+    return run_exclusive_job(EMAIL_VERIFICATION_PURGE_JOB_ID, run_key, execute_email_verification_purge)
+
+
+def execute_email_outbox_purge() -> Optional[Dict[str, Any]]:
+    """分批清理已结束且超过保留时长的邮件记录"""
+    db = SessionLocal()
+    try:
+        deleted = email_delivery.purge_finished(
+            db,
+            retention=timedelta(hours=settings.EMAIL_OUTBOX_RETENTION_HOURS),
+            batch_size=settings.EMAIL_OUTBOX_PURGE_BATCH_SIZE
+        )
+        logger.info(f"清理已结束的邮件记录: {deleted} 条")
+        return {"success": True, "deleted": deleted}
+    finally:
+        db.close()
+
+
+def run_email_outbox_purge_job() -> Optional[Dict[str, Any]]:
+    """定时触发的邮件记录清理（每小时只会有一个节点执行一次）"""
+    run_key = datetime.now(timezone('Asia/Shanghai')).strftime('%Y-%m-%dT%H')
+    return run_exclusive_job(EMAIL_OUTBOX_PURGE_JOB_ID, run_key, execute_email_outbox_purge)
+
+
+def execute_login_rollup() -> Optional[Dict[str, Any]]:
+    """重新汇总前一天的登录统计，并补齐最近30天缺失的汇总"""
+    db = SessionLocal()
+    try:
+        login_history_crud = LoginHistoryCRUD(db)
+        yesterday = datetime.now().date() - timedelta(days=1)
+        rollup = login_history_crud.rollup_day(yesterday)
+        login_history_crud.ensure_daily_rollups(yesterday - timedelta(days=30), yesterday)
+        if rollup is None:
+            return {"success": False, "message": f"汇总 {yesterday} 登录统计失败"}
+        logger.info(f"登录统计汇总完成: {yesterday}, 登录 {rollup.total_logins} 次, 独立用户 {rollup.unique_users}")
+        return {"success": True, "stat_date": yesterday.isoformat(), "total_logins": rollup.total_logins}
+    finally:
+        db.close()
+
+
+def run_login_rollup_job() -> Optional[Dict[str, Any]]:
+    """定时触发的登录统计汇总（每天只会有一个节点执行一次）"""
+    run_key = datetime.now(timezone('Asia/Shanghai')).date().isoformat()
+    return run_exclusive_job(LOGIN_ROLLUP_JOB_ID, run_key, execute_login_rollup)
+
+
+def register_scheduled_jobs(scheduler, beijing_tz) -> None:
+    """向调度器注册所有定时任务"""
+    if rate_limiter.enabled:
+        scheduler.add_job(
+            flush_rate_limits,
+            trigger=IntervalTrigger(seconds=settings.RATE_LIMIT_FLUSH_SECONDS, timezone=beijing_tz),
+            id=RATE_LIMIT_FLUSH_JOB_ID,
+            name="限流计数持久化",
+            replace_existing=True,
+            coalesce=True,
+            max_instances=1
+        )
+        scheduler.add_job(
+            run_rate_limit_purge_job,
+            trigger=CronTrigger(hour=4, minute=30, second=0, timezone=beijing_tz),
+            id=RATE_LIMIT_PURGE_JOB_ID,
+            name="过期限流记录清理",
+            replace_existing=True,
+            misfire_grace_time=300,
+            coalesce=True
+        )
+
+    if settings.JWT_EMBED_CLAIMS:
+        scheduler.add_job(
+            sync_token_revocations,
+            trigger=IntervalTrigger(seconds=settings.TOKEN_REVOCATION_SYNC_SECONDS, timezone=beijing_tz),
+            id=TOKEN_REVOCATION_SYNC_JOB_ID,
+            name="令牌吊销记录同步",
+            replace_existing=True,
+            coalesce=True,
+            max_instances=1
+        )
+
+    scheduler.add_job(
+        run_email_verification_purge_job,
+        trigger=CronTrigger(minute=15, second=0, timezone=beijing_tz),
+        id=EMAIL_VERIFICATION_PURGE_JOB_ID,
+        name="过期邮箱验证记录清理",
+        replace_existing=True,
+        misfire_grace_time=300,
+        coalesce=True
+    )
+
+    scheduler.add_job(
+        run_email_outbox_purge_job,
+        trigger=CronTrigger(minute=45, second=0, timezone=beijing_tz),
+        id=EMAIL_OUTBOX_PURGE_JOB_ID,
+        name="已结束邮件记录清理",
+        replace_existing=True,
+        misfire_grace_time=300,
+        coalesce=True
+    )
+
+    scheduler.add_job(
+        run_login_rollup_job,
+        trigger=CronTrigger(hour=0, minute=10, second=0, timezone=beijing_tz),
+        id=LOGIN_ROLLUP_JOB_ID,
+        name="每日登录统计汇总",
+        replace_existing=True,
+        misfire_grace_time=300,
+        coalesce=True
+    )
+
+    if settings.CREDITS_RECONCILE_ENABLED:
+        scheduler.add_job(
+            run_credits_reconcile_job,
+            trigger=CronTrigger(hour=settings.CREDITS_RECONCILE_HOUR, minute=0, second=0, timezone=beijing_tz),
+            id=CREDITS_RECONCILE_JOB_ID,
+            name="积分对账任务",
+            replace_existing=True,
+            misfire_grace_time=300,
+            coalesce=True
+        )
+
+    shard_count = settings.CREDITS_RESET_SHARDS
+    if shard_count > 1 and not is_lazy_reset_mode():
+        # 分片模式：各分片在0点后的窗口内错峰执行，避免0点整的集中写入
+        offsets = get_shard_slot_offsets(shard_count, settings.CREDITS_RESET_WINDOW_MINUTES)
+        for shard_index, offset in enumerate(offsets):
+            scheduler.add_job(
+                run_daily_credits_reset_shard_job,
+                trigger=CronTrigger(
+                    hour=offset // 3600,
+                    minute=offset % 3600 // 60,
+                    second=offset % 60,
+                    timezone=beijing_tz
+                ),
+                args=[shard_index, shard_count],
+                id=get_shard_job_id(shard_index),
+                name=f"每日积分重置任务（分片 {shard_index}/{shard_count}）",
+                replace_existing=True,
+                misfire_grace_time=300,
+                coalesce=True
+            )
+        logger.info(f"每日积分重置任务已按 {shard_count} 个分片注册，窗口 {settings.CREDITS_RESET_WINDOW_MINUTES} 分钟")
+        return
+
+    # 配置每日0时执行积分重置任务（北京时间）
+    scheduler.add_job(
+        run_daily_credits_reset_job,
+        trigger=CronTrigger(hour=0, minute=0, second=0, timezone=beijing_tz),  # 每天北京时间0:00:00执行
+        id=DAILY_CREDITS_RESET_JOB_ID,
+        name="每日积分重置任务",
+        replace_existing=True,
+        misfire_grace_time=300,  # 允许错过执行时间300秒
+        coalesce=True  # 合并多次错过执行
+    )
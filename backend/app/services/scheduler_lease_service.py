@@ -0,0 +1,215 @@
+import json
+import logging
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import and_, or_, desc
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..db.database import SessionLocal
+from ..db.models import SchedulerLease, SchedulerJobRun
+
+logger = logging.getLogger(__name__)
+
+
+def get_node_id() -> str:
+    """获取当前节点标识（未配置时使用 主机名:进程号，每个uvicorn worker各不相同）"""
+    return settings.SCHEDULER_NODE_ID or f"{socket.gethostname()}:{os.getpid()}"
+
+
+class SchedulerLeaseService:
+    """定时任务租约服务 - 基于租约行的选主，保证多进程/多副本下同一任务只有一个节点执行"""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.node_id = get_node_id()
+
+    def try_acquire(self, job_id: str, lease_seconds: Optional[int] = None) -> bool:
+        """
+        尝试获取任务租约
+
+        租约空闲（已过期）或已由本节点持有时，通过一条条件UPDATE抢占；
+        租约行不存在时插入，主键冲突说明其他节点抢先获取。
+
+        Args:
+            job_id: 任务ID
+            lease_seconds: 租约时长（秒），默认使用配置
+
+        Returns:
+            是否获取成功
+        """
+        now = datetime.now()
+        lease_until = now + timedelta(seconds=lease_seconds or settings.SCHEDULER_LEASE_SECONDS)
+
+        try:
+            updated = self.db.query(SchedulerLease).filter(
+                and_(
+                    SchedulerLease.job_id == job_id,
+                    or_(
+                        SchedulerLease.holder == self.node_id,
+                        SchedulerLease.lease_until.is_(None),
+                        SchedulerLease.lease_until < now
+                    )
+                )
+            ).update(
+                {"holder": self.node_id, "lease_until": lease_until, "acquired_at": now},
+                synchronize_session=False
+            )
+            self.db.commit()
+
+            if updated:
+                return True
+
+            # 租约行不存在时创建
+            if self.db.query(SchedulerLease.job_id).filter(SchedulerLease.job_id == job_id).first():
+                return False
+
+            self.db.add(SchedulerLease(
+                job_id=job_id,
+                holder=self.node_id,
+                lease_until=lease_until,
+                acquired_at=now
+            ))
+            self.db.commit()
+            return True
+
+        except IntegrityError:
+            self.db.rollback()
+            logger.info(f"任务租约已被其他节点获取: {job_id}")
+            return False
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"获取任务租约失败: {job_id}, 错误: {str(e)}")
+            return False
+
+    def release(self, job_id: str) -> bool:
+        """释放本节点持有的租约（保留holder用于状态查询）"""
+        try:
+            released = self.db.query(SchedulerLease).filter(
+                and_(
+                    SchedulerLease.job_id == job_id,
+                    SchedulerLease.holder == self.node_id
+                )
+            ).update({"lease_until": datetime.now()}, synchronize_session=False)
+            self.db.commit()
+            return bool(released)
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"释放任务租约失败: {job_id}, 错误: {str(e)}")
+            return False
+
+    def start_run(self, job_id: str, run_key: str) -> Optional[SchedulerJobRun]:
+        """
+        登记一次任务执行
+
+        (job_id, run_key) 上有唯一索引，同一批次已被执行过时返回None，
+        即使租约过期后被其他节点接管也不会重复执行。
+        """
+        try:
+            job_run = SchedulerJobRun(
+                job_id=job_id,
+                run_key=run_key,
+                node_id=self.node_id,
+                status="running",
+                started_at=datetime.now()
+            )
+            self.db.add(job_run)
+            self.db.commit()
+            self.db.refresh(job_run)
+            return job_run
+        except IntegrityError:
+            self.db.rollback()
+            logger.info(f"任务批次已执行过，跳过: {job_id}/{run_key}")
+            return None
+
+    def finish_run(self, job_run: SchedulerJobRun, status: str, summary: Optional[Dict[str, Any]] = None) -> None:
+        """记录任务执行结果"""
+        try:
+            job_run.status = status
+            job_run.finished_at = datetime.now()
+            if summary is not None:
+                # 只保存标量字段，避免把明细列表写入执行记录
+                compact = {k: v for k, v in summary.items() if not isinstance(v, (list, dict))}
+                job_run.summary = json.dumps(compact, ensure_ascii=False, default=str)
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"记录任务执行结果失败: {job_run.job_id}/{job_run.run_key}, 错误: {str(e)}")
+
+    def get_leases(self) -> List[Dict[str, Any]]:
+        """获取所有任务租约状态"""
+        now = datetime.now()
+        leases = self.db.query(SchedulerLease).order_by(SchedulerLease.job_id).all()
+        return [
+            {
+                "job_id": lease.job_id,
+                "holder": lease.holder,
+                "is_held": bool(lease.lease_until and lease.lease_until > now),
+                "held_by_current_node": lease.holder == self.node_id,
+                "lease_until": lease.lease_until.isoformat() if lease.lease_until else None,
+                "acquired_at": lease.acquired_at.isoformat() if lease.acquired_at else None
+            }
+            for lease in leases
+        ]
+
+    def get_recent_runs(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """获取最近的任务执行记录"""
+        runs = self.db.query(SchedulerJobRun).order_by(desc(SchedulerJobRun.started_at)).limit(limit).all()
+        return [
+            {
+                "job_id": run.job_id,
+                "run_key": run.run_key,
+                "node_id": run.node_id,
+                "status": run.status,
+                "started_at": run.started_at.isoformat() if run.started_at else None,
+                "finished_at": run.finished_at.isoformat() if run.finished_at else None,
+                "summary": json.loads(run.summary) if run.summary else None
+            }
+            for run in runs
+        ]
+
+
+def run_exclusive_job(job_id: str, run_key: str, job_func: Callable[[], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+    """
+    在租约保护下执行任务
+
+    Args:
+        job_id: 任务ID
+        run_key: 执行批次标识（如北京时间日期），同一批次只会执行一次
+        job_func: 任务函数，返回执行结果字典
+
+    Returns:
+        任务执行结果；未获取到租约或批次已执行时返回None
+    """
+    db = SessionLocal()
+    try:
+        lease_service = SchedulerLeaseService(db)
+
+        if not lease_service.try_acquire(job_id):
+            logger.info(f"任务 {job_id} 的租约由其他节点持有，本节点 {lease_service.node_id} 跳过执行")
+            return None
+
+        try:
+            job_run = lease_service.start_run(job_id, run_key)
+            if not job_run:
+                return None
+
+            logger.info(f"节点 {lease_service.node_id} 开始执行任务: {job_id}/{run_key}")
+            try:
+                result = job_func() or {}
+            except Exception as e:
+                lease_service.finish_run(job_run, "failed", {"message": str(e)})
+                raise
+
+            lease_service.finish_run(job_run, "success" if result.get("success", True) else "failed", result)
+            return result
+
+        finally:
+            lease_service.release(job_id)
+
+    finally:
+        db.close()
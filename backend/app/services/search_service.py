@@ -0,0 +1,182 @@
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import case, desc, func, literal, or_, select, union_all
+from sqlalchemy.dialects.mysql import match
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..db.models import APIKey, User
+
+logger = logging.getLogger(__name__)
+
+# 排名分值：完全匹配 > 前缀匹配 > 全文相关度
+_EXACT_SCORE = 2000
+_PREFIX_SCORE = 1000
+
+
+def _escape_like(term: str) -> str:
+    """转义 LIKE 通配符"""
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _fulltext_phrase(term: str) -> str:
+    """构造 BOOLEAN MODE 短语查询（ngram 分词下等价于子串匹配）"""
+    return '"' + term.replace('"', " ") + '"'
+
+
+class SearchService:
+    """
+    管理后台搜索服务
+
+    每种匹配方式单独成为一个分支（UNION ALL），各自走自己的索引：
+    - 精确/前缀匹配：邮箱、手机号、用户ID、密钥本身上的普通索引（LIKE 'term%' 范围扫描）
+    - 包含匹配：MySQL FULLTEXT ngram 索引（用户邮箱/手机号/用户ID、密钥名称）
+    再按ID合并取最高分排序分页，避免 LIKE '%term%' 全表扫描。
+    非MySQL数据库（开发环境）没有全文索引，包含匹配退化为 LIKE。
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.is_mysql = db.get_bind().dialect.name == "mysql"
+
+    def _prefix_branch(self, model, column, term: str):
+        """精确/前缀匹配分支"""
+        score = case((column == term, _EXACT_SCORE), else_=_PREFIX_SCORE)
+        return select(model.id.label("id"), score.label("score")).where(
+            column.like(f"{_escape_like(term)}%", escape="\\")
+        )
+
+    def _contains_branch(self, model, columns: List[Any], term: str):
+        """包含匹配分支（全文索引，短于ngram分词长度时不参与）"""
+        if len(term) < settings.SEARCH_NGRAM_TOKEN_SIZE:
+            return None
+        if self.is_mysql:
+            relevance = match(*columns, against=_fulltext_phrase(term)).in_boolean_mode()
+            return select(model.id.label("id"), relevance.label("score")).where(relevance > 0)
+        pattern = f"%{_escape_like(term)}%"
+        return select(model.id.label("id"), literal(1).label("score")).where(
+            or_(*[column.like(pattern, escape="\\") for column in columns])
+        )
+
+    def _ranked(self, branches):
+        """合并各分支结果，每个ID取最高分"""
+        matches = union_all(*[branch for branch in branches if branch is not None]).subquery("matches")
+        return (
+            select(matches.c.id, func.max(matches.c.score).label("score"))
+            .group_by(matches.c.id)
+            .subquery("ranked")
+        )
+
+    def search_users(
+        self,
+        term: Optional[str] = None,
+        is_active: Optional[bool] = None,
+        page: int = 1,
+        page_size: int = 20
+    ) -> Tuple[List[User], int]:
+        """
+        搜索用户（邮箱、手机号、用户ID）
+
+        Returns:
+            (当前页用户列表, 总数)，有搜索词时按匹配程度排序
+        """
+        term = (term or "").strip()
+        offset = (page - 1) * page_size
+
+        if not term:
+            query = self.db.query(User)
+            if is_active is not None:
+                query = query.filter(User.is_active == is_active)
+            total = query.with_entities(func.count(User.id)).scalar() or 0
+            users = query.order_by(desc(User.id)).offset(offset).limit(page_size).all()
+            return users, total
+
+        ranked = self._ranked([
+            self._prefix_branch(User, User.email, term),
+            self._prefix_branch(User, User.phone, term),
+            self._prefix_branch(User, User.user_id, term),
+            self._contains_branch(User, [User.user_id, User.email, User.phone], term)
+        ])
+
+        query = self.db.query(User).join(ranked, User.id == ranked.c.id)
+        if is_active is not None:
+            query = query.filter(User.is_active == is_active)
+
+        total = query.with_entities(func.count(User.id)).scalar() or 0
+        users = (
+            query.order_by(desc(ranked.c.score), desc(User.id))
+            .offset(offset)
+            .limit(page_size)
+            .all()
+        )
+        return users, total
+
+    def search_user_keys(
+        self,
+        term: str,
+        status: Optional[str] = None,
+        page: int = 1,
+        page_size: int = 20
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        搜索用户密钥（密钥前缀、密钥名称）
+
+        Returns:
+            (当前页密钥列表, 总数)，按匹配程度排序
+        """
+        term = term.strip()
+        if not term:
+            return [], 0
+        offset = (page - 1) * page_size
+
+        ranked = self._ranked([
+            self._prefix_branch(APIKey, APIKey.api_key, term),
+            self._contains_branch(APIKey, [APIKey.key_name], term)
+        ])
+
+        query = (
+            self.db.query(
+                APIKey.id,
+                APIKey.user_id,
+                APIKey.api_key,
+                APIKey.key_name,
+                User.email,
+                APIKey.package_id,
+                APIKey.status,
+                APIKey.expire_date,
+                APIKey.remaining_credits,
+                APIKey.created_at,
+                ranked.c.score
+            )
+            .join(ranked, APIKey.id == ranked.c.id)
+            .outerjoin(User, APIKey.user_id == User.user_id)
+        )
+        if status:
+            query = query.filter(APIKey.status == status)
+
+        total = query.with_entities(func.count(APIKey.id)).scalar() or 0
+        rows = (
+            query.order_by(desc(ranked.c.score), desc(APIKey.id))
+            .offset(offset)
+            .limit(page_size)
+            .all()
+        )
+
+        user_keys = [
+            {
+                "id": row.id,
+                "user_id": row.user_id,
+                "api_key": row.api_key,
+                "key_name": row.key_name,
+                "user_email": row.email or "未激活",
+                "package_id": row.package_id,
+                "status": row.status,
+                "expire_date": row.expire_date,
+                "remaining_credits": row.remaining_credits,
+                "created_at": row.created_at,
+                "score": float(row.score or 0)
+            }
+            for row in rows
+        ]
+        return user_keys, total
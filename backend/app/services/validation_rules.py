@@ -0,0 +1,163 @@
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..core.invalidation_bus import invalidation_bus, TOPIC_PACKAGES
+from ..db.database import SessionLocal
+from ..db.models import APIKey, Package
+from ..schemas.common import ErrorCodes
+from ..schemas.enums import PackageType
+from .credits_reset_service import DAILY_RESET_PACKAGE_TYPES
+
+logger = logging.getLogger(__name__)
+
+# 校验失败结果：(错误码, 错误信息, 错误类型)
+ValidationFailure = Tuple[int, str, str]
+
+_EXPIRED: ValidationFailure = (ErrorCodes.PLAN_EXPIRED, "API key has expired", "EXPIRED_KEY")
+_INSUFFICIENT_CREDITS: ValidationFailure = (ErrorCodes.CREDITS_EXHAUSTED, "Insufficient credits", "INSUFFICIENT_CREDITS")
+
+
+class ValidationRule:
+    """
+    一种订阅类型的密钥校验规则
+
+    校验项在构造时确定，check 只按预先计算的标志依次判断，不再比较订阅类型。
+    """
+
+    __slots__ = ("package_type", "invalid_reason", "check_expiry", "check_credits", "credits_required", "daily_reset")
+
+    def __init__(self, package_type: Optional[str], invalid_reason: Optional[str] = None, check_expiry: bool = False,
+                 check_credits: bool = False, credits_required: bool = False):
+        self.package_type = package_type
+        # 不为空时该类型的密钥一律无效
+        self.invalid_reason = invalid_reason
+        self.check_expiry = check_expiry
+        self.check_credits = check_credits
+        # 积分为空时是否视为积分不足（积分包必须有积分记录）
+        self.credits_required = credits_required
+        self.daily_reset = package_type in DAILY_RESET_PACKAGE_TYPES
+
+    def check(self, api_key: APIKey, now: datetime) -> Optional[ValidationFailure]:
+        """校验密钥，通过时返回None"""
+        if self.invalid_reason is not None:
+            return ErrorCodes.INVALID_API_KEY, self.invalid_reason, "INVALID_KEY"
+
+        if self.check_expiry and api_key.expire_date and api_key.expire_date < now:
+            return _EXPIRED
+
+        if self.check_credits:
+            credits = api_key.remaining_credits
+            if credits is None:
+                if self.credits_required:
+                    return _INSUFFICIENT_CREDITS
+            elif credits <= 0:
+                return _INSUFFICIENT_CREDITS
+
+        return None
+
+
+def _build_type_rules() -> Dict[str, Callable[[str], ValidationRule]]:
+    """订阅类型 -> 规则构造函数（新增订阅类型时在这里登记）"""
+    return {
+        # 标准订阅、Max系列：校验有效期和剩余积分
+        PackageType.STANDARD.value: lambda package_type: ValidationRule(package_type, check_expiry=True, check_credits=True),
+        PackageType.MAX_SERIES.value: lambda package_type: ValidationRule(package_type, check_expiry=True, check_credits=True),
+        # 体验积分包、临时积分包：没有有效期限制，只校验剩余积分（必须大于0）
+        PackageType.EXPERIENCE_PACKAGE.value: lambda package_type: ValidationRule(
+            package_type, check_credits=True, credits_required=True
+        ),
+        PackageType.TEMPORARY_PACKAGE.value: lambda package_type: ValidationRule(
+            package_type, check_credits=True, credits_required=True
+        ),
+        # 加油包：只用于累加积分，不能直接使用
+        PackageType.FUEL_PACK.value: lambda package_type: ValidationRule(
+            package_type, invalid_reason="Invalid API key (fuel pack)"
+        ),
+    }
+
+
+_TYPE_RULES = _build_type_rules()
+
+# 未关联订阅（或订阅已不存在）的密钥：与标准订阅相同的校验
+DEFAULT_RULE = ValidationRule(None, check_expiry=True, check_credits=True)
+
+
+def compile_rule(package_type: Optional[str]) -> ValidationRule:
+    """按订阅类型生成规则（未知类型一律无效）"""
+    if not package_type:
+        return DEFAULT_RULE
+    factory = _TYPE_RULES.get(package_type)
+    if factory is None:
+        return ValidationRule(package_type, invalid_reason="Invalid API key (unknown package type)")
+    return factory(package_type)
+
+
+class ValidationRuleRegistry:
+    """
+    订阅校验规则表
+
+    由 packages 表编译出 package_id -> ValidationRule 映射，密钥校验时按 package_id 直接取规则，
+    校验查询不再关联 packages 表。订阅变更后随失效通知重新编译；
+    多进程部署下其他进程每隔 reload_seconds 重新编译，遇到表中没有的 package_id 时也会提前重新编译。
+    """
+
+    # 遇到未知 package_id 时两次重新编译的最小间隔（秒）
+    MISS_RELOAD_INTERVAL = 5
+
+    def __init__(self, reload_seconds: int = 60, session_factory: Callable[[], Session] = SessionLocal):
+        self.reload_seconds = reload_seconds
+        self.session_factory = session_factory
+        self._rules: Optional[Dict[int, ValidationRule]] = None
+        self._loaded_at = 0.0
+        self._stale = True
+        self._lock = threading.Lock()
+
+    def invalidate(self) -> None:
+        """标记规则表过期"""
+        self._stale = True
+
+    def get_rule(self, package_id: Optional[int]) -> ValidationRule:
+        """获取订阅对应的校验规则"""
+        if package_id is None:
+            return DEFAULT_RULE
+
+        rules = self._rules
+        if rules is None or self._stale or time.monotonic() - self._loaded_at >= self.reload_seconds:
+            rules = self._reload()
+
+        rule = rules.get(package_id)
+        if rule is None and time.monotonic() - self._loaded_at >= self.MISS_RELOAD_INTERVAL:
+            rule = self._reload().get(package_id)
+        return rule or DEFAULT_RULE
+
+    def _reload(self) -> Dict[int, ValidationRule]:
+        with self._lock:
+            # 等锁期间可能已被其他线程重新编译
+            if self._rules is not None and not self._stale and time.monotonic() - self._loaded_at < 1:
+                return self._rules
+
+            self._stale = False
+            db = self.session_factory()
+            try:
+                rows = db.query(Package.id, Package.package_type).all()
+            except Exception:
+                self._stale = True
+                raise
+            finally:
+                db.close()
+
+            self._rules = {package_id: compile_rule(package_type) for package_id, package_type in rows}
+            self._loaded_at = time.monotonic()
+            logger.info(f"订阅校验规则已编译: {len(self._rules)} 个订阅")
+            return self._rules
+
+
+# 创建全局规则表实例
+validation_rules = ValidationRuleRegistry(reload_seconds=settings.VALIDATION_RULES_RELOAD_SECONDS)
+invalidation_bus.subscribe(TOPIC_PACKAGES, lambda package_ids: validation_rules.invalidate())
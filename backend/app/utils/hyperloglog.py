@@ -0,0 +1,66 @@
+import hashlib
+import math
+from typing import Iterable, Optional
+
+
+class HyperLogLog:
+    """
+    HyperLogLog基数估计
+
+    用固定大小的寄存器数组估算去重后的元素个数，可以序列化后存库，并且多个草图可以合并，
+    用于跨天统计独立用户数而不必保存或扫描全部用户ID。
+    precision=12 时占用4096字节，标准误差约1.6%。
+    """
+
+    def __init__(self, precision: int = 12, registers: Optional[bytes] = None):
+        if not 4 <= precision <= 16:
+            raise ValueError("precision 必须在 4 到 16 之间")
+        self.precision = precision
+        self.size = 1 << precision
+        if registers is not None:
+            if len(registers) != self.size:
+                raise ValueError("寄存器长度与precision不匹配")
+            self.registers = bytearray(registers)
+        else:
+            self.registers = bytearray(self.size)
+
+    def add(self, value: str) -> None:
+        """添加一个元素"""
+        digest = int.from_bytes(hashlib.sha1(value.encode("utf-8")).digest()[:8], "big")
+        index = digest >> (64 - self.precision)
+        remaining = (digest << self.precision) & 0xFFFFFFFFFFFFFFFF
+        # 剩余位中第一个1出现的位置（全0时取最大值）
+        rank = 64 - self.precision + 1 if remaining == 0 else 65 - remaining.bit_length()
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, values: Iterable[str]) -> None:
+        """批量添加元素"""
+        for value in values:
+            self.add(value)
+
+    def merge(self, other: "HyperLogLog") -> None:
+        """合并另一个草图（结果等价于两个集合的并集）"""
+        if other.precision != self.precision:
+            raise ValueError("只能合并precision相同的草图")
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+
+    def count(self) -> int:
+        """估算去重后的元素个数"""
+        alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(self.size, 0.7213 / (1 + 1.079 / self.size))
+        estimate = alpha * self.size * self.size / sum(2.0 ** -register for register in self.registers)
+
+        # 小基数时使用线性计数修正
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.size and zeros:
+            estimate = self.size * math.log(self.size / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self) -> bytes:
+        """序列化为字节串（用于存库）"""
+        return bytes(self.registers)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, precision: int = 12) -> "HyperLogLog":
+        """从字节串恢复"""
+        return cls(precision=precision, registers=data)
@@ -0,0 +1,30 @@
+import base64
+import binascii
+from datetime import datetime
+from typing import Optional, Tuple
+
+
+def encode_keyset_cursor(created_at: datetime, row_id: int) -> str:
+    """把 (created_at, id) 编码为不透明的翻页游标"""
+    raw = f"{created_at.isoformat()}|{row_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_keyset_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    """
+    解析翻页游标
+
+    Returns:
+        (created_at, id)，cursor 为空时返回 None
+
+    Raises:
+        ValueError: 游标格式无效
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        created_at, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("无效的翻页游标")
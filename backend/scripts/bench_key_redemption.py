@@ -0,0 +1,201 @@
+"""
+卡密并发兑换基准测试
+
+模拟促销开售：准备一个临时订阅、N个未激活密钥和一批用户，多个线程同时兑换，
+每个密钥被 --contenders 个不同用户同时争抢。结束后校验：
+
+- 每个密钥恰好兑换成功一次（成功响应数 == 密钥数，且每个密钥只有一个成功响应）；
+  --keys-per-user > 1 时争抢者可能都因已有激活密钥被拒绝，此时要求至多一次且密钥保持未兑换
+- 数据库中每个密钥的 user_id 与唯一成功的兑换者一致，状态为 active
+- 每个用户最多持有一个激活的密钥（--keys-per-user > 1 时检验一人一激活）
+
+测试数据使用随机前缀，结束后删除。默认使用配置中的数据库（应指向测试库），
+也可以用 --database-url 指定，例如 sqlite:////tmp/redeem.db（SQLite 不支持行锁，
+一人一激活的并发检查只在 MySQL 下有意义）。
+
+用法（在backend目录下）：
+    python scripts/bench_key_redemption.py --keys 500 --contenders 4 --threads 32
+"""
+import argparse
+import os
+import random
+import secrets
+import statistics
+import sys
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.db.crud.api_key import APIKeyCRUD  # noqa: E402
+from app.db.database import Base  # noqa: E402
+from app.db.models import APIKey, Package, User  # noqa: E402
+from app.schemas.enums import PackageType  # noqa: E402
+
+
+def create_session_factory(database_url: str, threads: int):
+    if database_url.startswith("sqlite"):
+        engine = create_engine(database_url, connect_args={"check_same_thread": False, "timeout": 60})
+        Base.metadata.create_all(bind=engine)
+    else:
+        engine = create_engine(database_url, pool_size=threads, max_overflow=threads, pool_recycle=3600)
+    return engine, sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def prepare_data(session_factory, tag: str, keys: int, users: int) -> tuple:
+    """创建临时订阅、未激活密钥和用户，返回 (订阅ID, 密钥列表, 用户邮箱列表)"""
+    db = session_factory()
+    try:
+        package = Package(
+            package_code=f"bench-{tag}", package_name=f"兑换压测 {tag}", price=0, credits=1000,
+            daily_reset_credits=0, duration_days=30, package_type=PackageType.STANDARD, is_active=False
+        )
+        db.add(package)
+        db.flush()
+
+        api_keys = [f"bench-{tag}-{index:06d}-{secrets.token_hex(8)}" for index in range(keys)]
+        db.bulk_insert_mappings(APIKey, [
+            {
+                "api_key": api_key, "real_api_key": "bench", "key_name": f"bench-{tag}", "package_id": package.id,
+                "status": "inactive", "is_active": True, "remaining_days": 30,
+                "remaining_credits": 1000, "total_credits": 1000
+            }
+            for api_key in api_keys
+        ])
+
+        emails = [f"bench-{tag}-{index:06d}@example.com" for index in range(users)]
+        db.bulk_insert_mappings(User, [
+            {"user_id": f"bench-{tag}-{index:06d}", "email": email, "password_hash": "-", "is_active": True}
+            for index, email in enumerate(emails)
+        ])
+        db.commit()
+        return package.id, api_keys, emails
+    finally:
+        db.close()
+
+
+def cleanup(session_factory, tag: str, package_id: int) -> None:
+    db = session_factory()
+    try:
+        db.query(APIKey).filter(APIKey.package_id == package_id).delete(synchronize_session=False)
+        db.query(User).filter(User.user_id.like(f"bench-{tag}-%")).delete(synchronize_session=False)
+        db.query(Package).filter(Package.id == package_id).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def build_attempts(api_keys: list, emails: list, contenders: int, keys_per_user: int) -> list:
+    """每个密钥分配 contenders 个不同用户；每个用户参与 keys_per_user 个密钥的争抢"""
+    slots = [email for email in emails for _ in range(keys_per_user)]
+    random.shuffle(slots)
+    attempts = []
+    for index, api_key in enumerate(api_keys):
+        for email in slots[index * contenders:(index + 1) * contenders]:
+            attempts.append((api_key, email))
+    random.shuffle(attempts)
+    return attempts
+
+
+def redeem(session_factory, api_key: str, email: str) -> tuple:
+    db = session_factory()
+    try:
+        start = time.perf_counter()
+        result = APIKeyCRUD(db).activate_user_key(api_key, email)
+        return api_key, email, result, (time.perf_counter() - start) * 1000
+    finally:
+        db.close()
+
+
+def verify(session_factory, package_id: int, api_keys: list, results: list, expect_all: bool) -> list:
+    """校验恰好一次激活，返回发现的问题列表"""
+    problems = []
+    winners = defaultdict(list)
+    for api_key, email, result, _ in results:
+        if result["success"]:
+            winners[api_key].append(email)
+
+    for api_key in api_keys:
+        count = len(winners.get(api_key, []))
+        if count > 1 or (expect_all and count == 0):
+            problems.append(f"密钥 {api_key} 兑换成功 {count} 次")
+
+    db = session_factory()
+    try:
+        owners = {
+            row.email: row.user_id
+            for row in db.query(User.email, User.user_id).filter(User.email.in_(
+                [email for emails in winners.values() for email in emails]
+            ))
+        } if winners else {}
+        rows = db.query(APIKey.api_key, APIKey.user_id, APIKey.status).filter(APIKey.package_id == package_id).all()
+    finally:
+        db.close()
+
+    for api_key, user_id, status in rows:
+        expected = winners.get(api_key)
+        if not expected:
+            if user_id is not None or status != "inactive":
+                problems.append(f"密钥 {api_key} 没有成功兑换者，但状态为 {status}，持有者 {user_id}")
+        elif status != "active" or owners.get(expected[0]) != user_id:
+            problems.append(f"密钥 {api_key} 状态 {status}，持有者 {user_id}，成功兑换者 {expected}")
+
+    per_user = Counter(user_id for _, user_id, status in rows if status == "active")
+    problems.extend(f"用户 {user_id} 持有 {count} 个激活密钥" for user_id, count in per_user.items() if count > 1)
+    return problems
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="卡密并发兑换基准测试")
+    parser.add_argument("--keys", type=int, default=200, help="参与兑换的密钥数")
+    parser.add_argument("--contenders", type=int, default=4, help="同时争抢同一密钥的用户数")
+    parser.add_argument("--keys-per-user", type=int, default=1, help="每个用户参与争抢的密钥数")
+    parser.add_argument("--threads", type=int, default=32, help="并发线程数")
+    parser.add_argument("--database-url", default=settings.DATABASE_URL, help="数据库连接（默认使用配置）")
+    parser.add_argument("--keep", action="store_true", help="保留测试数据")
+    args = parser.parse_args()
+
+    users = -(-args.keys * args.contenders // args.keys_per_user)
+    engine, session_factory = create_session_factory(args.database_url, args.threads)
+    tag = secrets.token_hex(4)
+    package_id, api_keys, emails = prepare_data(session_factory, tag, args.keys, users)
+    attempts = build_attempts(api_keys, emails, args.contenders, args.keys_per_user)
+
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.threads) as executor:
+            results = list(executor.map(lambda attempt: redeem(session_factory, *attempt), attempts))
+        elapsed = time.perf_counter() - start
+
+        latencies = sorted(latency for _, _, _, latency in results)
+        messages = Counter(result["message"] for _, _, result, _ in results)
+        print(
+            f"兑换请求 {len(results)} 次（{args.keys} 个密钥 x {args.contenders} 人争抢，{users} 个用户），"
+            f"{args.threads} 线程，耗时 {elapsed:.2f}s，{len(results) / elapsed:.0f} 次/秒"
+        )
+        print(
+            f"延迟 p50={statistics.median(latencies):.1f}ms "
+            f"p99={latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]:.1f}ms max={latencies[-1]:.1f}ms"
+        )
+        for message, count in messages.most_common():
+            print(f"  {message}: {count}")
+
+        problems = verify(session_factory, package_id, api_keys, results, expect_all=args.keys_per_user == 1)
+        if problems:
+            for problem in problems[:20]:
+                print(f"失败: {problem}")
+            sys.exit(f"恰好一次激活校验失败: 共 {len(problems)} 个问题")
+        print("恰好一次激活校验通过")
+    finally:
+        if not args.keep:
+            cleanup(session_factory, tag, package_id)
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+密码哈希工作池基准测试
+
+模拟登录高峰：N个并发登录请求各自做一次bcrypt校验，同时一个"API密钥验证"协程
+每隔固定间隔发起一次轻量请求，统计其延迟。对比两种方式：
+
+- inline: 在事件循环中直接调用bcrypt（旧实现）
+- pool:   通过密码哈希工作池执行（新实现）
+
+用法（在backend目录下）：
+    python scripts/bench_password_pool.py --logins 40 --workers 4
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.core.password_hasher import PasswordHasherPool, hash_password_sync, verify_password_sync  # noqa: E402
+
+
+async def probe_validation_latency(stop: asyncio.Event, interval: float, samples: list) -> None:
+    """模拟API密钥验证请求：记录每次从发起到被调度执行的延迟"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0)  # 验证本身耗时极短，延迟主要来自事件循环被阻塞
+        samples.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(interval)
+
+
+async def run_scenario(mode: str, logins: int, hashed: str, pool: PasswordHasherPool, interval: float) -> dict:
+    samples: list = []
+    stop = asyncio.Event()
+    prober = asyncio.create_task(probe_validation_latency(stop, interval, samples))
+    await asyncio.sleep(interval)
+
+    async def login() -> bool:
+        if mode == "inline":
+            return verify_password_sync("correct horse battery staple", hashed)
+        return await pool.verify("correct horse battery staple", hashed)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(login() for _ in range(logins)), return_exceptions=True)
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await prober
+
+    samples.sort()
+    return {
+        "mode": mode,
+        "logins": logins,
+        "succeeded": sum(1 for result in results if result is True),
+        "login_wall_seconds": round(elapsed, 2),
+        "probe_samples": len(samples),
+        "probe_p50_ms": round(statistics.median(samples), 2) if samples else None,
+        "probe_p99_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))], 2) if samples else None,
+        "probe_max_ms": round(samples[-1], 2) if samples else None,
+    }
+
+
+async def main_async(args) -> None:
+    hashed = hash_password_sync("correct horse battery staple")
+    pool = PasswordHasherPool(mode=args.executor, workers=args.workers, max_pending=args.logins)
+
+    # 预热工作池，避免把进程启动时间计入
+    await asyncio.gather(*(pool.verify("warmup", hashed) for _ in range(args.workers)))
+
+    try:
+        for mode in ("inline", "pool"):
+            result = await run_scenario(mode, args.logins, hashed, pool, args.interval / 1000)
+            print(
+                f"{result['mode']:>6}: 登录 {result['succeeded']}/{result['logins']} 耗时 {result['login_wall_seconds']}s | "
+                f"验证延迟 p50={result['probe_p50_ms']}ms p99={result['probe_p99_ms']}ms "
+                f"max={result['probe_max_ms']}ms (样本 {result['probe_samples']})"
+            )
+        print(f"工作池指标: {pool.get_metrics()}")
+    finally:
+        pool.shutdown()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="密码哈希工作池基准测试")
+    parser.add_argument("--logins", type=int, default=20, help="并发登录数")
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1), help="工作池并发数")
+    parser.add_argument("--executor", choices=["process", "thread"], default="process", help="工作池类型")
+    parser.add_argument("--interval", type=float, default=10, help="验证请求间隔（毫秒）")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
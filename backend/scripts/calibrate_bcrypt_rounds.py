@@ -0,0 +1,34 @@
+"""
+bcrypt cost测算
+
+在目标机型上测量bcrypt速度，输出耗时不超过目标的最大cost，供写入 BCRYPT_ROUNDS。
+应用启动时不再自动校准：各进程、各副本各自校准时结果可能不同（机型不同或启动时CPU争用），
+登录落在不同进程上会反复按不同cost重新哈希同一用户的密码。
+
+用法（在backend目录下，最好在空闲的目标机器上执行）：
+    python scripts/calibrate_bcrypt_rounds.py --target-ms 250
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.core.config import settings  # noqa: E402
+from app.core.password_hasher import calibrate_bcrypt_rounds  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="bcrypt cost测算")
+    parser.add_argument("--target-ms", type=float, default=settings.BCRYPT_TARGET_MS, help="单次哈希目标耗时（毫秒）")
+    parser.add_argument("--min-rounds", type=int, default=settings.BCRYPT_MIN_ROUNDS, help="最小cost")
+    parser.add_argument("--max-rounds", type=int, default=settings.BCRYPT_MAX_ROUNDS, help="最大cost")
+    parser.add_argument("--samples", type=int, default=5, help="测量次数（取最快一次）")
+    args = parser.parse_args()
+
+    rounds = calibrate_bcrypt_rounds(args.target_ms, args.min_rounds, args.max_rounds, samples=args.samples)
+    print(f"建议配置: BCRYPT_ROUNDS={rounds}（当前配置 {settings.BCRYPT_ROUNDS}）")
+
+
+if __name__ == "__main__":
+    main()
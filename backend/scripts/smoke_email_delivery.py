@@ -0,0 +1,134 @@
+"""
+邮件投递队列冒烟测试
+
+在本机启动一个调试用SMTP服务器（只接收不转发，可模拟临时性失败），
+使用SQLite临时库作为邮件队列，验证：连接复用、批量发送、失败重试和吞吐指标。
+
+用法（在backend目录下）：
+    python scripts/smoke_email_delivery.py --emails 200 --pool-size 3 --fail-every 25
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.core.email_delivery import EmailDeliveryWorker, SMTPConnectionPool  # noqa: E402
+from app.db.models import Base, EmailOutbox  # noqa: E402
+
+
+class DebuggingSMTPServer:
+    """最小化的调试SMTP服务器：统计连接数和收到的邮件数，每N封邮件返回一次451临时错误"""
+
+    def __init__(self, fail_every: int = 0):
+        self.fail_every = fail_every
+        self.connections = 0
+        self.received = 0
+        self.rejected = 0
+        self._messages_seen = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        writer.write(b"220 localhost debugging SMTP\r\n")
+        await writer.drain()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode("utf-8", "replace").strip().upper()
+
+                if command.startswith(("EHLO", "HELO")):
+                    writer.write(b"250-localhost\r\n250 8BITMIME\r\n")
+                elif command.startswith(("MAIL", "RCPT", "RSET", "NOOP")):
+                    writer.write(b"250 OK\r\n")
+                elif command == "DATA":
+                    writer.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+                    await writer.drain()
+                    while (await reader.readline()) not in (b".\r\n", b""):
+                        pass
+                    self._messages_seen += 1
+                    if self.fail_every and self._messages_seen % self.fail_every == 0:
+                        self.rejected += 1
+                        writer.write(b"451 Temporary failure, try again later\r\n")
+                    else:
+                        self.received += 1
+                        writer.write(b"250 Queued\r\n")
+                elif command == "QUIT":
+                    writer.write(b"221 Bye\r\n")
+                    await writer.drain()
+                    break
+                else:
+                    writer.write(b"502 Command not implemented\r\n")
+                await writer.drain()
+        finally:
+            writer.close()
+
+
+async def main_async(args) -> None:
+    smtp = DebuggingSMTPServer(fail_every=args.fail_every)
+    server = await asyncio.start_server(smtp.handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+
+    db_path = os.path.join(tempfile.mkdtemp(), "outbox.db")
+    engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine, tables=[EmailOutbox.__table__])
+    session_factory = sessionmaker(bind=engine)
+
+    worker = EmailDeliveryWorker(
+        pool=SMTPConnectionPool("127.0.0.1", port, start_tls=False, size=args.pool_size),
+        batch_size=args.batch_size,
+        poll_seconds=0.2,
+        max_attempts=3,
+        retry_base_seconds=0,
+        session_factory=session_factory
+    )
+    worker.start()
+
+    start = time.perf_counter()
+    for index in range(args.emails):
+        worker.enqueue([f"user{index}@example.com"], f"测试邮件 {index}", f"<p>邮件 {index}</p>", f"邮件 {index}")
+
+    # 等待队列清空
+    while True:
+        db = session_factory()
+        try:
+            depth = worker.get_queue_depth(db)
+        finally:
+            db.close()
+        if not depth.get("pending") and not depth.get("sending"):
+            break
+        if time.perf_counter() - start > args.timeout:
+            print(f"超时，队列状态: {depth}")
+            break
+        await asyncio.sleep(0.1)
+    elapsed = time.perf_counter() - start
+
+    await worker.stop()
+    server.close()
+    await server.wait_closed()
+
+    print(f"队列状态: {depth}")
+    print(f"SMTP服务器: 连接 {smtp.connections} 次, 接收 {smtp.received} 封, 临时拒绝 {smtp.rejected} 次")
+    print(f"耗时 {elapsed:.2f}s, 吞吐 {depth.get('sent', 0) / elapsed:.1f} 封/秒")
+    print(f"投递指标: {worker.get_metrics()}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="邮件投递队列冒烟测试")
+    parser.add_argument("--emails", type=int, default=200, help="发送邮件数")
+    parser.add_argument("--pool-size", type=int, default=3, help="SMTP连接池大小")
+    parser.add_argument("--batch-size", type=int, default=20, help="每批取出的邮件数")
+    parser.add_argument("--fail-every", type=int, default=25, help="每N封邮件模拟一次临时错误（0表示不模拟）")
+    parser.add_argument("--timeout", type=float, default=60, help="最长等待时间（秒）")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
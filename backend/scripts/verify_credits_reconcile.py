@@ -0,0 +1,228 @@
+"""
+积分对账校验
+
+外部积分服务的 /v1/credits/checksums 和 /v1/credits/buckets/entries 由 FakeCreditsService 代替：
+它用内存字典保存 {api_key: remaining_credits}，校验和直接调用 compute_bucket_checksums，
+即外部服务应实现的参考算法。脚本依次校验：
+
+1. 数据库分组聚合得到的校验和（CRC32/CONCAT/SUM，一条SQL）与对同一批记录逐条计算的 Python 校验和完全一致
+2. 以数据库为准初始化外部存储后，人为制造三类偏差：积分不一致、外部缺失、外部多出，
+   对账结果的计数与制造的偏差一致，前两类修复后外部存储与数据库一致，多出的密钥列入 action_items
+3. 修复后再次对账，除外部多出的密钥所在的桶外没有不一致的桶
+
+测试密钥使用随机前缀，结束后删除。默认使用配置中的数据库（应指向测试库），
+也可以用 --database-url 指定，例如 sqlite:////tmp/reconcile.db（脚本为 SQLite 注册 crc32/concat 函数）。
+
+用法（在backend目录下）：
+    python scripts/verify_credits_reconcile.py --keys 2000 --buckets 64 --drift 50
+"""
+import argparse
+import os
+import random
+import secrets
+import sys
+import zlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import create_engine, event  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.db.database import Base  # noqa: E402
+from app.db.models import APIKey  # noqa: E402
+from app.services.credits_reconcile_service import CreditsReconcileService, compute_bucket_checksums  # noqa: E402
+from app.services.credits_reset_client import CreditsResetClient  # noqa: E402
+
+
+class FakeCreditsService(CreditsResetClient):
+    """外部积分服务替身：内存存储，接口返回格式与 CreditsResetClient 一致"""
+
+    def __init__(self, store: dict):
+        super().__init__()
+        self.store = store
+        self.entries_calls = 0
+
+    def get_bucket_checksums(self, bucket_count: int) -> dict:
+        buckets = compute_bucket_checksums(self.store.items(), bucket_count)
+        return {
+            "success": True,
+            "data": {"buckets": [{"bucket": bucket, **item} for bucket, item in buckets.items()]}
+        }
+
+    def get_bucket_entries(self, bucket_count: int, bucket: int) -> dict:
+        self.entries_calls += 1
+        entries = {
+            api_key: credits for api_key, credits in self.store.items()
+            if zlib.crc32(api_key.encode("utf-8")) % bucket_count == bucket
+        }
+        return {"success": True, "data": {"entries": entries}}
+
+    def reset_credits(self, api_key: str, remaining_credits: int, last_reset_credits_at: str = None) -> dict:
+        self.store[api_key] = remaining_credits
+        return {"success": True, "message": "ok"}
+
+    def reset_credits_batch(self, items: list) -> dict:
+        for item in items:
+            self.store[item["api_key"]] = item["remaining_credits"]
+        return {"success": True, "synced": len(items), "failed": 0}
+
+
+def create_session_factory(database_url: str):
+    if database_url.startswith("sqlite"):
+        engine = create_engine(database_url, connect_args={"check_same_thread": False})
+
+        @event.listens_for(engine, "connect")
+        def register_functions(dbapi_connection, connection_record):
+            # MySQL 内置函数在 SQLite 中的等价实现
+            dbapi_connection.create_function(
+                "crc32", 1, lambda value: None if value is None else zlib.crc32(str(value).encode("utf-8"))
+            )
+            dbapi_connection.create_function(
+                "concat", -1, lambda *values: "".join("" if value is None else str(value) for value in values)
+            )
+
+        Base.metadata.create_all(bind=engine)
+    else:
+        engine = create_engine(database_url, pool_recycle=3600)
+    return engine, sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def prepare_data(session_factory, tag: str, keys: int) -> list:
+    """创建测试密钥：大部分为激活且有积分，少量未激活或积分为空（不参与对账）"""
+    rows = []
+    for index in range(keys):
+        kind = random.random()
+        rows.append({
+            "api_key": f"rc-{tag}-{index:06d}-{secrets.token_hex(6)}",
+            "real_api_key": "reconcile",
+            "key_name": f"reconcile-{tag}",
+            "status": "inactive" if kind < 0.05 else "active",
+            "is_active": True,
+            "remaining_credits": None if 0.05 <= kind < 0.08 else random.choice([0, 1, 7, 100, 999, 123456]),
+            "total_credits": 123456
+        })
+
+    db = session_factory()
+    try:
+        db.bulk_insert_mappings(APIKey, rows)
+        db.commit()
+    finally:
+        db.close()
+    return [row["api_key"] for row in rows if row["status"] == "active" and row["remaining_credits"] is not None]
+
+
+def cleanup(session_factory, tag: str) -> None:
+    db = session_factory()
+    try:
+        db.query(APIKey).filter(APIKey.api_key.like(f"rc-{tag}-%")).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def load_scope(db) -> dict:
+    """逐条读取参与对账的密钥积分（与 _reconcile_scope 相同的条件）"""
+    rows = db.query(APIKey.api_key, APIKey.remaining_credits).filter(
+        APIKey.status == "active", APIKey.remaining_credits.isnot(None)
+    ).all()
+    return {api_key: credits for api_key, credits in rows}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="积分对账校验")
+    parser.add_argument("--keys", type=int, default=2000, help="创建的测试密钥数")
+    parser.add_argument("--buckets", type=int, default=64, help="分桶数")
+    parser.add_argument("--drift", type=int, default=50, help="每类偏差制造的密钥数")
+    parser.add_argument("--database-url", default=settings.DATABASE_URL, help="数据库连接（默认使用配置）")
+    parser.add_argument("--keep", action="store_true", help="保留测试数据")
+    args = parser.parse_args()
+
+    engine, session_factory = create_session_factory(args.database_url)
+    tag = secrets.token_hex(4)
+    problems = []
+    try:
+        scoped_keys = prepare_data(session_factory, tag, args.keys)
+        db = session_factory()
+        try:
+            service = CreditsReconcileService(db)
+
+            # 1. SQL 校验和与 Python 校验和
+            db_entries = load_scope(db)
+            sql_buckets = service.get_db_bucket_checksums(args.buckets)
+            python_buckets = compute_bucket_checksums(db_entries.items(), args.buckets)
+            if sql_buckets != python_buckets:
+                differing = sorted(
+                    bucket for bucket in set(sql_buckets) | set(python_buckets)
+                    if sql_buckets.get(bucket) != python_buckets.get(bucket)
+                )
+                problems.append(f"SQL 与 Python 校验和不一致的桶: {differing[:20]}")
+            print(
+                f"校验和比对: {len(db_entries)} 个密钥，{len(sql_buckets)} 个非空桶，"
+                f"{'一致' if sql_buckets == python_buckets else '不一致'}"
+            )
+
+            # 2. 制造偏差后对账并修复
+            drift = min(args.drift, len(scoped_keys) // 2)
+            sampled = random.sample(scoped_keys, drift * 2)
+            store = dict(db_entries)
+            for api_key in sampled[:drift]:
+                store[api_key] = store[api_key] + 1
+            for api_key in sampled[drift:]:
+                del store[api_key]
+            extra_keys = [f"rc-{tag}-extra-{index:06d}" for index in range(drift)]
+            for api_key in extra_keys:
+                store[api_key] = 10
+
+            fake = FakeCreditsService(store)
+            result = CreditsReconcileService(db, client=fake).reconcile(bucket_count=args.buckets, repair=True)
+            print(
+                f"对账: 不一致桶 {result.get('mismatched_buckets')}/{args.buckets}（拉取明细 {fake.entries_calls} 次），"
+                f"不一致 {result.get('mismatched_keys')}，外部缺失 {result.get('missing_remote_keys')}，"
+                f"外部多出 {result.get('extra_remote_keys')}，已修复 {result.get('repaired')}"
+            )
+            expected = {
+                "mismatched_keys": drift, "missing_remote_keys": drift,
+                "extra_remote_keys": drift, "repaired": drift * 2, "repair_failed": 0
+            }
+            for field, value in expected.items():
+                if result.get(field) != value:
+                    problems.append(f"对账结果 {field}={result.get(field)}，预期 {value}")
+            if sorted(result.get("extra_remote_key_list", [])) != sorted(extra_keys[:service.EXTRA_REMOTE_REPORT_LIMIT]):
+                problems.append("extra_remote_key_list 与制造的外部多出密钥不一致")
+            if drift and not result.get("action_items"):
+                problems.append("外部多出密钥未列入 action_items")
+            for action in result.get("action_items", []):
+                print(f"  待处理: {action}")
+
+            repaired_store = {api_key: credits for api_key, credits in store.items() if api_key not in extra_keys}
+            if repaired_store != db_entries:
+                problems.append("修复后外部存储与数据库不一致")
+
+            # 3. 修复后再次对账
+            fake.entries_calls = 0
+            again = CreditsReconcileService(db, client=fake).reconcile(bucket_count=args.buckets, repair=False)
+            extra_buckets = {zlib.crc32(api_key.encode("utf-8")) % args.buckets for api_key in extra_keys}
+            if again.get("mismatched_keys") or again.get("missing_remote_keys") or \
+                    again.get("mismatched_buckets") != len(extra_buckets):
+                problems.append(
+                    f"修复后再次对账仍有偏差: 不一致桶 {again.get('mismatched_buckets')}，"
+                    f"不一致 {again.get('mismatched_keys')}，外部缺失 {again.get('missing_remote_keys')}"
+                )
+            print(f"复查: 不一致桶 {again.get('mismatched_buckets')}（均为外部多出密钥所在的桶）")
+        finally:
+            db.close()
+
+        if problems:
+            for problem in problems:
+                print(f"失败: {problem}")
+            sys.exit(f"积分对账校验失败: 共 {len(problems)} 个问题")
+        print("积分对账校验通过")
+    finally:
+        if not args.keep:
+            cleanup(session_factory, tag)
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 import React from 'react'
 import { useLocation } from 'react-router-dom'
 import { useUserStore } from '@/store/user'
+import request from '@/utils/request'
 import {
   NavigationMenu,
   NavigationMenuList,
@@ -18,7 +19,12 @@ const Header: React.FC<HeaderProps> = ({ onLoginClick, onRegisterClick }) => {
   const { user, logout } = useUserStore()
   const location = useLocation()
 
-  const handleLogout = () => {
+  const handleLogout = async () => {
+    // 通知后端结束本次登录会话，失败不影响本地退出
+    const { refreshToken } = useUserStore.getState()
+    if (refreshToken) {
+      await request.post('/auth/logout', { refresh_token: refreshToken }).catch(() => undefined)
+    }
     logout()
     // 重定向逻辑已经在logout函数中处理
   }
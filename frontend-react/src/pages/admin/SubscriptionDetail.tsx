@@ -103,11 +103,31 @@ const SubscriptionDetail: React.FC = () => {
     if (!id) return
     try {
       setLoadingBatchGenerate(true)
-      await request.post(`/packages/${id}/userkeys/batch-generate`, {
+      const res: any = await request.post(`/packages/${id}/userkeys/batch-generate`, {
         count: 10,
         status: 'inactive'
-      })
-      success('批量生成用户密钥成功')
+      }, { responseType: 'blob' })
+      const csvBlob = res as Blob
+
+      // 生成的密钥只在这份CSV中返回，无论是否完整都下载保存
+      const url = URL.createObjectURL(csvBlob)
+      const a = document.createElement('a')
+      a.href = url
+      a.download = `userkeys-${subscription?.package_code || id}-${Date.now()}.csv`
+      document.body.appendChild(a)
+      a.click()
+      document.body.removeChild(a)
+      URL.revokeObjectURL(url)
+
+      // 最后一行为生成状态：#status,ok|error,已生成数,请求数[,错误信息]
+      const statusRow = (await csvBlob.text()).trimEnd().split('\n').pop()?.trim().split(',') || []
+      if (statusRow[0] === '#status' && statusRow[1] === 'ok') {
+        success(`批量生成用户密钥成功，共 ${statusRow[2]} 个，已下载CSV`)
+      } else if (statusRow[0] === '#status') {
+        error(`批量生成未完成：已生成 ${statusRow[2]}/${statusRow[3]} 个（已下载），${statusRow.slice(4).join(',')}`)
+      } else {
+        error('批量生成结果不完整，请检查已下载的CSV')
+      }
       setPagination(prev => ({ ...prev, page: 1 }))
       loadUserKeys()
     } catch (err) {